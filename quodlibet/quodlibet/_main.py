@@ -211,7 +211,8 @@ def init_plugins(no_plugins=False):
                for kind in PLUGIN_DIRS]
     folders.append(os.path.join(get_user_dir(), "plugins"))
     print_d("Scanning folders: %s" % folders)
-    pm = plugins.init(folders, no_plugins)
+    cache_filename = os.path.join(get_cache_dir(), "plugins")
+    pm = plugins.init(folders, no_plugins, cache_filename)
     pm.rescan()
 
     from quodlibet.qltk.edittags import EditTags
@@ -391,8 +392,8 @@ def enable_periodic_save(save_library):
 
     def periodic_library_save():
         while 1:
-            # max every 15 minutes
-            quodlibet.library.save(save_period=15 * 60)
+            # max every 15 minutes, without blocking the main loop
+            quodlibet.library.save(save_period=15 * 60, background=True)
             yield
 
     copool.add(periodic_library_save, timeout=timeout)
@@ -17,6 +17,7 @@ from ._base import Browser
 
 browsers = []
 default = None
+_initialized = set()
 
 
 def init():
@@ -61,6 +62,17 @@ def init():
         raise SystemExit("Default browser not found!")
 
 
+def init_browser(Kind, library):
+    """Calls `Kind.init(library)` unless it was called already.
+
+    Has to be called before a browser of the kind gets created.
+    """
+
+    if Kind not in _initialized:
+        _initialized.add(Kind)
+        Kind.init(library)
+
+
 def name(browser):
     """Return the name of the browser"""
 
@@ -34,6 +34,21 @@ class Filter(object):
         def active_filter(self, song): ...
     """
 
+    def active_filter_songs(self, songs):
+        """Returns the songs for which `active_filter` returns True.
+
+        Browsers can override this to test many songs at once cheaper.
+        """
+
+        return [s for s in songs if self.active_filter(s)]
+
+    def limits_results(self):
+        """If the songs passed to the song list can be only a part of the
+        songs matching `active_filter`, e.g. a limited number of them.
+        """
+
+        return False
+
     def can_filter_tag(self, key):
         """If key can be passed to filter()"""
         return False
@@ -203,9 +218,17 @@ class Browser(Gtk.Box, Filter):
     def init(klass, library):
         """Called after library and MainWindow initialization, before the
         GTK main loop starts.
+
+        If `lazy_init` is True, only called before the first browser of
+        this kind gets created instead.
         """
         pass
 
+    lazy_init = False
+    """If `init` isn't needed unless a browser of this kind gets created.
+    Should only be True if the class isn't used in other ways.
+    """
+
     def save(self):
         """Save the selected songlist. Browsers should save whatever
         they need to recreate the criteria for the current song list (not
@@ -14,7 +14,7 @@ from __future__ import absolute_import
 
 import os
 
-from gi.repository import Gtk, Pango, Gdk, GLib, Gio
+from gi.repository import Gtk, Pango, Gdk, GLib
 
 from quodlibet.util.i18n import numeric_phrase
 from .prefs import Preferences, DEFAULT_PATTERN_TEXT
@@ -40,10 +40,11 @@ from quodlibet.qltk.x import SymbolicIconImage
 from quodlibet.qltk.searchbar import SearchBarBox
 from quodlibet.qltk.menubutton import MenuButton
 from quodlibet.qltk import Icons
-from quodlibet.util import copool, connect_destroy
+from quodlibet.util import connect_destroy
 from quodlibet.util.library import background_filter
 from quodlibet.util import connect_obj, DeferredSignal
 from quodlibet.qltk.cover import get_no_cover_pixbuf
+from quodlibet.util.cover import CoverLoader
 from quodlibet.qltk.image import add_border_widget, get_surface_for_pixbuf
 from quodlibet.compat import cmp
 
@@ -266,10 +267,6 @@ class VisibleUpdate(object):
     def enable_row_update(self, view, sw, column):
         connect_obj(view, 'draw', self.__update_visibility, view)
 
-        connect_destroy(
-            sw.get_vadjustment(), "value-changed", self.__stop_update, view)
-
-        self.__pending_paths = []
         self.__update_deferred = DeferredSignal(
             self.__update_visible_rows, timeout=50, priority=GLib.PRIORITY_LOW)
         self.__column = column
@@ -277,31 +274,23 @@ class VisibleUpdate(object):
 
     def disable_row_update(self):
         if self.__update_deferred:
-            self.__update_deferred.abort
+            self.__update_deferred.abort()
             self.__update_deferred = None
 
-        if self.__pending_paths:
-            copool.remove(self.__scan_paths)
-
         self.__column = None
-        self.__pending_paths = []
 
     def _row_needs_update(self, model, iter_):
         """Should return True if the rows should be updated"""
 
         raise NotImplementedError
 
-    def _update_row(self, model, iter_):
-        """Do whatever is needed to update the row."""
+    def _update_rows(self, model, iters):
+        """Do whatever is needed to update the rows, the most important
+        first. Replaces the rows passed by the previous call.
+        """
 
         raise NotImplementedError
 
-    def __stop_update(self, adj, view):
-        if self.__pending_paths:
-            copool.remove(self.__scan_paths)
-            self.__pending_paths = []
-            self.__update_visibility(view)
-
     def __update_visibility(self, view, *args):
         if not self.__column.get_visible():
             return
@@ -310,21 +299,9 @@ class VisibleUpdate(object):
         if self.__first_expose:
             self.__first_expose = False
             self.__update_visible_rows(view, 0)
-            for i in self.__scan_paths():
-                pass
 
         self.__update_deferred(view, self.PRELOAD_COUNT)
 
-    def __scan_paths(self):
-        while self.__pending_paths:
-            model, path = self.__pending_paths.pop()
-            try:
-                iter_ = model.get_iter(path)
-            except ValueError:
-                continue
-            self._update_row(model, iter_)
-            yield True
-
     def __update_visible_rows(self, view, preload):
         vrange = view.get_visible_range()
         if vrange is None:
@@ -332,44 +309,37 @@ class VisibleUpdate(object):
 
         model = view.get_model()
 
-        # Generate a path list so that cover scanning starts in the middle
-        # of the visible area and alternately moves up and down.
         start, end = vrange
 
         # pygtk2.12 sometimes returns empty tuples
         if not start or not end:
             return
 
-        start = start.get_indices()[0] - preload - 1
-        end = end.get_indices()[0] + preload
-
-        vlist = list(range(end, start, -1))
-        top = vlist[:len(vlist) // 2]
-        bottom = vlist[len(vlist) // 2:]
-        top.reverse()
-
-        vlist_new = []
-        for i in vlist:
-            if top:
-                vlist_new.append(top.pop())
-            if bottom:
-                vlist_new.append(bottom.pop())
-        vlist_new = filter(lambda s: s >= 0, vlist_new)
-
-        vlist_new = map(Gtk.TreePath, vlist_new)
-
-        visible_paths = []
-        for path in vlist_new:
+        start = start.get_indices()[0]
+        end = end.get_indices()[0]
+
+        # Start in the middle of the visible area and alternately move up
+        # and down, then do the same for the preload range.
+        middle = (start + end) // 2
+        indices = [middle]
+        for i in range(1, max(middle - start, end - middle) + 1):
+            indices.extend([middle + i, middle - i])
+        indices = [i for i in indices if start <= i <= end]
+        for i in range(1, preload + 1):
+            indices.extend([end + i, start - i])
+
+        iters = []
+        for index in indices:
+            if index < 0:
+                continue
             try:
-                iter_ = model.get_iter(path)
+                iter_ = model.get_iter(Gtk.TreePath(index))
             except ValueError:
                 continue
             if self._row_needs_update(model, iter_):
-                visible_paths.append((model, path))
+                iters.append(iter_)
 
-        if not self.__pending_paths and visible_paths:
-            copool.add(self.__scan_paths)
-        self.__pending_paths = visible_paths
+        self._update_rows(model, iters)
 
 
 class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
@@ -385,6 +355,7 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
     accelerated_name = _("_Album List")
     keys = ["AlbumList"]
     priority = 4
+    lazy_init = True
 
     def pack(self, songpane):
         container = qltk.ConfigRHPaned("browsers", "albumlist_pos", 0.4)
@@ -439,7 +410,9 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
         if self.__model is None:
             self._init_model(library)
 
-        self._cover_cancel = Gio.Cancellable()
+        self._cover_loader = CoverLoader(
+            app.cover_manager, self._covers_loaded)
+        self.__cover_rows = {}
 
         sw = ScrolledWindow()
         sw.set_shadow_type(Gtk.ShadowType.IN)
@@ -555,11 +528,15 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
     def _cover_changed(self, manager, songs):
         model = self.__model
         songs = set(songs)
+        changed = []
         for iter_, item in model.iterrows():
             album = item.album
             if album is not None and songs & album.songs:
                 item.scanned = False
+                changed.append(item)
                 model.row_changed(model.get_path(iter_), iter_)
+        # covers loading right now might be the old ones
+        self._cover_loader.invalidate(changed)
 
     def __key_pressed(self, widget, event, librarian):
         if qltk.is_accel(event, "<Primary>I"):
@@ -583,26 +560,40 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
         item = model.get_value(iter_)
         return item.album is not None and not item.scanned
 
-    def _update_row(self, filter_model, iter_):
+    def _update_rows(self, filter_model, iters):
         sort_model = filter_model.get_model()
         model = sort_model.get_model()
-        iter_ = filter_model.convert_iter_to_child_iter(iter_)
-        iter_ = sort_model.convert_iter_to_child_iter(iter_)
-        tref = Gtk.TreeRowReference.new(model, model.get_path(iter_))
+        scale_factor = self.get_scale_factor()
 
-        def callback():
-            path = tref.get_path()
+        requests = []
+        rows = {}
+        for iter_ in iters:
+            iter_ = filter_model.convert_iter_to_child_iter(iter_)
+            iter_ = sort_model.convert_iter_to_child_iter(iter_)
+            item = model.get_value(iter_)
+            request = item.get_cover_request(scale_factor)
+            if request is None:
+                item.set_cover(None)
+                continue
+            rows[item] = Gtk.TreeRowReference.new(
+                model, model.get_path(iter_))
+            requests.append(request)
+        # only rows still wanted get updated, others are out of view
+        self.__cover_rows = rows
+        self._cover_loader.load(requests)
+
+    def _covers_loaded(self, results):
+        model = self.__model
+        for item, pixbuf in results:
+            item.set_cover(pixbuf)
+            tref = self.__cover_rows.pop(item, None)
+            path = tref and tref.get_path()
             if path is not None:
                 model.row_changed(path, model.get_iter(path))
 
-        item = model.get_value(iter_)
-        scale_factor = self.get_scale_factor()
-        item.scan_cover(scale_factor=scale_factor,
-                        callback=callback,
-                        cancel=self._cover_cancel)
-
     def __destroy(self, browser):
-        self._cover_cancel.cancel()
+        self._cover_loader.destroy()
+        self.__cover_rows.clear()
         self.disable_row_update()
 
         self.view.set_model(None)
@@ -687,6 +678,7 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
         items = self.__get_selected_items()
         for item in items:
             item.scanned = False
+        self._cover_loader.invalidate(items)
         model = self.view.get_model()
         for iter_, item in model.iterrows():
             if item in items:
@@ -734,6 +726,10 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate,
                 return True
         return False
 
+    def active_filter_songs(self, songs):
+        albums = self.__get_selected_albums()
+        return [s for s in songs if any(s in a.songs for a in albums)]
+
     def can_filter_text(self):
         return True
 
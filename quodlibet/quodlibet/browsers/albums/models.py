@@ -6,7 +6,6 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
-from quodlibet import app
 from quodlibet import config
 from quodlibet.qltk.models import ObjectStore, ObjectModelFilter
 from quodlibet.qltk.models import ObjectModelSort
@@ -28,20 +27,20 @@ class AlbumItem(object):
             size = 48
         return size
 
-    def scan_cover(self, force=False, scale_factor=1,
-            callback=None, cancel=None):
-        if (self.scanned and not force) or not self.album or \
-                not self.album.songs:
-            return
-        self.scanned = True
-
-        def set_cover_cb(pixbuf):
-            self.cover = pixbuf
-            callback()
+    def get_cover_request(self, scale_factor=1):
+        """Returns a request for a CoverLoader or None if there is no
+        cover to load.
+        """
 
+        if not self.album or not self.album.songs:
+            return None
         s = self.COVER_SIZE * scale_factor
-        app.cover_manager.get_pixbuf_many_async(
-            self.album.songs, s, s, cancel, set_cover_cb)
+        # the album can change while loading
+        return (self, list(self.album.songs), s, s)
+
+    def set_cover(self, pixbuf):
+        self.cover = pixbuf
+        self.scanned = True
 
     def __repr__(self):
         return repr(self.album)
@@ -13,7 +13,7 @@ from __future__ import absolute_import
 
 import os
 
-from gi.repository import Gtk, Pango, Gdk, Gio
+from gi.repository import Gtk, Pango, Gdk
 
 from .prefs import Preferences, DEFAULT_PATTERN_TEXT
 from quodlibet.browsers.albums.models import (AlbumModel,
@@ -43,6 +43,7 @@ from quodlibet.util import connect_destroy
 from quodlibet.util.library import background_filter
 from quodlibet.util import connect_obj
 from quodlibet.qltk.cover import get_no_cover_pixbuf
+from quodlibet.util.cover import CoverLoader
 from quodlibet.qltk.image import add_border_widget, get_surface_for_pixbuf
 from quodlibet.qltk import popup_menu_at_widget
 
@@ -128,6 +129,7 @@ class CoverGrid(Browser, util.InstanceTracker, VisibleUpdate,
     accelerated_name = _("_Cover Grid")
     keys = ["CoverGrid"]
     priority = 4
+    lazy_init = True
 
     def pack(self, songpane):
         container = self.songcontainer
@@ -217,7 +219,9 @@ class CoverGrid(Browser, util.InstanceTracker, VisibleUpdate,
         if self.__model is None:
             self._init_model(library)
 
-        self._cover_cancel = Gio.Cancellable()
+        self._cover_loader = CoverLoader(
+            app.cover_manager, self._covers_loaded)
+        self.__cover_rows = {}
 
         self.scrollwin = sw = ScrolledWindow()
         sw.set_shadow_type(Gtk.ShadowType.IN)
@@ -341,11 +345,15 @@ class CoverGrid(Browser, util.InstanceTracker, VisibleUpdate,
     def _cover_changed(self, manager, songs):
         model = self.__model
         songs = set(songs)
+        changed = []
         for iter_, item in model.iterrows():
             album = item.album
             if album is not None and songs & album.songs:
                 item.scanned = False
+                changed.append(item)
                 model.row_changed(model.get_path(iter_), iter_)
+        # covers loading right now might be the old ones
+        self._cover_loader.invalidate(changed)
 
     def __key_pressed(self, widget, event, librarian):
         if qltk.is_accel(event, "<Primary>I"):
@@ -369,29 +377,43 @@ class CoverGrid(Browser, util.InstanceTracker, VisibleUpdate,
         item = model.get_value(iter_)
         return item.album is not None and not item.scanned
 
-    def _update_row(self, filter_model, iter_):
+    def _update_rows(self, filter_model, iters):
         sort_model = filter_model.get_model()
         model = sort_model.get_model()
-        iter_ = filter_model.convert_iter_to_child_iter(iter_)
-        iter_ = sort_model.convert_iter_to_child_iter(iter_)
-        tref = Gtk.TreeRowReference.new(model, model.get_path(iter_))
         mag = config.getfloat("browsers", "covergrid_magnification", 3.)
+        scale_factor = self.get_scale_factor() * mag
 
-        def callback():
-            path = tref.get_path()
+        requests = []
+        rows = {}
+        for iter_ in iters:
+            iter_ = filter_model.convert_iter_to_child_iter(iter_)
+            iter_ = sort_model.convert_iter_to_child_iter(iter_)
+            item = model.get_value(iter_)
+            request = item.get_cover_request(scale_factor)
+            if request is None:
+                item.set_cover(None)
+                continue
+            rows[item] = Gtk.TreeRowReference.new(
+                model, model.get_path(iter_))
+            requests.append(request)
+        # only rows still wanted get updated, others are out of view
+        self.__cover_rows = rows
+        self._cover_loader.load(requests)
+
+    def _covers_loaded(self, results):
+        model = self.__model
+        for item, pixbuf in results:
+            item.set_cover(pixbuf)
+            tref = self.__cover_rows.pop(item, None)
+            path = tref and tref.get_path()
             if path is not None:
                 model.row_changed(path, model.get_iter(path))
-            # XXX: icon view seems to ignore row_changed signals for pixbufs..
-            self.queue_draw()
-
-        item = model.get_value(iter_)
-        scale_factor = self.get_scale_factor() * mag
-        item.scan_cover(scale_factor=scale_factor,
-                        callback=callback,
-                        cancel=self._cover_cancel)
+        # XXX: icon view seems to ignore row_changed signals for pixbufs..
+        self.queue_draw()
 
     def __destroy(self, browser):
-        self._cover_cancel.cancel()
+        self._cover_loader.destroy()
+        self.__cover_rows.clear()
         self.disable_row_update()
 
         self.view.set_model(None)
@@ -504,6 +526,7 @@ class CoverGrid(Browser, util.InstanceTracker, VisibleUpdate,
         items = self.__get_selected_items()
         for item in items:
             item.scanned = False
+        self._cover_loader.invalidate(items)
         model = self.view.get_model()
         for iter_, item in model.iterrows():
             if item in items:
@@ -551,6 +574,10 @@ class CoverGrid(Browser, util.InstanceTracker, VisibleUpdate,
                 return True
         return False
 
+    def active_filter_songs(self, songs):
+        albums = self.__get_selected_albums()
+        return [s for s in songs if any(s in a.songs for a in albums)]
+
     def can_filter_text(self):
         return True
 
@@ -43,6 +43,7 @@ class FileSystem(Browser, Gtk.HBox):
     keys = ["FileSystem"]
     priority = 10
     uses_main_library = False
+    lazy_init = True
 
     TARGET_QL, TARGET_EXT = range(1, 3)
 
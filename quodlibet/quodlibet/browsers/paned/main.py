@@ -163,12 +163,16 @@ class PanedBrowser(Browser, util.InstanceTracker):
         self._panes[-1].get_selection().emit('changed')
 
     def __added(self, library, songs):
+        for pane in self._panes:
+            pane.index.add(songs)
         songs = list(filter(self._filter, songs))
         for pane in self._panes:
             pane.add(songs)
             songs = list(filter(pane.matches, songs))
 
     def __removed(self, library, songs, remove_if_empty=True):
+        for pane in self._panes:
+            pane.index.remove(songs)
         songs = list(filter(self._filter, songs))
         for pane in self._panes:
             pane.remove(songs, remove_if_empty)
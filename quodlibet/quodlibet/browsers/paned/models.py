@@ -12,7 +12,7 @@ from quodlibet import _
 from quodlibet import util
 from quodlibet.qltk.models import ObjectStore
 from quodlibet.util.collection import Collection
-from quodlibet.compat import iteritems, listfilter
+from quodlibet.compat import iteritems, itervalues, listfilter
 
 
 class BaseEntry(Collection):
@@ -114,22 +114,25 @@ class AllEntry(BaseEntry):
         return "<%s>" % (type(self).__name__,)
 
 
-class PaneModel(ObjectStore):
+class PaneIndex(object):
+    """Maps the keys of a pane to the songs having them.
 
-    def __init__(self, pattern_config):
-        super(PaneModel, self).__init__()
-        self.__sort_cache = {} # text to sort text cache
-        self.__key_cache = {} # song to key cache
-        self.config = pattern_config
+    The library songs get formatted once and the index is kept up to date
+    by passing added and removed songs, so models can be filled without
+    formatting and sorting all songs again.
+    """
 
-    def get_format_keys(self, song):
-        try:
-            return self.__key_cache[song]
-        except KeyError:
-            # We filter out empty values, so Unknown can be ""
-            self.__key_cache[song] = listfilter(
-                lambda v: v[0], self.config.format(song))
-            return self.__key_cache[song]
+    def __init__(self, pattern_config, library=None):
+        self.config = pattern_config
+        self.__library = library
+        self.__built = library is None
+        self.__sort_cache = {} # text to sort text cache
+        self.__keys = {} # song to keys
+        self.__songs = {} # key to songs
+        self.__sort = {} # key to (sort key, has actual sort text)
+        self.__sort_texts = {} # key to sort texts and their song counts
+        self.__unknown = set()
+        self.__sorted = None # keys in sort order, None if outdated
 
     def __human_sort_key(self, text, reg=re.compile('<.*?>')):
         try:
@@ -143,6 +146,164 @@ class PaneModel(ObjectStore):
             self.__sort_cache[text] = util.human_sort_key(text_stripped)
             return self.__sort_cache[text], text
 
+    def get_sort_key(self, text):
+        """The key used for sorting entries with the sort text `text`"""
+
+        return self.__human_sort_key(text)
+
+    def __format(self, song):
+        # We filter out empty values, so Unknown can be ""
+        return listfilter(lambda v: v[0], self.config.format(song))
+
+    def get_keys(self, song):
+        """A list of (key, sort text) for the song"""
+
+        try:
+            return self.__keys[song]
+        except KeyError:
+            return self.__format(song)
+
+    def __build(self):
+        if not self.__built:
+            self.__built = True
+            self.add(self.__library)
+
+    def add(self, songs):
+        """Add new or changed (after removing them) songs"""
+
+        if not self.__built:
+            return
+
+        human_sort = self.__human_sort_key
+        song_sets = self.__songs
+        sort_keys = self.__sort
+        sort_texts = self.__sort_texts
+        for song in songs:
+            items = self.__keys[song] = self.__format(song)
+            if not items:
+                self.__unknown.add(song)
+            for key, sort in items:
+                texts = sort_texts.setdefault(key, {})
+                texts[sort] = texts.get(sort, 0) + 1
+                if key in song_sets:
+                    song_sets[key].add(song)
+                    if sort and not sort_keys[key][1]:
+                        # first actual sort key
+                        sort_keys[key] = (human_sort(sort), True)
+                        self.__sorted = None
+                else:
+                    song_sets[key] = {song}
+                    sort_keys[key] = (human_sort(sort), bool(sort))
+                    self.__sorted = None
+
+    def remove(self, songs):
+        if not self.__built:
+            return
+
+        song_sets = self.__songs
+        sort_keys = self.__sort
+        sort_texts = self.__sort_texts
+        for song in songs:
+            items = self.__keys.pop(song, None)
+            if items is None:
+                continue
+            self.__unknown.discard(song)
+            for key, sort in items:
+                key_songs = song_sets.get(key)
+                if key_songs is None:
+                    continue
+                key_songs.discard(song)
+                if not key_songs:
+                    del song_sets[key]
+                    del sort_keys[key]
+                    del sort_texts[key]
+                    self.__sorted = None
+                    continue
+
+                texts = sort_texts[key]
+                texts[sort] -= 1
+                if not texts[sort]:
+                    del texts[sort]
+                    if sort_keys[key][0][1] == sort:
+                        # the sort text in use is gone, take another one
+                        self.__update_sort_key(key)
+
+    def __update_sort_key(self, key):
+        texts = [t for t in self.__sort_texts[key] if t]
+        sort = min(texts) if texts else next(iter(self.__sort_texts[key]))
+        self.__sort[key] = (self.__human_sort_key(sort), bool(sort))
+        self.__sorted = None
+
+    def __sorted_keys(self):
+        if self.__sorted is None:
+            sort_keys = self.__sort
+            self.__sorted = sorted(sort_keys, key=lambda k: sort_keys[k][0])
+        return self.__sorted
+
+    def get_entries(self, songs):
+        """Returns a list of SongsEntry for the songs in sort order and
+        the songs without keys.
+        """
+
+        self.__build()
+
+        if not isinstance(songs, (set, frozenset)):
+            songs = set(songs)
+
+        song_sets = self.__songs
+        sort_keys = self.__sort
+        entries = []
+
+        # For many songs intersecting the songs of each key is faster than
+        # looking at each song. This needs all songs to be indexed though.
+        if len(songs) * 4 >= len(self.__keys) and \
+                songs.issubset(self.__keys):
+            everything = len(songs) == len(self.__keys)
+            for key in self.__sorted_keys():
+                if everything:
+                    key_songs = set(song_sets[key])
+                else:
+                    key_songs = song_sets[key] & songs
+                if key_songs:
+                    entries.append(
+                        SongsEntry(key, sort_keys[key][0], key_songs))
+            return entries, self.__unknown & songs
+
+        collection = {}
+        unknown = set()
+        human_sort = self.__human_sort_key
+        for song in songs:
+            items = self.get_keys(song)
+            if not items:
+                unknown.add(song)
+            for key, sort in items:
+                if key in collection:
+                    entry = collection[key]
+                    entry.songs.add(song)
+                    if key not in sort_keys and sort and not entry.sort[1]:
+                        entry.sort = human_sort(sort)
+                elif key in sort_keys:
+                    collection[key] = SongsEntry(
+                        key, sort_keys[key][0], {song})
+                else:
+                    collection[key] = SongsEntry(key, human_sort(sort), {song})
+
+        entries = sorted(itervalues(collection), key=lambda e: e.sort)
+        return entries, unknown
+
+
+class PaneModel(ObjectStore):
+
+    def __init__(self, pattern_config, index=None):
+        super(PaneModel, self).__init__()
+        self.config = pattern_config
+        if index is None:
+            index = PaneIndex(pattern_config)
+        self.index = index
+
+    def get_format_keys(self, song):
+        return self.index.get_keys(song)
+
     def get_songs(self, paths):
         """Get all songs for the given paths (from a selection e.g.)"""
 
@@ -171,10 +332,6 @@ class PaneModel(ObjectStore):
 
         songs = set(songs)
 
-        for song in songs:
-            if song in self.__key_cache:
-                del self.__key_cache[song]
-
         to_remove = []
         for iter_, entry in self.iterrows():
             if isinstance(entry, AllEntry):
@@ -188,13 +345,7 @@ class PaneModel(ObjectStore):
         if not remove_if_empty:
             return
 
-        # remove from cache and the model
         for iter_ in to_remove:
-            try:
-                key = self.get_value(iter_).key
-                del(self.__sort_cache[key])
-            except KeyError:
-                pass
             self.remove(iter_)
 
         if len(self) == 1 and isinstance(self[0][0], AllEntry):
@@ -209,7 +360,7 @@ class PaneModel(ObjectStore):
 
         collection = {}
         unknown = UnknownEntry()
-        human_sort = self.__human_sort_key
+        human_sort = self.index.get_sort_key
         for song in songs:
             items = self.get_format_keys(song)
             if not items:
@@ -295,6 +446,18 @@ class PaneModel(ObjectStore):
             else:
                 self.append(row=[unknown])
 
+    def fill(self, songs):
+        """Replace all rows with entries for the songs"""
+
+        entries, unknown = self.index.get_entries(songs)
+        if unknown:
+            entries.append(UnknownEntry(unknown))
+        if len(entries) > 1:
+            entries.insert(0, AllEntry())
+
+        self.clear()
+        self.append_many(entries)
+
     def matches(self, paths, song):
         """If the song is included in the selection defined by the paths.
 
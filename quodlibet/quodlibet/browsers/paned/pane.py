@@ -19,7 +19,7 @@ from quodlibet.qltk import is_accel
 from quodlibet.util import connect_obj
 from quodlibet.compat import text_type
 
-from .models import PaneModel
+from .models import PaneModel, PaneIndex
 from .util import PaneConfig
 
 
@@ -84,7 +84,8 @@ class Pane(AllTreeView):
         column.set_cell_data_func(render_count, count_cdf)
         self.append_column(column)
 
-        model = PaneModel(self.config)
+        self.index = PaneIndex(self.config, library)
+        model = PaneModel(self.config, self.index)
         self.set_model(model)
 
         self.set_search_equal_func(self.__search_func, None)
@@ -246,8 +247,7 @@ class Pane(AllTreeView):
 
         self.inhibit()
         with self.without_model():
-            model.clear()
-            model.add_songs(songs)
+            model.fill(songs)
 
         self.set_selected(selected, jump=True)
         self.uninhibit()
@@ -36,7 +36,7 @@ from quodlibet.qltk.information import Information
 from quodlibet.qltk.properties import SongProperties
 from quodlibet.util import connect_obj
 from quodlibet.util.dprint import print_d, print_w
-from quodlibet.util.collection import FileBackedPlaylist
+from quodlibet.util.collection import FileBackedPlaylist, Playlist
 from quodlibet.util.urllib import urlopen
 
 from .util import parse_m3u, parse_pls, PLAYLISTS,\
@@ -94,6 +94,7 @@ class PlaylistsBrowser(Browser, DisplayPatternMixin):
 
     @classmethod
     def deinit(cls, library):
+        FileBackedPlaylist.flush_writes()
         model = cls.__lists.get_model()
         model.clear()
 
@@ -113,32 +114,41 @@ class PlaylistsBrowser(Browser, DisplayPatternMixin):
                 if refresh:
                     print_d("Refreshing playlist %s..." % row[0])
                     klass.__lists.row_changed(row.path, row.iter)
-                playlist.write()
+                playlist.write_later()
                 break
         else:
             model.get_model().append(row=[playlist])
-            playlist.write()
+            playlist.write_later()
 
     @classmethod
     def __removed(klass, library, songs):
+        featuring = Playlist.playlists_featuring_songs(songs)
+        if not featuring:
+            return
         for playlist in klass.playlists():
-            if playlist.remove_songs(songs):
+            if playlist in featuring and playlist.remove_songs(songs):
                 klass.changed(playlist)
 
     @classmethod
     def __added(klass, library, songs):
         filenames = {song("~filename") for song in songs}
+        # masked songs are contained by their filename
+        featuring = Playlist.playlists_featuring_songs(filenames)
+        if not featuring:
+            return
         for playlist in klass.playlists():
-            if playlist.add_songs(filenames, library):
+            if playlist in featuring and \
+                    playlist.add_songs(filenames, library):
                 klass.changed(playlist)
 
     @classmethod
     def __changed(klass, library, songs):
+        featuring = Playlist.playlists_featuring_songs(songs)
+        if not featuring:
+            return
         for playlist in klass.playlists():
-            for song in songs:
-                if song in playlist.songs:
-                    klass.changed(playlist)
-                    break
+            if playlist in featuring:
+                klass.changed(playlist)
 
     def cell_data(self, col, cell, model, iter, data):
         playlist = model[iter][0]
@@ -348,8 +358,7 @@ class PlaylistsBrowser(Browser, DisplayPatternMixin):
             return smodel[smodel.get_path(itr)][0]
 
         def remove_from_model(iters, smodel):
-            for it in iters:
-                smodel.remove(it)
+            smodel.remove_many(iters)
 
         model, iter = self.__selected_playlists()
         if iter:
@@ -559,8 +568,17 @@ class PlaylistsBrowser(Browser, DisplayPatternMixin):
         self.filter_text("")
 
     def active_filter(self, song):
-        return (song in self._get_playlist_songs()
-                and (self._query is None or self._query.search(song)))
+        return bool(self.active_filter_songs([song]))
+
+    def active_filter_songs(self, songs):
+        model, iter = self.__selected_playlists()
+        if iter is None:
+            return []
+        playlist = model[iter][0]
+        songs = [s for s in songs if s in playlist]
+        if self._query is not None:
+            songs = self._query.filter(songs)
+        return songs
 
     def save(self):
         model, iter = self.__selected_playlists()
@@ -29,10 +29,12 @@ class PlaylistMenu(Gtk.Menu):
         self.append(SeparatorMenuItem())
         self.set_size_request(int(i.size_request().width * 2), -1)
 
+        featuring = Playlist.playlists_featuring_songs(songs)
         for playlist in playlists:
             name = playlist.name
             i = Gtk.CheckMenuItem(label=name)
-            some, all = playlist.has_songs(songs)
+            count = featuring.get(playlist, 0)
+            some, all = bool(count), count == len(songs)
             i.set_active(some)
             i.set_inconsistent(some and not all)
             i.get_child().set_ellipsize(Pango.EllipsizeMode.END)
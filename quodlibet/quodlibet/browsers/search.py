@@ -101,7 +101,7 @@ class SearchBar(Browser):
 
     def _get_songs(self):
         self._query = self._sb_box.get_query(SongList.star)
-        return self._query.filter(self._library) if self._query else None
+        return self._library.query(self._query) if self._query else None
 
     def activate(self):
         songs = self._get_songs()
@@ -141,5 +141,8 @@ class SearchBar(Browser):
         else:
             return True
 
+    def limits_results(self):
+        return self._sb_box.is_limited()
+
 
 browsers = [SearchBar]
@@ -145,6 +145,9 @@ def process_arguments(argv):
             _("query")),
         ("unqueue", _("Unqueue a file or query"), "%s|%s" % (
             C_("command", "filename"), _("query"))),
+        ("startup-trace",
+            _("Write startup timings to a file (Chrome trace format)"),
+            C_("command", "filename")),
             ]:
         options.add(opt, help=help, arg=arg)
 
@@ -257,6 +260,10 @@ def process_arguments(argv):
             actions.append(command)
         elif command == "run":
             actions.append(command)
+        elif command == "startup-trace":
+            from quodlibet.util import startuptrace
+            startuptrace.set_output(
+                os.path.abspath(util.path.expanduser(arg)))
 
     if cmds_todo:
         for cmd in cmds_todo:
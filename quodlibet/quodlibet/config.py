@@ -54,6 +54,32 @@ INITIAL = {
     "library": {
         "exclude": "",
         "refresh_on_start": "true",
+
+        # how the library gets saved: "pickle" rewrites everything,
+        # "journal" only appends the changes since the last save,
+        # "mapped" loads songs from disk only when they are first used
+        "storage": "pickle",
+
+        # number of threads reading new files while scanning,
+        # 0 reads them one after another in the main loop
+        "scan_workers": "0",
+
+        # skip songs and scanning in directories whose mtime hasn't changed
+        # since the last rebuild (misses files which got rewritten in place
+        # and files removed from the library but not from the disk)
+        "skip_unchanged_dirs": "false",
+
+        # keep an index of the words in tags and the values of numeric
+        # tags to speed up searching
+        "tag_index": "false",
+
+        # share equal tag keys and common values between songs to reduce
+        # memory usage of large libraries
+        "intern_tags": "false",
+
+        # save the sort keys of songs along with the library, so sorting
+        # the song list after a restart doesn't have to compute them again
+        "save_sort_keys": "false",
     },
 
     # State about the player, to restore on startup
@@ -160,6 +160,46 @@ class AdvancedPreferences(EventPlugin):
                  "the window always are visible or get hidden when not in use "
                  "(restart required)")))
 
+        rows.append(
+            int_config(
+                "library", "scan_workers",
+                "Library scan threads:",
+                ("Number of threads reading new files while scanning the "
+                 "library, 0 reads them in the main thread")))
+
+        rows.append(
+            boolean_config(
+                "library", "skip_unchanged_dirs",
+                "Skip unchanged folders:",
+                ("Don't check songs or look for new files in folders which "
+                 "haven't changed since the last library refresh. Songs "
+                 "rewritten in place by other programs won't get reloaded")))
+
+        rows.append(
+            boolean_config(
+                "library", "tag_index",
+                "Index tags for searching:",
+                ("Keep an index of the words in tags and of numeric tag "
+                 "values, which makes searching large libraries faster but "
+                 "needs more memory "
+                 "(restart required)")))
+
+        rows.append(
+            boolean_config(
+                "library", "intern_tags",
+                "Share tag values between songs:",
+                ("Keep only one copy of tag names and of common values like "
+                 "artists, albums and genres in memory "
+                 "(restart required)")))
+
+        rows.append(
+            boolean_config(
+                "library", "save_sort_keys",
+                "Save sort keys:",
+                ("Save the keys used for sorting the song list along with "
+                 "the library, so sorting is faster after a restart "
+                 "(restart required)")))
+
         for (row, (label, entry, button)) in enumerate(rows):
             label.set_alignment(1.0, 0.5)
             table.attach(label, 0, 1, row, row + 1,
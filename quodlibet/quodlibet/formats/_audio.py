@@ -36,6 +36,7 @@ from quodlibet.compat import iteritems, string_types, text_type, \
 
 from ._image import ImageContainer
 from ._misc import AudioFileError, translate_errors
+from . import _intern, _sortkeys
 
 
 translate_errors
@@ -63,6 +64,9 @@ NUMERIC_ZERO_DEFAULT.update(SIZE_TAGS)
 FILESYSTEM_TAGS = {"~filename", "~basename", "~dirname", "~mountpoint"}
 """Values are bytes in Linux instead of unicode"""
 
+SORT_KEY_TAGS = {"~filename", "~#disc", "~#track"}
+"""Internal tags `sort_key` depends on, besides real tags"""
+
 SORT_TO_TAG = dict([(v, k) for (k, v) in iteritems(TAG_TO_SORT)])
 """Reverse map, so sort tags can fall back to the normal ones"""
 
@@ -211,18 +215,25 @@ class AudioFile(dict, ImageContainer):
         else:
             value = text_type(value)
 
-        dict.__setitem__(self, key, value)
+        if _intern.is_interning():
+            key = _intern.intern_key(key)
+            value = _intern.intern_value(key, value)
 
-        pop = self.__dict__.pop
-        pop("album_key", None)
-        pop("sort_key", None)
+        dict.__setitem__(self, key, value)
+        self.__invalidate(key)
 
     def __delitem__(self, key):
         dict.__delitem__(self, key)
-
-        pop = self.__dict__.pop
-        pop("album_key", None)
-        pop("sort_key", None)
+        self.__invalidate(key)
+
+    def __invalidate(self, key):
+        # drop cached values which could depend on the changed tag
+        if key[:1] != "~" or key in SORT_KEY_TAGS:
+            pop = self.__dict__.pop
+            pop("album_key", None)
+            pop("sort_key", None)
+        self.__dict__.pop("_pattern_memo", None)
+        _sortkeys.invalidate(self, key)
 
     @property
     def key(self):
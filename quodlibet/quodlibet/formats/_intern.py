@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""Sharing of equal tag keys and values between songs to save memory.
+
+Without it every loaded song has its own copies of keys like "artist" and
+of values like the artist name or the mount point.
+
+The shared values are kept in a table which only grows, as the values
+(strings and numbers) can't be referenced weakly; values no song uses
+anymore stay in it. Call `clear_shared_values()` once many songs are
+loaded to release it. Songs keep their shared values, values set later
+only get shared with each other.
+"""
+
+from quodlibet.compat import PY3
+
+if PY3:
+    from sys import intern
+else:
+    intern = intern
+
+
+INTERN_TAGS = frozenset([
+    "album", "albumartist", "albumartistsort", "albumsort", "artist",
+    "artistsort", "composer", "conductor", "date", "discnumber", "genre",
+    "grouping", "labelid", "language", "musicbrainz_albumartistid",
+    "musicbrainz_albumid", "musicbrainz_artistid", "organization",
+    "originaldate", "performer", "~mountpoint",
+])
+"""Tags whose values are often the same for many songs"""
+
+INTERN_NUMERIC_TAGS = frozenset([
+    "~#bitdepth", "~#bitrate", "~#channels", "~#disc", "~#discs",
+    "~#playcount", "~#rating", "~#samplerate", "~#skipcount", "~#track",
+    "~#tracks",
+])
+"""Numeric tags with few distinct values. Others, like ~#added, are
+mostly unique and sharing them would only cost memory.
+"""
+
+_enabled = False
+_values = {}
+
+
+def set_interning(enabled):
+    """Enable or disable sharing of keys and values for songs loaded and
+    tags set from now on.
+    """
+
+    global _enabled
+
+    _enabled = bool(enabled)
+    if not _enabled:
+        _values.clear()
+
+
+def clear_shared_values():
+    """Forget all shared values, see the module documentation"""
+
+    _values.clear()
+
+
+def is_interning():
+    return _enabled
+
+
+def intern_key(key):
+    """Returns the shared instance of a tag key"""
+
+    if PY3 or isinstance(key, bytes):
+        return intern(key)
+    return key
+
+
+def intern_value(key, value):
+    """Returns a shared instance equal to `value` if values of `key` are
+    worth sharing, otherwise `value`.
+    """
+
+    if key in INTERN_TAGS or key in INTERN_NUMERIC_TAGS:
+        if value != value:
+            # NaN
+            return value
+        # include the type, 1 == 1.0 and b"a" == u"a" under Python 2
+        return _values.setdefault((type(value), value), value)
+    return value
+
+
+def intern_song(song):
+    """Replaces the keys and values of a song (or any dict) with shared
+    ones in place.
+    """
+
+    items = list(song.items())
+    # updating an existing key keeps the old key object
+    dict.clear(song)
+    setitem = dict.__setitem__
+    for key, value in items:
+        setitem(song, intern_key(key), intern_value(key, value))
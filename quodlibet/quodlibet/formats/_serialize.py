@@ -15,6 +15,7 @@ from quodlibet.util.picklehelper import pickle_loads, pickle_dumps
 from quodlibet.util import is_windows
 from quodlibet.compat import PY3, text_type
 from ._audio import AudioFile
+from ._intern import is_interning, intern_song
 
 
 class SerializationError(Exception):
@@ -192,9 +193,37 @@ def load_audio_files(data, process=True):
     except AttributeError as e:
         raise SerializationError(e)
 
+    if is_interning():
+        for i in items:
+            intern_song(i)
+
     return items
 
 
+def snapshot_audio_files(item_list):
+    """Returns shallow copies of the passed AudioFiles, already converted
+    for serialization.
+
+    The result can be passed to `dump_audio_files` with `process=False`
+    from another thread while the original items get modified.
+
+    Args:
+        item_list (List[AudioFile])
+    Returns:
+        List[AudioFile]
+    """
+
+    if PY3:
+        return _py3_to_py2(item_list)
+
+    new_list = []
+    for i in item_list:
+        inst = dict.__new__(i.__class__)
+        dict.update(inst, i)
+        new_list.append(inst)
+    return new_list
+
+
 def dump_audio_files(item_list, process=True):
     """Pickles a list of AudioFiles
 
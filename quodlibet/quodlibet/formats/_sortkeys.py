@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""Sort keys of songs cached per song and column tag.
+
+The keys are kept in the `__dict__` of the song and only get dropped
+when a tag gets set which could change them. They can be persisted, so
+they don't have to be computed again after a restart.
+"""
+
+from quodlibet.util.picklehelper import pickle_dumps, pickle_loads, \
+    PickleError
+
+
+SORT_KEYS_VERSION = 1
+"""Increase if the way sort keys are computed changes"""
+
+# tags which don't only depend on the song (default rating, playlists..)
+_UNCACHEABLE = ["rating", "playlists", "lyrics"]
+
+# persisted keys of songs which haven't been used since loading:
+# song key -> {tag: sort key}
+_stored = {}
+
+
+def is_cacheable(tag):
+    """If sort keys for the tag (or pattern) only depend on the song"""
+
+    return not any(t in tag for t in _UNCACHEABLE)
+
+
+def is_relevant(changed, tag):
+    """If setting the tag `changed` could change the sort key for `tag`.
+
+    Real tags can be the source of any synthesized tag, internal ones
+    (except the filename) only of tags containing their name.
+    """
+
+    if changed[:1] != "~" or changed == "~filename":
+        return True
+    return changed.lstrip("~#") in tag
+
+
+def invalidate(song, changed):
+    """Drop the sort keys of the song which could change by setting
+    the tag `changed`.
+    """
+
+    keys = song.__dict__.get("_sort_keys")
+    if keys is None:
+        if _stored:
+            _stored.pop(song.get("~filename"), None)
+        return
+
+    for tag in [t for t in keys if is_relevant(changed, t)]:
+        del keys[tag]
+
+
+def get_sort_func(tag, func):
+    """Returns a function for sorting songs by the column `tag`, which
+    caches the keys returned by `func`.
+    """
+
+    if not is_cacheable(tag):
+        return func
+
+    def sort_func(song):
+        try:
+            return song.__dict__["_sort_keys"][tag]
+        except KeyError:
+            keys = song.__dict__.get("_sort_keys")
+            if keys is None:
+                keys = song.__dict__["_sort_keys"] = \
+                    _stored.pop(song.get("~filename"), None) or {}
+                if tag in keys:
+                    return keys[tag]
+            key = keys[tag] = func(song)
+            return key
+
+    return sort_func
+
+
+def load_sort_keys(data):
+    """Make persisted sort keys available to songs with the same key.
+
+    Raises:
+        PickleError
+    """
+
+    try:
+        version, keys = pickle_loads(data)
+    except (TypeError, ValueError) as e:
+        raise PickleError(e)
+    if version != SORT_KEYS_VERSION or not isinstance(keys, dict):
+        raise PickleError("unsupported sort keys")
+    _stored.clear()
+    _stored.update(keys)
+
+
+def snapshot_sort_keys(songs, song_keys):
+    """Returns a copy of the cached sort keys of the songs and the
+    persisted keys not used yet for songs with a key in `song_keys`,
+    which can be passed to `dump_sort_keys()` from another thread.
+    """
+
+    keys = {k: dict(v) for k, v in _stored.items() if k in song_keys}
+    for song in songs:
+        cached = song.__dict__.get("_sort_keys")
+        if cached:
+            keys[song.key] = dict(cached)
+    return keys
+
+
+def dump_sort_keys(keys):
+    """Returns the sort keys returned by `snapshot_sort_keys()` in a
+    format for `load_sort_keys()`.
+
+    Raises:
+        PickleError
+    """
+
+    return pickle_dumps((SORT_KEYS_VERSION, keys), 2)
@@ -16,32 +16,56 @@ also be queried in various ways.
 
 import time
 
-from quodlibet import print_d
+from quodlibet import print_d, print_w
 
-from quodlibet.library.libraries import SongFileLibrary, SongLibrary
+from quodlibet.library.libraries import SongFileLibrary, SongLibrary, \
+    JournalingSongFileLibrary, MappedSongFileLibrary
 from quodlibet.library.librarians import SongLibrarian
 from quodlibet.util.path import mtime
 
 
-def init(cache_fn=None):
+STORAGE = {
+    "pickle": SongFileLibrary,
+    "journal": JournalingSongFileLibrary,
+    "mapped": MappedSongFileLibrary,
+}
+"""Available main library types by the name of their persistence backend"""
+
+
+def init(cache_fn=None, storage="pickle", sort_keys=False):
     """Set up the library and return the main one.
 
     Return a main library, and set a librarian for
     all future SongLibraries.
+
+    `storage` selects how the main library is saved, see `STORAGE`.
+    If `sort_keys` is True the song list sort keys get saved and loaded
+    along with the main library.
     """
 
     SongFileLibrary.librarian = SongLibrary.librarian = SongLibrarian()
-    library = SongFileLibrary("main")
+    try:
+        Kind = STORAGE[storage]
+    except KeyError:
+        print_w("Unknown library storage %r, using pickle" % storage)
+        Kind = SongFileLibrary
+    library = Kind("main")
     if cache_fn:
         library.load(cache_fn)
+        if sort_keys:
+            library.persist_sort_keys = True
+            library.load_sort_keys()
     return library
 
 
-def save(save_period=None):
+def save(save_period=None, background=False):
     """Save all registered libraries that have a filename and are marked dirty.
 
     If `save_period` (seconds) is given the library will only be saved if
     it hasn't been in the last `save_period` seconds.
+
+    If `background` is True the libraries get written from a thread where
+    supported. Saving without it waits for those to finish first.
     """
 
     print_d("Saving all libraries...")
@@ -53,4 +77,6 @@ def save(save_period=None):
             continue
 
         if not save_period or abs(time.time() - mtime(filename)) > save_period:
-            lib.save()
+            lib.save(background=background)
+            if getattr(lib, "persist_sort_keys", False):
+                lib.save_sort_keys(background=background)
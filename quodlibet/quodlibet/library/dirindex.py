@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""Persisted per-directory state, to skip directories which haven't
+changed since they were last looked at.
+"""
+
+import os
+import time
+
+from quodlibet import util
+from quodlibet.util.atomic import atomic_save
+from quodlibet.util.dprint import print_d, print_w
+from quodlibet.util.path import mkdir, normalize_path
+from quodlibet.util.picklehelper import pickle_dumps, pickle_loads, \
+    PickleError
+
+
+# Directories changed less than this many seconds ago don't get remembered,
+# with a coarse mtime resolution a later change could go unnoticed.
+MTIME_GRACE = 2
+
+
+class DirectoryIndex(object):
+    """Maps directory paths to (picklable) values and can be persisted.
+
+    If a filename is given, the index gets loaded from it and `save()`
+    writes to it.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.dirty = False
+        self._dirs = {}
+
+        if filename is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, "rb") as fileobj:
+                data = fileobj.read()
+        except EnvironmentError:
+            return
+
+        try:
+            dirs = pickle_loads(data)
+            if not isinstance(dirs, dict):
+                raise PickleError("not a dict")
+        except PickleError:
+            util.print_exc()
+            return
+
+        print_d("Loaded %d directories from %r" % (len(dirs), self.filename))
+        self._dirs = dirs
+
+    def save(self):
+        """Write the index to its file if anything has changed"""
+
+        if self.filename is None or not self.dirty:
+            return
+
+        try:
+            mkdir(os.path.dirname(self.filename))
+            with atomic_save(self.filename, "wb") as fileobj:
+                fileobj.write(pickle_dumps(self._dirs, 2))
+        except PickleError:
+            util.print_exc()
+        except EnvironmentError:
+            print_w("Couldn't save directory index to %r" % self.filename)
+        else:
+            self.dirty = False
+
+    def __len__(self):
+        return len(self._dirs)
+
+    def __contains__(self, path):
+        return path in self._dirs
+
+    def __getitem__(self, path):
+        return self._dirs[path]
+
+    def __setitem__(self, path, value):
+        if self._dirs.get(path) != value:
+            self._dirs[path] = value
+            self.dirty = True
+
+    def get(self, path, default=None):
+        return self._dirs.get(path, default)
+
+    def pop(self, path, *args):
+        if path in self._dirs:
+            self.dirty = True
+        return self._dirs.pop(path, *args)
+
+    def keys(self):
+        return list(self._dirs.keys())
+
+    def copy(self):
+        """Returns an in-memory copy"""
+
+        new = DirectoryIndex()
+        new._dirs = dict(self._dirs)
+        return new
+
+    def replace(self, other):
+        """Replace all entries with the ones of another index"""
+
+        if other._dirs != self._dirs:
+            self._dirs = dict(other._dirs)
+            self.dirty = True
+
+    def remember(self, path, mtime, value):
+        """Set `value` for the directory `path` with the given mtime.
+
+        If the directory changed less than MTIME_GRACE seconds ago, the
+        entry gets removed instead, so it gets looked at again next time.
+        """
+
+        if time.time() - mtime > MTIME_GRACE:
+            self[path] = value
+        else:
+            self.pop(path, None)
+
+    def retain(self, paths):
+        """Remove all directories not in paths"""
+
+        for path in self.keys():
+            if path not in paths:
+                self.pop(path)
+
+
+def dir_mtime(path):
+    """Returns the mtime of a directory or None if it doesn't exist"""
+
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def stat_files(path):
+    """Returns (mtime, size) for all entries of a directory, using one
+    directory listing where possible.
+
+    Returns:
+        Dict[fsnative, Tuple[float, int]]: normalized path -> (mtime, size)
+    Raises:
+        OSError
+    """
+
+    result = {}
+    if hasattr(os, "scandir"):
+        for entry in os.scandir(path):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            result[normalize_path(entry.path)] = (stat.st_mtime, stat.st_size)
+    else:
+        for name in os.listdir(path):
+            full_path = os.path.join(path, name)
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+            result[normalize_path(full_path)] = (stat.st_mtime, stat.st_size)
+    return result
+
+
+def walk(top, index):
+    """Like `os.walk()` (top-down, not following symlinks) but directories
+    which are unchanged since the last walk with the same index don't get
+    listed and are yielded without files.
+
+    The entries for the walked directories get updated in `index`.
+    Removing names from the yielded directory list prevents descending
+    into them, like with `os.walk()`.
+
+    Args:
+        top (fsnative)
+        index (DirectoryIndex)
+    Yields:
+        Tuple[fsnative, List[fsnative], List[fsnative]]:
+            (path, directory names, file names)
+    """
+
+    try:
+        mtime = os.stat(top).st_mtime
+    except OSError:
+        index.pop(top, None)
+        return
+
+    entry = index.get(top)
+    if entry is not None and entry[0] == mtime:
+        dnames, fnames = list(entry[1]), []
+    else:
+        dnames, fnames = [], []
+        try:
+            names = os.listdir(top)
+        except OSError:
+            index.pop(top, None)
+            return
+        for name in names:
+            if os.path.isdir(os.path.join(top, name)):
+                dnames.append(name)
+            else:
+                fnames.append(name)
+        index.remember(top, mtime, (mtime, tuple(dnames)))
+
+    yield top, dnames, fnames
+
+    for name in dnames:
+        path = os.path.join(top, name)
+        if not os.path.islink(path):
+            for result in walk(path, index):
+                yield result
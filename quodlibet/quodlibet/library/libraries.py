@@ -16,26 +16,40 @@ least useful but most content-agnostic.
 
 import os
 import shutil
+import struct
+import threading
 import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, \
+    TimeoutError as FutureTimeoutError
 
 from gi.repository import GObject
 from senf import fsn2text, fsnative
 
 from quodlibet import _
+from quodlibet.formats._sortkeys import load_sort_keys, dump_sort_keys, \
+    snapshot_sort_keys
 from quodlibet.formats import MusicFile, AudioFileError, load_audio_files, \
-    dump_audio_files, SerializationError
+    dump_audio_files, snapshot_audio_files, SerializationError
 from quodlibet.query import Query
+from quodlibet.library.dirindex import DirectoryIndex, dir_mtime, \
+    stat_files, walk as walk_dirs
+from quodlibet.library.mapped import MappedSongs, MappedWriter, \
+    MappedFormatError, LazyContents, load_mapped_audio_files, MAGIC
+from quodlibet.library.tagindex import TagIndex
 from quodlibet.qltk.notif import Task
 from quodlibet.util.atomic import atomic_save
+from quodlibet.util.picklehelper import pickle_dumps, pickle_loads, \
+    PickleError
 from quodlibet.util.collection import Album
 from quodlibet.util.collections import DictMixin
 from quodlibet import util
 from quodlibet import formats
 from quodlibet.util.dprint import print_d, print_w
 from quodlibet.util.path import unexpand, mkdir, normalize_path, ishidden, \
-    ismount
+    ismount, filesize
 from quodlibet.compat import iteritems, iterkeys, itervalues, listkeys, \
-    listvalues, listfilter
+    listvalues
 
 
 class Library(GObject.GObject, DictMixin):
@@ -220,8 +234,11 @@ def _load_items(filename):
         return []
 
     try:
-        items = load_audio_files(data)
-    except SerializationError:
+        if data.startswith(MAGIC):
+            items = load_mapped_audio_files(data)
+        else:
+            items = load_audio_files(data)
+    except (SerializationError, MappedFormatError):
         # there are too many ways this could fail
         util.print_exc()
 
@@ -236,6 +253,99 @@ def _load_items(filename):
     return items
 
 
+_JOURNAL_HEADER = "<I"
+
+
+def _journal_filenames(filename):
+    """Returns the paths of the active and the rotated journal belonging
+    to a library file.
+    """
+
+    return (filename + fsnative(u".journal"),
+            filename + fsnative(u".journal.old"))
+
+
+def _read_journal(filename):
+    """Read all records from a journal file.
+
+    Reading stops at the first incomplete or broken record, which is what
+    is left behind if writing got interrupted.
+
+    Returns:
+        Tuple[List[Tuple[List[fsnative], List[AudioFile]]], bool]:
+            a list of (removed keys, changed items) records and whether
+            the whole file could be read
+    """
+
+    try:
+        with open(filename, "rb") as fp:
+            data = fp.read()
+    except EnvironmentError:
+        return [], not os.path.exists(filename)
+
+    records = []
+    header_size = struct.calcsize(_JOURNAL_HEADER)
+    offset = 0
+    while offset < len(data):
+        if offset + header_size > len(data):
+            break
+        size = struct.unpack_from(_JOURNAL_HEADER, data, offset)[0]
+        start = offset + header_size
+        if start + size > len(data):
+            break
+        try:
+            removed, dumped = pickle_loads(data[start:start + size])
+            items = load_audio_files(dumped)
+        except (PickleError, SerializationError, TypeError, ValueError):
+            util.print_exc()
+            break
+        records.append((removed, items))
+        offset = start + size
+    else:
+        return records, True
+
+    print_w("Skipping broken journal data in %r" % filename)
+    return records, False
+
+
+def _load_journaled_items(filename):
+    """Load items from disk and apply the journals written since.
+
+    Returns:
+        Tuple[List[AudioFile], bool]: the items and whether all journal
+            data could be applied
+    """
+
+    items = _load_items(filename)
+
+    journals = [j for j in _journal_filenames(filename) if os.path.exists(j)]
+    if not journals:
+        return items, True
+
+    contents = {item.key: item for item in items}
+    complete = True
+    # the rotated journal predates the active one
+    for journal in reversed(journals):
+        records, ok = _read_journal(journal)
+        complete = complete and ok
+        print_d("Applying %d records from %r" % (len(records), journal))
+        for removed, changed in records:
+            for key in removed:
+                contents.pop(key, None)
+            for item in changed:
+                contents[item.key] = item
+
+    return listvalues(contents), complete
+
+
+def _remove_journals(filename):
+    for journal in _journal_filenames(filename):
+        try:
+            os.unlink(journal)
+        except EnvironmentError:
+            pass
+
+
 class PicklingMixin(object):
     """A mixin to provide persistence of a library by pickling to disk"""
 
@@ -250,7 +360,8 @@ class PicklingMixin(object):
         self.filename = filename
         print_d("Loading contents of %r." % filename, self)
 
-        items = _load_items(filename)
+        # in case the library was saved with journaling before
+        items = _load_journaled_items(filename)[0]
 
         # this loads all items without checking their validity, but makes
         # sure that non-mounted items are masked
@@ -258,28 +369,348 @@ class PicklingMixin(object):
 
         print_d("Done loading contents of %r." % filename, self)
 
-    def save(self, filename=None):
-        """Save the library to the given filename, or the default if `None`"""
+    def save(self, filename=None, background=False):
+        """Save the library to the given filename, or the default if `None`.
+
+        If `background` is True the items get copied and written from a
+        thread, so the main loop doesn't block, see `wait_for_save()`.
+        """
 
         if filename is None:
             filename = self.filename
 
+        if background:
+            if self.is_saving():
+                return
+            print_d("Saving contents to %r in the background." % filename,
+                    self)
+            # copy the items here, so they can be pickled in the thread
+            # while the library changes
+            items = snapshot_audio_files(self.get_content())
+            if filename == self.filename:
+                self.dirty = False
+
+            def write_snapshot():
+                if not self.__write_items(filename, items, False):
+                    if filename == self.filename:
+                        self.dirty = True
+
+            self._start_save_thread(write_snapshot)
+            return
+
+        # don't let an older background save overwrite this one
+        self.wait_for_save()
         print_d("Saving contents to %r." % filename, self)
+        if self.__write_items(filename, self.get_content(), True):
+            self.dirty = False
+
+    def __write_items(self, filename, items, process):
+        """Returns True if the items got written"""
 
         try:
-            dirname = os.path.dirname(filename)
-            mkdir(dirname)
+            mkdir(os.path.dirname(filename))
+            data = dump_audio_files(items, process=process)
             with atomic_save(filename, "wb") as fileobj:
-                fileobj.write(dump_audio_files(self.get_content()))
+                fileobj.write(data)
         except SerializationError:
             # Can happen when we try to pickle while the library is being
-            # modified, like in the periodic 15min save.
-            # Ignore, as it should try again later or on program exit.
+            # modified. Ignore, as it should try again later or on
+            # program exit.
             util.print_exc()
         except EnvironmentError:
             print_w("Couldn't save library to path: %r" % filename)
         else:
-            self.dirty = False
+            if filename == self.filename:
+                _remove_journals(filename)
+            return True
+        return False
+
+    _save_thread = None
+
+    def _start_save_thread(self, target):
+        self._save_thread = threading.Thread(target=target)
+        self._save_thread.start()
+
+    def is_saving(self):
+        """If a save is running in the background"""
+
+        return self._save_thread is not None and self._save_thread.is_alive()
+
+    def wait_for_save(self):
+        """Block until a save running in the background is done"""
+
+        if self._save_thread is not None:
+            self._save_thread.join()
+            self._save_thread = None
+
+
+class JournalingMixin(PicklingMixin):
+    """A mixin to provide persistence of a library by pickling a snapshot
+    to disk and appending everything added, changed or removed since to a
+    journal.
+
+    Saving only writes the items reported by the library signals since the
+    last save. Once the journal has grown too large compared to the snapshot
+    a new snapshot gets written from a background thread.
+    """
+
+    COMPACT_MIN_SIZE = 1024 * 1024
+    """Journal size in bytes below which the snapshot is never rewritten"""
+
+    COMPACT_RATIO = 0.25
+    """Journal size relative to the snapshot size which triggers a new
+    snapshot"""
+
+    def __init__(self, *args, **kwargs):
+        super(JournalingMixin, self).__init__(*args, **kwargs)
+        # item -> the key it was last saved with
+        self._journal_keys = {}
+        self._journal_pending = set()
+        self._journal_size = 0
+        self._snapshot_size = 0
+        self._needs_compaction = False
+        for signal in ["added", "changed", "removed"]:
+            self.connect(signal, self.__journal_items)
+
+    def __journal_items(self, library, items):
+        self._journal_pending.update(items)
+
+    def _journal_contains(self, item):
+        """If the item is part of what gets saved"""
+
+        return self._contents.get(item.key) is item
+
+    def load(self, filename):
+        """Load a library from a snapshot file and its journal.
+
+        Loading does not cause added, changed, or removed signals.
+        """
+
+        self.filename = filename
+        print_d("Loading contents of %r." % filename, self)
+
+        items, complete = _load_journaled_items(filename)
+        self._load_init(items)
+
+        self._journal_keys = {item: item.key for item in self.get_content()}
+        self._journal_pending.clear()
+        self._snapshot_size = filesize(filename)
+        self._journal_size = filesize(_journal_filenames(filename)[0])
+        # don't append to a journal we failed to read
+        self._needs_compaction = not complete
+
+        print_d("Done loading contents of %r." % filename, self)
+
+    def save(self, filename=None, background=False):
+        """Append the changes since the last save to the journal.
+
+        If a filename other than the one loaded from is given a full
+        snapshot gets written there instead. Appending is cheap, so it
+        always happens right away, independent of `background`.
+        """
+
+        if filename is not None and filename != self.filename:
+            return super(JournalingMixin, self).save(filename, background)
+
+        filename = self.filename
+        print_d("Journaling changes to %r." % filename, self)
+
+        keys = self._journal_keys
+        removed = []
+        changed = []
+        for item in self._journal_pending:
+            old_key = keys.get(item)
+            present = self._journal_contains(item)
+            if old_key is not None and (not present or old_key != item.key):
+                removed.append(old_key)
+            if present:
+                changed.append(item)
+
+        if not self._needs_compaction and (removed or changed):
+            journal = _journal_filenames(filename)[0]
+            try:
+                record = pickle_dumps((removed, dump_audio_files(changed)), 2)
+                mkdir(os.path.dirname(filename))
+                with open(journal, "ab") as fileobj:
+                    fileobj.write(
+                        struct.pack(_JOURNAL_HEADER, len(record)) + record)
+                    fileobj.flush()
+                    os.fsync(fileobj.fileno())
+            except (SerializationError, PickleError):
+                util.print_exc()
+                return
+            except EnvironmentError:
+                print_w("Couldn't write library journal to path: %r" %
+                        journal)
+                # a partially written record would hide all following ones
+                self._needs_compaction = True
+            else:
+                self._journal_size += len(record)
+
+        for item in self._journal_pending:
+            if not self._journal_contains(item):
+                keys.pop(item, None)
+            else:
+                keys[item] = item.key
+        self._journal_pending.clear()
+        self.dirty = False
+
+        limit = max(self.COMPACT_MIN_SIZE,
+                    self._snapshot_size * self.COMPACT_RATIO)
+        if self._needs_compaction or self._journal_size > limit:
+            self.__compact(filename)
+
+    def __compact(self, filename):
+        """Write a new snapshot in a thread and drop the journal"""
+
+        if self.is_saving():
+            return
+
+        print_d("Compacting library journal of %r." % filename, self)
+
+        # copy the items here, so they can be pickled in the thread while
+        # the library changes
+        items = snapshot_audio_files(self.get_content())
+
+        # start a new journal for everything that happens from now on.
+        # In case an older rotated journal is still around (the last
+        # snapshot failed) append to it, it's only removed once it is
+        # covered by a snapshot.
+        journal, rotated = _journal_filenames(filename)
+        try:
+            if not os.path.exists(journal):
+                pass
+            elif os.path.exists(rotated):
+                with open(journal, "rb") as src:
+                    with open(rotated, "ab") as dest:
+                        shutil.copyfileobj(src, dest)
+                os.unlink(journal)
+            elif os.path.exists(journal):
+                os.rename(journal, rotated)
+        except EnvironmentError:
+            print_w("Couldn't rotate library journal: %r" % journal)
+            return
+
+        self._journal_size = 0
+        self._needs_compaction = False
+
+        def write_snapshot():
+            try:
+                mkdir(os.path.dirname(filename))
+                data = dump_audio_files(items, process=False)
+                with atomic_save(filename, "wb") as fileobj:
+                    fileobj.write(data)
+            except SerializationError:
+                util.print_exc()
+            except EnvironmentError:
+                print_w("Couldn't save library to path: %r" % filename)
+            else:
+                self._snapshot_size = len(data)
+                try:
+                    os.unlink(rotated)
+                except EnvironmentError:
+                    pass
+
+        self._start_save_thread(write_snapshot)
+
+
+class MappingMixin(PicklingMixin):
+    """A mixin to provide persistence of a library in the mapped format,
+    see `quodlibet.library.mapped`.
+
+    Loading only reads the item keys, items get decoded on first access.
+    Items which were never accessed get copied over without decoding them
+    when saving.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MappingMixin, self).__init__(*args, **kwargs)
+        self._contents = LazyContents()
+
+    def _load_mapped(self, mapped):
+        """Replace the contents with the items of a MappedSongs instance"""
+
+        lazy = {key: index for index, key, mount in mapped.keys()}
+        self._contents = LazyContents(mapped, lazy)
+
+    def _get_loaded_content(self):
+        """All items to save which are not backed by the mapped file"""
+
+        return list(self._contents.iter_loaded())
+
+    def load(self, filename):
+        """Load a library from a file in the mapped format, or any format
+        supported by `PicklingMixin`.
+
+        Loading does not cause added, changed, or removed signals.
+        """
+
+        self.filename = filename
+        print_d("Loading contents of %r." % filename, self)
+
+        mapped = None
+        if not any(map(os.path.exists, _journal_filenames(filename))):
+            try:
+                mapped = MappedSongs.open(filename)
+            except EnvironmentError:
+                pass
+            except MappedFormatError:
+                # a pickle, convert on the next save
+                self.dirty = True
+
+        if mapped is None:
+            self._contents = LazyContents()
+            super(MappingMixin, self).load(filename)
+            return
+
+        self._load_mapped(mapped)
+
+        print_d("Done loading contents of %r." % filename, self)
+
+    def save(self, filename=None, background=False):
+        """Save the library to the given filename, or the default if `None`.
+
+        Items which were never accessed only get copied, so this is always
+        done right away, independent of `background`.
+        """
+
+        if filename is None:
+            filename = self.filename
+
+        self.wait_for_save()
+        print_d("Saving contents to %r." % filename, self)
+
+        writer = MappedWriter()
+        for item in self._get_loaded_content():
+            writer.add(item)
+        mapped = self._contents.mapped
+        lazy = {}
+        for key, index in self._contents.iter_mapped():
+            lazy[key] = len(writer)
+            writer.add_mapped(mapped, index)
+
+        try:
+            mkdir(os.path.dirname(filename))
+            with atomic_save(filename, "wb") as fileobj:
+                writer.write(fileobj)
+        except EnvironmentError:
+            print_w("Couldn't save library to path: %r" % filename)
+            return
+
+        if filename != self.filename:
+            return
+
+        _remove_journals(filename)
+        self.dirty = False
+
+        if lazy:
+            # decode from the new file from now on, so the old one can go
+            try:
+                mapped = MappedSongs.open(filename)
+            except (EnvironmentError, MappedFormatError):
+                util.print_exc()
+            else:
+                self._contents.rebind(mapped, lazy)
 
 
 class PicklingLibrary(Library, PicklingMixin):
@@ -306,6 +737,8 @@ class AlbumLibrary(Library):
             "AlbumLibrary for %s" % library._name)
 
         self._library = library
+        # song -> album containing it
+        self._song_albums = {}
         self._asig = library.connect('added', self.__added)
         self._rsig = library.connect('removed', self.__removed)
         self._csig = library.connect('changed', self.__changed)
@@ -325,15 +758,18 @@ class AlbumLibrary(Library):
     def __add(self, items):
         changed = set()
         new = set()
+        song_albums = self._song_albums
         for song in items:
             key = song.album_key
-            if key in self._contents:
-                changed.add(self._contents[key])
+            album = self._contents.get(key)
+            if album is not None:
+                changed.add(album)
             else:
                 album = Album(song)
                 self._contents[key] = album
                 new.add(album)
-            self._contents[key].songs.add(song)
+            album.add_song(song)
+            song_albums[song] = album
 
         changed -= new
         return changed, new
@@ -341,9 +777,6 @@ class AlbumLibrary(Library):
     def __added(self, library, items, signal=True):
         changed, new = self.__add(items)
 
-        for album in changed:
-            album.finalize()
-
         if signal:
             if new:
                 self.emit('added', new)
@@ -354,19 +787,15 @@ class AlbumLibrary(Library):
         changed = set()
         removed = set()
         for song in items:
-            key = song.album_key
-            album = self._contents[key]
-            album.songs.remove(song)
+            album = self._song_albums.pop(song)
+            album.remove_song(song)
             changed.add(album)
             if not album.songs:
                 removed.add(album)
-                del self._contents[key]
+                del self._contents[album.key]
 
         changed -= removed
 
-        for album in changed:
-            album.finalize()
-
         if removed:
             self.emit('removed', removed)
         if changed:
@@ -374,26 +803,29 @@ class AlbumLibrary(Library):
 
     def __changed(self, library, items):
         """Album keys could change between already existing ones.. so we
-        have to do it the hard way and search by id."""
+        look up the album a song was in and move it if the key changed."""
         print_d("Updating affected albums for %d items" % len(items))
         changed = set()
         removed = set()
         to_add = []
+        song_albums = self._song_albums
         for song in items:
+            album = song_albums.get(song)
             # in case the key hasn't changed
-            key = song.album_key
-            if key in self._contents and song in self._contents[key].songs:
-                changed.add(self._contents[key])
-            else:  # key changed.. look for it in each album
-                to_add.append(song)
-                for key, album in iteritems(self._contents):
-                    if song in album.songs:
-                        album.songs.remove(song)
-                        if not album.songs:
-                            removed.add(album)
-                        else:
-                            changed.add(album)
-                        break
+            if album is not None and album is self._contents.get(
+                    song.album_key):
+                album.update_song(song)
+                changed.add(album)
+                continue
+
+            to_add.append(song)
+            if album is not None:
+                del song_albums[song]
+                album.remove_song(song)
+                if not album.songs:
+                    removed.add(album)
+                else:
+                    changed.add(album)
 
         # get new albums and changed ones because keys could have changed
         add_changed, new = self.__add(to_add)
@@ -405,9 +837,6 @@ class AlbumLibrary(Library):
                 del self._contents[album.key]
                 changed.discard(album)
 
-        for album in changed:
-            album.finalize()
-
         if removed:
             self.emit("removed", removed)
         if changed:
@@ -423,17 +852,65 @@ class SongLibrary(PicklingLibrary):
     interface.
     """
 
+    tag_index = None
+    """A `TagIndex` used for queries, if enabled"""
+
+    generation = 0
+    """Increases whenever songs get added, changed or removed"""
+
+    QUERY_CACHE_SIZE = 20
+    """Number of query results to keep around"""
+
+    _QUERY_LOG_SIZE = 5000
+    """Number of changed songs to remember for updating cached results"""
+
     def __init__(self, *args, **kwargs):
         super(SongLibrary, self).__init__(*args, **kwargs)
+        # (text, star) -> [generation, query, songs]
+        self._query_cache = OrderedDict()
+        # (generation, songs) for every change since the oldest cached result
+        self._query_log = []
+        self._query_log_size = 0
+        for signal in ["added", "changed", "removed"]:
+            self.connect(signal, self.__songs_changed)
+
+    def __songs_changed(self, library, songs):
+        self.generation += 1
+        if not self._query_cache:
+            return
+        songs = list(songs)
+        self._query_log.append((self.generation, songs))
+        self._query_log_size += len(songs)
+        if self._query_log_size > self._QUERY_LOG_SIZE:
+            self.clear_query_cache()
+
+    def clear_query_cache(self):
+        """Forget all cached query results"""
+
+        self._query_cache.clear()
+        del self._query_log[:]
+        self._query_log_size = 0
 
     @util.cached_property
     def albums(self):
         return AlbumLibrary(self)
 
+    def enable_tag_index(self):
+        """Keep an index of the words in tags, so queries don't have to
+        look at every song.
+        """
+
+        if self.tag_index is None:
+            self.tag_index = TagIndex(self)
+
     def destroy(self):
         super(SongLibrary, self).destroy()
         if "albums" in self.__dict__:
             self.albums.destroy()
+        if self.tag_index is not None:
+            self.tag_index.destroy()
+            self.tag_index = None
+        self.clear_query_cache()
 
     def tag_values(self, tag):
         """Return a set of all values for the given tag."""
@@ -463,17 +940,84 @@ class SongLibrary(PicklingLibrary):
             self.changed({song})
 
     def query(self, text, sort=None, star=Query.STAR):
-        """Query the library and return matching songs."""
-        if isinstance(text, bytes):
-            text = text.decode('utf-8')
+        """Query the library and return matching songs.
 
-        songs = self.values()
-        if text != "":
-            songs = listfilter(Query(text, star).search, songs)
+        `text` can also be a `Query`.
+
+        Results of queries which only depend on the songs are cached and
+        updated with the songs changed since, as long as the same query
+        gets repeated.
+        """
+
+        if isinstance(text, Query):
+            query = text
+            key = (query.string, tuple(query.star))
+        else:
+            if isinstance(text, bytes):
+                text = text.decode('utf-8')
+            if text == "":
+                return self.values()
+            query = None
+            key = (text, tuple(star))
+
+        cache = self._query_cache
+        entry = cache.pop(key, None)
+        if entry is not None:
+            cache[key] = entry
+            if self.__update_cached(entry):
+                return list(entry[2])
+            del cache[key]
+
+        if query is None:
+            query = Query(text, star)
+
+        songs = self.__run_query(query)
+        if query.cacheable():
+            if not cache:
+                self.clear_query_cache()
+            cache[key] = [self.generation, query, songs]
+            while len(cache) > self.QUERY_CACHE_SIZE:
+                cache.popitem(last=False)
+            songs = list(songs)
         return songs
 
+    def __update_cached(self, entry):
+        """Bring a cached result up to date by testing the songs changed
+        since. Returns False if the changes aren't known.
+        """
+
+        generation, query, songs = entry
+        if generation == self.generation:
+            return True
+
+        log = self._query_log
+        if not log or log[0][0] > generation + 1:
+            return False
+
+        changed = set()
+        for gen, log_songs in log:
+            if gen > generation:
+                changed.update(log_songs)
+
+        contents = self._contents
+        songs = [s for s in songs if s not in changed]
+        songs.extend(
+            s for s in changed
+            if contents.get(s.key) is s and query.search(s))
+        entry[0] = self.generation
+        entry[2] = songs
+        return True
+
+    def __run_query(self, query):
+        songs = self.values()
+        if self.tag_index is not None:
+            candidates = query.candidates(self.tag_index)
+            if candidates is not None:
+                songs = [s for s in songs if s in candidates]
+        return query.filter(songs)
+
 
-def iter_paths(root, exclude=[], skip_hidden=True):
+def iter_paths(root, exclude=[], skip_hidden=True, dir_index=None):
     """yields paths contained in root (symlinks dereferenced)
 
     Any path starting with any of the path parts included in exclude
@@ -481,11 +1025,15 @@ def iter_paths(root, exclude=[], skip_hidden=True):
 
     Directory symlinks are not followed (except root itself)
 
+    If a `DirectoryIndex` is passed, files in directories which haven't
+    changed since the last call with the same index are skipped.
+
     Args:
         root (fsnative)
         exclude (List[fsnative])
         skip_hidden (bool): Ignore files which are hidden or where any
             of the parent directories are hidden.
+        dir_index (DirectoryIndex or None)
     Yields:
         fsnative: absolute dereferenced paths
     """
@@ -494,27 +1042,39 @@ def iter_paths(root, exclude=[], skip_hidden=True):
     assert all((isinstance(p, fsnative) for p in exclude))
     assert os.path.abspath(root)
 
+    def excluded(path):
+        # FIXME: normalize paths..
+        return any((path.startswith(p) for p in exclude))
+
     def skip(path):
         if skip_hidden and ishidden(path):
             return True
-        # FIXME: normalize paths..
-        return any((path.startswith(p) for p in exclude))
+        return excluded(path)
 
     if skip_hidden and ishidden(root):
         return
 
-    for path, dnames, fnames in os.walk(root):
+    if dir_index is None:
+        walker = os.walk(root)
+    else:
+        walker = walk_dirs(root, dir_index)
+
+    for path, dnames, fnames in walker:
         if skip_hidden:
             dnames[:] = list(filter(
                 lambda d: not ishidden(os.path.join(path, d)), dnames))
         for filename in fnames:
             fullfilename = os.path.join(path, filename)
-            if skip(fullfilename):
-                continue
-            fullfilename = os.path.realpath(fullfilename)
-            if skip(fullfilename):
-                continue
-            yield fullfilename
+            realfilename = None
+            if not skip(fullfilename):
+                realfilename = os.path.realpath(fullfilename)
+                if not skip(realfilename):
+                    yield realfilename
+                    continue
+            # in case the exclude list changes, list the directory again
+            if dir_index is not None and (excluded(fullfilename) or
+                    (realfilename is not None and excluded(realfilename))):
+                dir_index.pop(path, None)
 
 
 class FileLibrary(PicklingLibrary):
@@ -527,6 +1087,7 @@ class FileLibrary(PicklingLibrary):
     def __init__(self, name=None):
         super(FileLibrary, self).__init__(name)
         self._masked = {}
+        self._dir_indices = {}
 
     def _load_init(self, items):
         """Add many items to the library, check if the
@@ -634,16 +1195,20 @@ class FileLibrary(PicklingLibrary):
             else:
                 removed.add(item)
 
-    def rebuild(self, paths, force=False, exclude=[], cofuncid=None):
+    def rebuild(self, paths, force=False, exclude=[], cofuncid=None,
+                workers=0, skip_unchanged=False):
         """Reload or remove songs if they have changed or been deleted.
 
         This generator rebuilds the library over the course of iteration.
 
         Any paths given will be scanned for new files, using the 'scan'
-        method.
+        method (`workers` gets passed to it).
 
         Only items present in the library when the rebuild is started
-        will be checked.
+        will be checked. If `skip_unchanged` is True, libraries which
+        support it may skip items in directories which haven't changed
+        since the last rebuild, and unchanged directories don't get
+        scanned (unless `force` is True).
 
         If this function is copooled, set "cofuncid" to enable pause/stop
         buttons in the UI.
@@ -661,24 +1226,24 @@ class FileLibrary(PicklingLibrary):
                 self.emit('added', listvalues(items))
                 yield True
 
-        task = Task(_("Library"), _("Scanning library"))
-        if cofuncid:
-            task.copool(cofuncid)
         changed, removed = set(), set()
-        for i, (key, item) in task.list(enumerate(sorted(self.items()))):
-            if key in self._contents and force or not item.valid():
-                self.reload(item, changed, removed)
+        with Task(_("Library"), _("Scanning library")) as task:
+            if cofuncid:
+                task.copool(cofuncid)
+            for item in self._check_items(task, force, skip_unchanged):
+                if item is not None:
+                    self.reload(item, changed, removed)
                 # These numbers are pretty empirical. We should yield more
-            # often than we emit signals; that way the main loop stays
-            # interactive and doesn't get bogged down in updates.
-            if len(changed) > 100:
-                self.emit('changed', changed)
-                changed = set()
-            if len(removed) > 100:
-                self.emit('removed', removed)
-                removed = set()
-            if len(changed) > 5 or i % 100 == 0:
-                yield True
+                # often than we emit signals; that way the main loop stays
+                # interactive and doesn't get bogged down in updates.
+                if len(changed) > 100:
+                    self.emit('changed', changed)
+                    changed = set()
+                if len(removed) > 100:
+                    self.emit('removed', removed)
+                    removed = set()
+                if item is None or len(changed) > 5:
+                    yield True
         print_d("Removing %d, changing %d." % (len(removed), len(changed)),
                 self)
         if removed:
@@ -686,9 +1251,39 @@ class FileLibrary(PicklingLibrary):
         if changed:
             self.emit('changed', changed)
 
-        for value in self.scan(paths, exclude, cofuncid):
+        for value in self.scan(paths, exclude, cofuncid, workers,
+                               skip_unchanged and not force):
             yield value
 
+    def _check_items(self, task, force=False, skip_unchanged=False):
+        """Yields all items which need to be reloaded and None from time
+        to time, so the caller can return to the main loop.
+
+        Only items present at the start get checked.
+        """
+
+        items = sorted(self.items())
+        total = len(items)
+        for i, (key, item) in enumerate(items):
+            if i % 100 == 0:
+                task.update(float(i) / total)
+                yield None
+            if key in self._contents and force or not item.valid():
+                yield item
+
+    def _get_dir_index(self, name):
+        """Returns the `DirectoryIndex` with the given name which belongs
+        to the current library file (in memory only if there is none)
+        """
+
+        filename = None
+        if self.filename is not None:
+            filename = self.filename + fsnative(u"." + name)
+        index = self._dir_indices.get(name)
+        if index is None or index.filename != filename:
+            index = self._dir_indices[name] = DirectoryIndex(filename)
+        return index
+
     def add_filename(self, filename, add=True):
         """Add a file based on its filename.
 
@@ -706,7 +1301,78 @@ class FileLibrary(PicklingLibrary):
 
         raise NotImplementedError
 
-    def scan(self, paths, exclude=[], cofuncid=None):
+    def _read_filename(self, filename):
+        """Read the data needed for a new item from a file.
+
+        Gets called from worker threads, so must not touch the library.
+        The result gets passed to `_create_item` in the main thread.
+        """
+
+        raise NotImplementedError
+
+    def _create_item(self, data):
+        """Returns a new item (not added) for the result of
+        `_read_filename` or None.
+        """
+
+        raise NotImplementedError
+
+    def _load_filenames(self, filenames, workers, task):
+        """Yields new items for filenames (not added) or None if loading
+        failed, reading the files in `workers` threads.
+
+        Also yields None while waiting for the threads, so callers can
+        return to the main loop.
+        """
+
+        if not filenames:
+            return
+
+        pool = ThreadPoolExecutor(workers)
+        pending = deque()
+        todo = iter(filenames)
+        done = 0
+        try:
+            while True:
+                # keep the pool busy, but don't read ahead too much
+                for filename in todo:
+                    pending.append(pool.submit(self._read_filename, filename))
+                    if len(pending) >= workers * 4:
+                        break
+                if not pending:
+                    break
+
+                try:
+                    data = pending[0].result(timeout=0.01)
+                except FutureTimeoutError:
+                    yield None
+                    continue
+                except Exception:
+                    util.print_exc()
+                    data = None
+                pending.popleft()
+
+                done += 1
+                task.update(float(done) / len(filenames))
+                yield self._create_item(data)
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def scan(self, paths, exclude=[], cofuncid=None, workers=0,
+             skip_unchanged=False):
+        """Add all new files found in paths.
+
+        If `workers` is larger than 0 the files get read in as many
+        threads, otherwise one after another in the main loop.
+
+        If `skip_unchanged` is True, directories which haven't changed
+        since the last completed scan don't get listed.
+
+        If this function is copooled, set "cofuncid" to enable pause/stop
+        buttons in the UI.
+        """
 
         def need_yield(last_yield=[0]):
             current = time.time()
@@ -722,6 +1388,12 @@ class FileLibrary(PicklingLibrary):
                 return True
             return False
 
+        # only remember the directories once all files have been loaded
+        index = dir_index = None
+        if skip_unchanged:
+            index = self._get_dir_index("scandirs")
+            dir_index = index.copy()
+
         # first scan each path for new files
         paths_to_load = []
         for scan_path in paths:
@@ -731,7 +1403,8 @@ class FileLibrary(PicklingLibrary):
                 if cofuncid:
                     task.copool(cofuncid)
 
-                for real_path in iter_paths(scan_path, exclude=exclude):
+                for real_path in iter_paths(scan_path, exclude=exclude,
+                                            dir_index=dir_index):
                     if need_yield():
                         task.pulse()
                         yield
@@ -750,22 +1423,32 @@ class FileLibrary(PicklingLibrary):
             if cofuncid:
                 task.copool(cofuncid)
 
+            if workers > 0:
+                items = self._load_filenames(paths_to_load, workers, task)
+            else:
+                items = (self.add_filename(real_path, False)
+                         for real_path in task.gen(paths_to_load))
+
             added = []
-            for real_path in task.gen(paths_to_load):
-                item = self.add_filename(real_path, False)
+            for item in items:
                 if item is not None:
                     added.append(item)
                     if len(added) > 100 or need_added():
                         self.add(added)
                         added = []
                         yield
-                if added and need_yield():
+                        continue
+                if (added or item is None) and need_yield():
                     yield
             if added:
                 self.add(added)
                 added = []
                 yield True
 
+        if index is not None:
+            index.replace(dir_index)
+            index.save()
+
     def get_content(self):
         """Return visible and masked items"""
 
@@ -830,10 +1513,73 @@ class SongFileLibrary(SongLibrary, FileLibrary):
     """A library containing song files.
     Pickles contents to disk as `FileLibrary`"""
 
+    persist_sort_keys = False
+    """If `save_sort_keys()` should be called when saving"""
+
     def __init__(self, name=None):
         print_d("Initializing SongFileLibrary \"%s\"." % name)
         super(SongFileLibrary, self).__init__(name)
 
+    def _get_sort_keys_filename(self):
+        return self.filename + fsnative(u".sortkeys")
+
+    def _iter_loaded(self):
+        """All songs already loaded"""
+
+        return itervalues(self._contents)
+
+    def load_sort_keys(self):
+        """Load the song list sort keys saved along with the library, for
+        songs which haven't changed since.
+        """
+
+        try:
+            with open(self._get_sort_keys_filename(), "rb") as fileobj:
+                data = fileobj.read()
+        except EnvironmentError:
+            return
+
+        try:
+            load_sort_keys(data)
+        except PickleError:
+            util.print_exc()
+
+    def save_sort_keys(self, background=False):
+        """Save the sort keys cached in the songs next to the library file.
+
+        If `background` is True they get written from a thread, after a
+        background save of the library in progress.
+        """
+
+        filename = self._get_sort_keys_filename()
+        # copy the keys here, so they can be pickled in the thread
+        keys = snapshot_sort_keys(self._iter_loaded(), self._contents)
+
+        def write_keys():
+            try:
+                data = dump_sort_keys(keys)
+                with atomic_save(filename, "wb") as fileobj:
+                    fileobj.write(data)
+            except PickleError:
+                util.print_exc()
+            except EnvironmentError:
+                print_w("Couldn't save sort keys to %r" % filename)
+
+        if background:
+            library_save = self._save_thread
+
+            def write_after_save():
+                if library_save is not None:
+                    library_save.join()
+                write_keys()
+
+            self._start_save_thread(write_after_save)
+            return
+
+        # don't let an older background save overwrite this one
+        self.wait_for_save()
+        write_keys()
+
     def contains_filename(self, filename):
         key = normalize_path(filename, True)
         return key in self._contents
@@ -866,3 +1612,121 @@ class SongFileLibrary(SongLibrary, FileLibrary):
             song = self._contents[key]
 
         return song
+
+    def _read_filename(self, filename):
+        # the song isn't shared with the main thread until it's done
+        return MusicFile(filename)
+
+    def _create_item(self, data):
+        return data
+
+    def _check_items(self, task, force=False, skip_unchanged=False):
+        # Instead of a stat() call per song, list each directory once and
+        # compare the mtimes/sizes there. Directories which didn't change
+        # since the last rebuild can be skipped completely, but since
+        # rewriting a file in place doesn't change the directory mtime
+        # that is optional.
+
+        if force:
+            for item in super(SongFileLibrary, self)._check_items(
+                    task, force, skip_unchanged):
+                yield item
+            return
+
+        dirs = {}
+        for key in self._contents.keys():
+            dirs.setdefault(os.path.dirname(key), []).append(key)
+
+        index = self._get_dir_index("dirs")
+        total = len(dirs)
+        for i, (path, keys) in enumerate(sorted(dirs.items())):
+            if i % 10 == 0:
+                task.update(float(i) / total)
+                yield None
+
+            mtime = dir_mtime(path)
+            if mtime is None:
+                index.pop(path, None)
+            elif skip_unchanged and index.get(path) == mtime:
+                continue
+
+            try:
+                stats = stat_files(path)
+            except OSError:
+                stats = {}
+
+            for key in keys:
+                item = self._contents.get(key)
+                if item is None:
+                    continue
+                stat = stats.get(key)
+                song_mtime = item.get("~#mtime", 0)
+                if stat is None or not song_mtime or stat[0] != song_mtime \
+                        or stat[1] != item.get("~#filesize", stat[1]):
+                    yield item
+
+            if mtime is not None:
+                index.remember(path, mtime, mtime)
+
+        index.retain(dirs)
+        index.save()
+
+
+class JournalingSongFileLibrary(JournalingMixin, SongFileLibrary):
+    """A library containing song files.
+    Persists changes incrementally as `JournalingMixin`"""
+
+    def _journal_contains(self, item):
+        if super(JournalingSongFileLibrary, self)._journal_contains(item):
+            return True
+        # masked items get saved as well
+        masked = self._masked.get(item.mountpoint, {})
+        return masked.get(item.key) is item
+
+    def remove_masked(self, mount_point):
+        items = self._masked.get(mount_point, {})
+        self._journal_pending.update(itervalues(items))
+        self.dirty = True
+        super(JournalingSongFileLibrary, self).remove_masked(mount_point)
+
+
+class MappedSongFileLibrary(MappingMixin, SongFileLibrary):
+    """A library containing song files.
+    Decodes songs on demand from a file in the format of `MappingMixin`"""
+
+    def _iter_loaded(self):
+        return self._contents.iter_loaded()
+
+    def _load_mapped(self, mapped):
+        mounts = {}
+        lazy = {}
+        masked = self._masked
+
+        # see FileLibrary._load_init(), but only decodes masked items
+        for index, key, mountpoint in mapped.keys():
+            if mountpoint is None:
+                lazy[key] = index
+                continue
+
+            if mountpoint not in mounts:
+                is_mounted = ismount(mountpoint)
+                # autofs: access a sub path for it to mount
+                if not is_mounted:
+                    mapped.load(index).exists()
+                    is_mounted = ismount(mountpoint)
+                mounts[mountpoint] = is_mounted
+                if not is_mounted:
+                    masked.setdefault(mountpoint, {})
+
+            if mounts[mountpoint]:
+                lazy[key] = index
+            else:
+                masked[mountpoint][key] = mapped.load(index)
+
+        self._contents = LazyContents(mapped, lazy)
+
+    def _get_loaded_content(self):
+        items = super(MappedSongFileLibrary, self)._get_loaded_content()
+        for masked in self._masked.values():
+            items.extend(masked.values())
+        return items
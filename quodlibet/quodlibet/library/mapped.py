@@ -0,0 +1,553 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""A columnar on-disk format for AudioFiles which can be memory mapped.
+
+All strings (tag names, values, paths) are stored once in a string table,
+songs are ranges of (tag, value) fields referencing it. Loading only
+parses the header, songs get decoded when they are first accessed.
+
+Layout (all integers little endian)::
+
+    MAGIC
+    header: classes, songs, fields, strings, string data size (u32)
+    class names: string index (u32) per class ("module:name")
+    songs: class, key string, mountpoint string (u32 each per song),
+        first field (u32 per song + 1)
+    fields: type << 28 | tag string (u32 per field), value (i64 per field)
+    strings: offset into the string data (u32 per string + 1)
+    string data
+"""
+
+import sys
+import mmap
+import struct
+from array import array
+
+from senf import fsn2bytes, bytes2fsn
+
+from quodlibet.util import is_windows
+from quodlibet.compat import PY2, text_type, integer_types, iteritems, \
+    itervalues
+from quodlibet.formats._audio import FILESYSTEM_TAGS
+
+
+MAGIC = b"QLMS\x00\x00\x00\x01"
+
+_HEADER = struct.Struct("<IIIII")
+
+_U32 = "I" if array("I").itemsize == 4 else "L"
+_NONE = 0xFFFFFFFF
+
+T_TEXT, T_FSN, T_INT, T_FLOAT, T_BIGINT = range(5)
+_TYPE_SHIFT = 28
+_INDEX_MASK = (1 << _TYPE_SHIFT) - 1
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+_double = struct.Struct("<d")
+_int64 = struct.Struct("<q")
+
+
+class MappedFormatError(Exception):
+    pass
+
+
+def _to_le(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes() if not PY2 else arr.tostring()
+
+
+def _encode_text(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode("utf-8", "surrogatepass")
+
+
+def _decode_key(data):
+    key = data.decode("utf-8", "surrogatepass")
+    if PY2:
+        try:
+            key = key.encode("ascii")
+        except UnicodeEncodeError:
+            pass
+    return key
+
+
+def _find_class(module, name):
+    __import__(module)
+    return getattr(sys.modules[module], name)
+
+
+class MappedSongs(object):
+    """Read access to a file in the mapped format.
+
+    Songs are referenced by their index in the file.
+    """
+
+    def __init__(self, data):
+        """Takes bytes or a read only mmap object"""
+
+        self._data = data
+        if data[:len(MAGIC)] != MAGIC:
+            raise MappedFormatError("not a mapped library")
+
+        offset = len(MAGIC)
+        try:
+            (self._nclasses, self._nsongs, self._nfields, self._nstrings,
+                blob_size) = _HEADER.unpack_from(data, offset)
+        except struct.error as e:
+            raise MappedFormatError(e)
+        offset += _HEADER.size
+
+        def column(count, size):
+            start = offset
+            return start, start + count * size
+
+        self._class_names, offset = column(self._nclasses, 4)
+        self._song_class, offset = column(self._nsongs, 4)
+        self._song_key, offset = column(self._nsongs, 4)
+        self._song_mount, offset = column(self._nsongs, 4)
+        self._song_start, offset = column(self._nsongs + 1, 4)
+        self._field_key, offset = column(self._nfields, 4)
+        self._field_value, offset = column(self._nfields, 8)
+        self._string_start, offset = column(self._nstrings + 1, 4)
+        self._blob = offset
+
+        if self._blob + blob_size != len(data):
+            raise MappedFormatError("unexpected file size")
+
+        self._text = [None] * self._nstrings
+        self._fsn = {}
+        self._classes = None
+
+    @classmethod
+    def open(cls, filename):
+        """Maps the file (or reads it where replacing a mapped file
+        isn't possible).
+
+        Raises:
+            EnvironmentError
+            MappedFormatError
+        """
+
+        with open(filename, "rb") as fileobj:
+            if is_windows():
+                data = fileobj.read()
+            else:
+                try:
+                    data = mmap.mmap(
+                        fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # empty file
+                    raise MappedFormatError("empty file")
+        try:
+            return cls(data)
+        except MappedFormatError:
+            if isinstance(data, mmap.mmap):
+                data.close()
+            raise
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+
+    def __len__(self):
+        return self._nsongs
+
+    def _u32(self, column, index):
+        return struct.unpack_from("<I", self._data, column + index * 4)[0]
+
+    def raw_string(self, index):
+        """Returns the encoded string for a string index"""
+
+        start, end = struct.unpack_from(
+            "<II", self._data, self._string_start + index * 4)
+        return self._data[self._blob + start:self._blob + end]
+
+    def _get_text(self, index):
+        text = self._text[index]
+        if text is None:
+            text = self._text[index] = \
+                self.raw_string(index).decode("utf-8", "surrogatepass")
+        return text
+
+    def _get_fsn(self, index):
+        try:
+            return self._fsn[index]
+        except KeyError:
+            value = self._fsn[index] = bytes2fsn(
+                self.raw_string(index), "utf-8")
+            return value
+
+    def class_name(self, index):
+        """Returns (module, name) of the type of a song"""
+
+        name_index = self._u32(
+            self._class_names, self._u32(self._song_class, index))
+        module, name = self._get_text(name_index).split(u":")
+        return str(module), str(name)
+
+    def _get_classes(self):
+        if self._classes is None:
+            classes = []
+            for i in range(self._nclasses):
+                module, name = self._get_text(
+                    self._u32(self._class_names, i)).split(u":")
+                try:
+                    classes.append(_find_class(str(module), str(name)))
+                except (ImportError, AttributeError):
+                    classes.append(None)
+            self._classes = classes
+        return self._classes
+
+    def keys(self):
+        """Returns a list of (index, key, mountpoint) for all songs which
+        can be loaded.
+        """
+
+        classes = self._get_classes()
+        count = self._nsongs
+        data = self._data
+        song_class = struct.unpack_from(
+            "<%dI" % count, data, self._song_class)
+        song_key = struct.unpack_from("<%dI" % count, data, self._song_key)
+        song_mount = struct.unpack_from(
+            "<%dI" % count, data, self._song_mount)
+
+        get_fsn = self._get_fsn
+        result = []
+        for i in range(count):
+            if classes[song_class[i]] is None:
+                continue
+            mount = song_mount[i]
+            key = bytes2fsn(self.raw_string(song_key[i]), "utf-8")
+            result.append(
+                (i, key, get_fsn(mount) if mount != _NONE else None))
+        return result
+
+    def _fields(self, index):
+        start, end = struct.unpack_from(
+            "<II", self._data, self._song_start + index * 4)
+        count = end - start
+        keys = struct.unpack_from(
+            "<%dI" % count, self._data, self._field_key + start * 4)
+        values = struct.unpack_from(
+            "<%dq" % count, self._data, self._field_value + start * 8)
+        return keys, values
+
+    def load(self, index):
+        """Decodes the song at index.
+
+        Returns:
+            AudioFile
+        """
+
+        kind = self._get_classes()[self._u32(self._song_class, index)]
+        assert kind is not None
+
+        # like unpickling, don't go through __setitem__
+        song = dict.__new__(kind)
+        setitem = dict.__setitem__
+        get_text = self._get_text
+        text = self._text
+        for field, value in zip(*self._fields(index)):
+            type_ = field >> _TYPE_SHIFT
+            key = text[field & _INDEX_MASK] or get_text(field & _INDEX_MASK)
+            if PY2:
+                key = _decode_key(_encode_text(key))
+            if type_ == T_TEXT:
+                value = text[value] or get_text(value)
+            elif type_ == T_INT:
+                pass
+            elif type_ == T_FLOAT:
+                value = _double.unpack(_int64.pack(value))[0]
+            elif type_ == T_FSN:
+                value = bytes2fsn(self.raw_string(value), "utf-8")
+            elif type_ == T_BIGINT:
+                value = int(get_text(value))
+            else:
+                raise MappedFormatError("unknown field type")
+            setitem(song, key, value)
+        return song
+
+
+class MappedWriter(object):
+    """Collects songs and writes them in the mapped format"""
+
+    def __init__(self):
+        self._strings = {}
+        self._string_list = []
+        self._classes = {}
+        self._song_class = array(_U32)
+        self._song_key = array(_U32)
+        self._song_mount = array(_U32)
+        self._song_start = array(_U32)
+        self._field_key = array(_U32)
+        self._field_value = array("q")
+
+    def __len__(self):
+        return len(self._song_class)
+
+    def _string(self, data):
+        try:
+            return self._strings[data]
+        except KeyError:
+            index = self._strings[data] = len(self._string_list)
+            self._string_list.append(data)
+            return index
+
+    def _class(self, module, name):
+        try:
+            return self._classes[(module, name)]
+        except KeyError:
+            index = self._classes[(module, name)] = len(self._classes)
+            return index
+
+    def _start_song(self, class_, key, mount):
+        self._song_class.append(class_)
+        self._song_key.append(key)
+        self._song_mount.append(mount)
+        self._song_start.append(len(self._field_key))
+
+    def add(self, song):
+        """Add an AudioFile"""
+
+        kind = type(song)
+        string = self._string
+        key_index = string(fsn2bytes(song.key, "utf-8"))
+        mount = song.get("~mountpoint")
+        mount_index = _NONE if mount is None else \
+            string(fsn2bytes(mount, "utf-8"))
+        self._start_song(
+            self._class(kind.__module__, kind.__name__), key_index,
+            mount_index)
+
+        field_key = self._field_key.append
+        field_value = self._field_value.append
+        for key, value in iteritems(song):
+            tag = string(_encode_text(key))
+            if key in FILESYSTEM_TAGS:
+                type_ = T_FSN
+                value = string(fsn2bytes(value, "utf-8"))
+            elif isinstance(value, float):
+                type_ = T_FLOAT
+                value = _int64.unpack(_double.pack(value))[0]
+            elif isinstance(value, integer_types):
+                if _INT64_MIN <= value <= _INT64_MAX:
+                    type_ = T_INT
+                    value = int(value)
+                else:
+                    type_ = T_BIGINT
+                    value = string(_encode_text(text_type(value)))
+            else:
+                type_ = T_TEXT
+                value = string(_encode_text(text_type(value)))
+            field_key(type_ << _TYPE_SHIFT | tag)
+            field_value(value)
+
+    def add_mapped(self, songs, index):
+        """Add a song from a MappedSongs instance without decoding it"""
+
+        string = self._string
+        raw = songs.raw_string
+        key_index = string(raw(songs._u32(songs._song_key, index)))
+        mount = songs._u32(songs._song_mount, index)
+        mount_index = _NONE if mount == _NONE else string(raw(mount))
+        self._start_song(self._class(*songs.class_name(index)), key_index,
+                         mount_index)
+
+        field_key = self._field_key.append
+        field_value = self._field_value.append
+        for field, value in zip(*songs._fields(index)):
+            type_ = field >> _TYPE_SHIFT
+            field_key(type_ << _TYPE_SHIFT |
+                      string(raw(field & _INDEX_MASK)))
+            if type_ in (T_TEXT, T_FSN, T_BIGINT):
+                value = string(raw(value))
+            field_value(value)
+
+    def write(self, fileobj):
+        """Writes everything added to fileobj"""
+
+        class_names = array(_U32, [_NONE] * len(self._classes))
+        for (module, name), index in iteritems(self._classes):
+            class_names[index] = self._string(
+                _encode_text(u"%s:%s" % (module, name)))
+
+        string_start = array(_U32, [0])
+        size = 0
+        for data in self._string_list:
+            size += len(data)
+            string_start.append(size)
+
+        song_start = array(_U32, self._song_start)
+        song_start.append(len(self._field_key))
+
+        fileobj.write(MAGIC)
+        fileobj.write(_HEADER.pack(
+            len(class_names), len(self._song_class), len(self._field_key),
+            len(self._string_list), size))
+        for column in [class_names, self._song_class, self._song_key,
+                       self._song_mount, song_start, self._field_key,
+                       self._field_value, string_start]:
+            fileobj.write(_to_le(column))
+        fileobj.write(b"".join(self._string_list))
+
+
+def load_mapped_audio_files(data):
+    """Decodes all songs of data in the mapped format.
+
+    Args:
+        data (bytes)
+    Returns:
+        List[AudioFile]
+    Raises:
+        MappedFormatError
+    """
+
+    songs = MappedSongs(data)
+    return [songs.load(index) for index, key, mount in songs.keys()]
+
+
+class LazyContents(object):
+    """A dict of key -> song, where songs get decoded from a MappedSongs
+    instance on first access.
+
+    Checking for keys, `keys()` and `len()` don't decode anything.
+    """
+
+    def __init__(self, mapped=None, lazy=None):
+        self._songs = {}
+        self._mapped = mapped
+        self._lazy = lazy or {}
+
+    def _load(self, key):
+        index = self._lazy.pop(key)
+        song = self._songs[key] = self._mapped.load(index)
+        return song
+
+    def _load_all(self):
+        if self._lazy:
+            load = self._mapped.load
+            songs = self._songs
+            for key, index in iteritems(self._lazy):
+                songs[key] = load(index)
+            self._lazy.clear()
+
+    def iter_mapped(self):
+        """Yields (key, index) of all songs not decoded yet"""
+
+        return iteritems(self._lazy)
+
+    def iter_loaded(self):
+        """Yields all songs already decoded"""
+
+        return itervalues(self._songs)
+
+    @property
+    def mapped(self):
+        """The MappedSongs instance songs get decoded from or None"""
+
+        return self._mapped
+
+    def rebind(self, mapped, lazy):
+        """Replace the backing file and the indices of songs not decoded"""
+
+        assert set(lazy) == set(self._lazy)
+        old = self._mapped
+        self._mapped = mapped
+        self._lazy = lazy
+        if old is not None and old is not mapped:
+            old.close()
+
+    def __len__(self):
+        return len(self._songs) + len(self._lazy)
+
+    def __contains__(self, key):
+        try:
+            return key in self._songs or key in self._lazy
+        except TypeError:
+            # unhashable
+            return False
+
+    def __getitem__(self, key):
+        try:
+            return self._songs[key]
+        except KeyError:
+            if key in self._lazy:
+                return self._load(key)
+            raise
+
+    def __setitem__(self, key, value):
+        self._lazy.pop(key, None)
+        self._songs[key] = value
+
+    def __delitem__(self, key):
+        if self._lazy.pop(key, None) is None:
+            del self._songs[key]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *args):
+        try:
+            value = self[key]
+        except KeyError:
+            if args:
+                return args[0]
+            raise
+        del self[key]
+        return value
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def update(self, other):
+        if hasattr(other, "keys"):
+            pairs = [(k, other[k]) for k in other.keys()]
+        else:
+            pairs = other
+        for key, value in pairs:
+            self[key] = value
+
+    def clear(self):
+        self._songs.clear()
+        self._lazy.clear()
+
+    def keys(self):
+        return list(self._songs) + list(self._lazy)
+
+    def values(self):
+        self._load_all()
+        return self._songs.values()
+
+    def items(self):
+        self._load_all()
+        return self._songs.items()
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
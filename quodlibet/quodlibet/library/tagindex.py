@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""An inverted index of words in tag values and sorted numeric tag values,
+to find the songs a query can possibly match without looking at every song.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+
+from senf import fsn2text, fsnative
+
+from quodlibet.formats import FILESYSTEM_TAGS
+from quodlibet.compat import iteritems, itervalues
+
+
+WORD = re.compile(u"[a-z0-9]+")
+"""Matches words in folded text"""
+
+MIN_WORD = 3
+"""Shorter words in queries match too many songs to be worth a lookup"""
+
+
+def fold_text(text):
+    """Lower case, with diacritics and compatibility characters decomposed
+    and the diacritics removed. Returns None if the result isn't ASCII.
+
+    Every ASCII letter or digit in a query (ignoring case, with or without
+    the "d" modifier) only matches characters which fold to it, so the
+    words of the folded text contain every ASCII word of a matching query.
+    """
+
+    text = unicodedata.normalize("NFKD", text)
+    text = u"".join(c for c in text if not unicodedata.combining(c))
+    try:
+        text.encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    return text.lower()
+
+
+def get_tag_text(song, tag):
+    """The text `query.Tag` looks at for a (non-numeric) tag"""
+
+    if tag[:1] == "~":
+        if tag in FILESYSTEM_TAGS:
+            return fsn2text(song(tag, fsnative()))
+        return song(tag)
+
+    value = song.get(tag)
+    if value is None:
+        if tag in ("filename", "mountpoint"):
+            return fsn2text(song.get("~" + tag, fsnative()))
+        return song.get("~" + tag, u"")
+    return value
+
+
+class _TagWords(object):
+    """The word index for one tag"""
+
+    def __init__(self, tag):
+        self.tag = tag
+        # word -> set of songs
+        self.words = {}
+        # song -> words, for songs with words
+        self.songs = {}
+        # songs with text which can't be folded
+        self.unindexed = set()
+        # query word -> index words containing it
+        self._lookups = {}
+
+    def add(self, songs):
+        words = self.words
+        tag = self.tag
+        for song in songs:
+            text = fold_text(get_tag_text(song, tag))
+            if text is None:
+                self.unindexed.add(song)
+                continue
+            song_words = frozenset(WORD.findall(text))
+            if not song_words:
+                continue
+            self.songs[song] = song_words
+            for word in song_words:
+                if word not in words:
+                    words[word] = set()
+                    self._lookups.clear()
+                words[word].add(song)
+
+    def remove(self, songs):
+        words = self.words
+        for song in songs:
+            self.unindexed.discard(song)
+            for word in self.songs.pop(song, ()):
+                word_songs = words[word]
+                word_songs.discard(song)
+                if not word_songs:
+                    del words[word]
+                    self._lookups.clear()
+
+    def lookup(self, word):
+        """All songs which contain `word` as part of a word or which
+        aren't indexed.
+        """
+
+        found = self._lookups.get(word)
+        if found is None:
+            found = [w for w in self.words if word in w]
+            self._lookups[word] = found
+
+        words = self.words
+        result = set(self.unindexed)
+        for w in found:
+            result.update(words[w])
+        return result
+
+
+def get_numeric_value(song, tag):
+    """The value of a numeric tag for sorting, None if there is none,
+    or False if it can't be sorted (or may change without the song
+    changing)
+    """
+
+    value = song(tag, None)
+    if value is None:
+        return None
+    if tag == "~#rating" and tag not in song:
+        # default rating, depends on the configuration
+        return False
+    if not isinstance(value, (int, float)) or value != value:
+        return False
+    return value
+
+
+class _NumericTag(object):
+    """Songs sorted by the value of one numeric tag"""
+
+    def __init__(self, tag):
+        self.tag = tag
+        # sorted (value, id(song)) pairs
+        self.keys = []
+        # id(song) -> (song, value)
+        self.songs = {}
+        # songs whose value can't be sorted
+        self.unsorted = set()
+
+    def add(self, songs):
+        tag = self.tag
+        new = []
+        for song in songs:
+            value = get_numeric_value(song, tag)
+            if value is None:
+                continue
+            elif value is False:
+                self.unsorted.add(song)
+            else:
+                self.songs[id(song)] = (song, value)
+                new.append((value, id(song)))
+
+        if len(new) > 100:
+            self.keys.extend(new)
+            self.keys.sort()
+        else:
+            for key in new:
+                insort(self.keys, key)
+
+    def remove(self, songs):
+        removed = []
+        for song in songs:
+            self.unsorted.discard(song)
+            entry = self.songs.pop(id(song), None)
+            if entry is not None:
+                removed.append((entry[1], id(song)))
+
+        keys = self.keys
+        if len(removed) > 100:
+            removed = set(removed)
+            keys[:] = [k for k in keys if k not in removed]
+        else:
+            for key in removed:
+                del keys[bisect_left(keys, key)]
+
+    def range(self, low, high):
+        keys = self.keys
+        start = 0 if low is None else bisect_left(keys, (low,))
+        end = len(keys) if high is None else \
+            bisect_right(keys, (high, float("inf")))
+        songs = self.songs
+        result = set(self.unsorted)
+        result.update(songs[k[1]][0] for k in keys[start:end])
+        return result
+
+
+class TagIndex(object):
+    """Maps words of tag values and values of numeric tags to songs.
+
+    Tags get indexed on first use and kept up to date through the
+    'added', 'changed' and 'removed' signals of the library.
+    """
+
+    def __init__(self, library):
+        self._library = library
+        self._tags = {}
+        self._numeric = {}
+        self._sig_ids = [
+            library.connect('added', self.__added),
+            library.connect('changed', self.__changed),
+            library.connect('removed', self.__removed),
+        ]
+
+    def destroy(self):
+        for sig_id in self._sig_ids:
+            self._library.disconnect(sig_id)
+        self._sig_ids = []
+        self._tags.clear()
+        self._numeric.clear()
+
+    def _indexes(self):
+        for index in itervalues(self._tags):
+            yield index
+        for index in itervalues(self._numeric):
+            yield index
+
+    def __added(self, library, songs):
+        for index in self._indexes():
+            index.add(songs)
+
+    def __changed(self, library, songs):
+        songs = [s for s in songs if s in library]
+        for index in self._indexes():
+            index.remove(songs)
+            index.add(songs)
+
+    def __removed(self, library, songs):
+        for index in self._indexes():
+            index.remove(songs)
+
+    def _get_tag(self, tag):
+        tag_words = self._tags.get(tag)
+        if tag_words is None:
+            tag_words = self._tags[tag] = _TagWords(tag)
+            tag_words.add(itervalues(self._library))
+        return tag_words
+
+    def _get_numeric(self, tag):
+        numeric = self._numeric.get(tag)
+        if numeric is None:
+            numeric = self._numeric[tag] = _NumericTag(tag)
+            numeric.add(itervalues(self._library))
+        return numeric
+
+    @property
+    def tags(self):
+        """The tags which are indexed at the moment"""
+
+        return list(self._tags.keys()) + list(self._numeric.keys())
+
+    def search(self, tags, word):
+        """Returns a set of songs containing all songs where the text of
+        one of the tags (as looked at by queries) could contain `word`,
+        or None if `word` is too short to be of use.
+
+        `word` has to consist of lower case ASCII letters and digits.
+        """
+
+        if len(word) < MIN_WORD:
+            return None
+
+        result = set()
+        for tag in tags:
+            result.update(self._get_tag(tag).lookup(word))
+        return result
+
+    def search_range(self, tag, low=None, high=None):
+        """Returns a set containing all songs where the numeric tag
+        (e.g. "~#playcount") has a value between low and high (inclusive,
+        None for no limit) and songs where that isn't known.
+        """
+
+        return self._get_numeric(tag).range(low, high)
+
+    def __repr__(self):
+        return "<%s tags=%r>" % (
+            type(self).__name__,
+            sorted((t, len(w.songs)) for t, w in iteritems(self._tags)))
@@ -16,16 +16,21 @@ from senf import environ, argv as sys_argv
 from quodlibet import _
 from quodlibet.cli import process_arguments, exit_
 from quodlibet.util.dprint import print_d, print_, print_exc
+from quodlibet.util import startuptrace
+from quodlibet.util.startuptrace import phase
 
 
 def main(argv=None):
     if argv is None:
         argv = sys_argv
 
+    startuptrace.start()
+
     import quodlibet
 
     config_file = os.path.join(quodlibet.get_user_dir(), "config")
-    quodlibet.init_cli(config_file=config_file)
+    with phase("init_cli"):
+        quodlibet.init_cli(config_file=config_file)
 
     try:
         # we want basic commands not to import gtk (doubles process time)
@@ -35,7 +40,8 @@ def main(argv=None):
     finally:
         sys.modules.pop("gi.repository.Gtk", None)
 
-    quodlibet.init()
+    with phase("init"):
+        quodlibet.init()
 
     from quodlibet import app
     from quodlibet.qltk import add_signal_watch, Icons
@@ -43,6 +49,7 @@ def main(argv=None):
 
     import quodlibet.player
     import quodlibet.library
+    import quodlibet.formats
     from quodlibet import config
     from quodlibet import browsers
     from quodlibet import util
@@ -57,7 +64,16 @@ def main(argv=None):
     print_d("Initializing main library (%s)" % (
             quodlibet.util.path.unexpand(library_path)))
 
-    library = quodlibet.library.init(library_path)
+    if config.getboolean("library", "intern_tags"):
+        quodlibet.formats.set_interning(True)
+    with phase("library"):
+        library = quodlibet.library.init(
+            library_path, config.get("library", "storage"),
+            config.getboolean("library", "save_sort_keys"))
+        if config.getboolean("library", "tag_index"):
+            library.enable_tag_index()
+        # the loaded songs share their values now, release the table
+        quodlibet.formats.clear_shared_values()
     app.library = library
 
     # this assumes that nullbe will always succeed
@@ -65,18 +81,21 @@ def main(argv=None):
     wanted_backend = environ.get(
         "QUODLIBET_BACKEND", config.get("player", "backend"))
 
-    try:
-        player = quodlibet.player.init_player(wanted_backend, app.librarian)
-    except PlayerError:
-        print_exc()
-        player = quodlibet.player.init_player("nullbe", app.librarian)
+    with phase("player"):
+        try:
+            player = quodlibet.player.init_player(
+                wanted_backend, app.librarian)
+        except PlayerError:
+            print_exc()
+            player = quodlibet.player.init_player("nullbe", app.librarian)
 
     app.player = player
 
     environ["PULSE_PROP_media.role"] = "music"
     environ["PULSE_PROP_application.icon_name"] = Icons.QUODLIBET
 
-    browsers.init()
+    with phase("browsers"):
+        browsers.init()
 
     from quodlibet.qltk.songlist import SongList, get_columns
 
@@ -93,28 +112,31 @@ def main(argv=None):
     for Kind in browsers.browsers:
         if Kind.headers is not None:
             Kind.headers.extend(in_all)
-        Kind.init(library)
+        if not Kind.lazy_init:
+            with phase("%s.init" % Kind.__name__, "browsers"):
+                browsers.init_browser(Kind, library)
 
-    pm = quodlibet.init_plugins("no-plugins" in startup_actions)
+    with phase("plugins"):
+        pm = quodlibet.init_plugins("no-plugins" in startup_actions)
 
-    if hasattr(player, "init_plugins"):
-        player.init_plugins()
+        if hasattr(player, "init_plugins"):
+            player.init_plugins()
 
-    from quodlibet.qltk import unity
-    unity.init("io.github.quodlibet.QuodLibet.desktop", player)
+        from quodlibet.qltk import unity
+        unity.init("io.github.quodlibet.QuodLibet.desktop", player)
 
-    from quodlibet.qltk.songsmenu import SongsMenu
-    SongsMenu.init_plugins()
+        from quodlibet.qltk.songsmenu import SongsMenu
+        SongsMenu.init_plugins()
 
-    from quodlibet.util.cover import CoverManager
-    app.cover_manager = CoverManager()
-    app.cover_manager.init_plugins()
+        from quodlibet.util.cover import CoverManager
+        app.cover_manager = CoverManager()
+        app.cover_manager.init_plugins()
 
-    from quodlibet.plugins.playlist import PLAYLIST_HANDLER
-    PLAYLIST_HANDLER.init_plugins()
+        from quodlibet.plugins.playlist import PLAYLIST_HANDLER
+        PLAYLIST_HANDLER.init_plugins()
 
-    from quodlibet.plugins.query import QUERY_HANDLER
-    QUERY_HANDLER.init_plugins()
+        from quodlibet.plugins.query import QUERY_HANDLER
+        QUERY_HANDLER.init_plugins()
 
     from gi.repository import GLib
 
@@ -132,10 +154,11 @@ def main(argv=None):
     # Call exec_commands after the window is restored, but make sure
     # it's after the mainloop has started so everything is set up.
 
-    app.window = window = QuodLibetWindow(
-        library, player,
-        restore_cb=lambda:
-            GLib.idle_add(exec_commands, priority=GLib.PRIORITY_HIGH))
+    with phase("window"):
+        app.window = window = QuodLibetWindow(
+            library, player,
+            restore_cb=lambda:
+                GLib.idle_add(exec_commands, priority=GLib.PRIORITY_HIGH))
 
     app.player_options = PlayerOptions(window)
 
@@ -183,8 +206,14 @@ def main(argv=None):
 
     # restore browser windows
     from quodlibet.qltk.browser import LibraryBrowser
-    GLib.idle_add(LibraryBrowser.restore, library, player,
-                  priority=GLib.PRIORITY_HIGH)
+
+    def restore_browsers():
+        with phase("restore browser windows"):
+            LibraryBrowser.restore(library, player)
+
+    GLib.idle_add(restore_browsers, priority=GLib.PRIORITY_HIGH)
+    # everything queued up for startup is done once we are idle
+    GLib.idle_add(startuptrace.finish, priority=GLib.PRIORITY_LOW)
 
     def before_quit():
         print_d("Saving active browser state")
@@ -205,6 +234,9 @@ def main(argv=None):
     fsiface.destroy()
 
     tracker.destroy()
+
+    from quodlibet.util.collection import FileBackedPlaylist
+    FileBackedPlaylist.flush_writes()
     quodlibet.library.save()
 
     config.save()
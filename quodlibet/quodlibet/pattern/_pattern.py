@@ -22,7 +22,9 @@ from quodlibet import util
 from quodlibet.query import Query
 from quodlibet.compat import exec_, itervalues
 from quodlibet.util.path import strip_win32_incompat_from_path, limit_path
-from quodlibet.formats._audio import decode_value, FILESYSTEM_TAGS
+from quodlibet.formats._audio import decode_value, FILESYSTEM_TAGS, \
+    AudioFile
+from quodlibet.formats import _sortkeys
 from quodlibet.compat import quote_plus, text_type, number_types
 
 # Token types.
@@ -187,6 +189,7 @@ class PatternFormatter(object):
     _format = None
     _post = None
     _text = None
+    _memo_key = None
 
     def __init__(self, func, list_func, tags):
         self.__func = func
@@ -214,6 +217,9 @@ class PatternFormatter(object):
             self.__song = realsong
             self.__formatter = formatter
 
+        def _set_song(self, realsong):
+            self.__song = realsong
+
         def __call__(self, key, *args):
             return self.__song(key, *args)
 
@@ -243,12 +249,65 @@ class PatternFormatter(object):
 
             return values
 
-    def format(self, song):
+    def __get_memo(self, song):
+        """The dict for remembering results for the song or None"""
+
+        if self._memo_key is None or not isinstance(song, AudioFile):
+            return None
+        # gets dropped by the song if any tag changes
+        return song.__dict__.setdefault("_pattern_memo", {})
+
+    def format(self, song, memo=False):
+        """Returns the formatted pattern for the song.
+
+        If `memo` is True the result gets remembered until a tag of the
+        song changes.
+        """
+
+        cache = self.__get_memo(song) if memo else None
+        if cache is not None:
+            try:
+                return cache[self._memo_key]
+            except KeyError:
+                pass
+
         value = u"".join(self.__func(self.SongProxy(song, self._format)))
         if self._post:
-            return self._post(value, song)
+            value = self._post(value, song)
+
+        if cache is not None:
+            cache[self._memo_key] = value
         return value
 
+    def format_many(self, songs, memo=False):
+        """Like format(), but returns a list of formatted patterns for
+        all songs.
+        """
+
+        func = self.__func
+        post = self._post
+        join = u"".join
+        proxy = self.SongProxy(None, self._format)
+        key = self._memo_key
+
+        values = []
+        append = values.append
+        for song in songs:
+            cache = self.__get_memo(song) if memo else None
+            if cache is not None and key in cache:
+                append(cache[key])
+                continue
+
+            proxy._set_song(song)
+            value = join(func(proxy))
+            if post:
+                value = post(value, song)
+
+            if cache is not None:
+                cache[key] = value
+            append(value)
+        return values
+
     def format_list(self, song):
         """Formats the output of a list pattern, generating all the
         combinations always returns pairs of display and sort values. The
@@ -275,6 +334,14 @@ class PatternFormatter(object):
 class PatternCompiler(object):
     def __init__(self, root):
         self.__root = root.node
+        self.__cacheable = True
+
+    def cacheable(self):
+        """Whether the conditions of the compiled pattern only depend on
+        the song (and not on the time etc.)
+        """
+
+        return self.__cacheable
 
     def compile(self, song_func, text_formatter=None):
         tags = []
@@ -314,6 +381,8 @@ class PatternCompiler(object):
             else:
                 q = Query.StrictQueryMatcher(query)
                 if q is not None:
+                    if not q.cacheable():
+                        self.__cacheable = False
                     q_var = 'q%d' % len(queries)
                     r_var = 'r%d' % len(qscope)
                     queries[query] = (q_var, q.search)
@@ -370,7 +439,10 @@ def Pattern(string, Kind=PatternFormatter, MAX_CACHE_SIZE=100, cache={}):
         comp = PatternCompiler(PatternParser(PatternLexer(string)))
         func, tags = comp.compile("comma", Kind._text)
         list_func, tags = comp.compile("list_separate", Kind._text)
-        cache[(Kind, string)] = Kind(func, list_func, tags)
+        formatter = Kind(func, list_func, tags)
+        if comp.cacheable() and _sortkeys.is_cacheable(string):
+            formatter._memo_key = (Kind, string)
+        cache[(Kind, string)] = formatter
     return cache[(Kind, string)]
 
 
@@ -6,24 +6,33 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
+import os
+
 from quodlibet import _
 from quodlibet import config
 from quodlibet import util
 from quodlibet.util.modulescanner import ModuleScanner
-from quodlibet.util.dprint import print_d
+from quodlibet.util.dprint import print_d, print_w
+from quodlibet.util.path import mtime, mkdir
+from quodlibet.util.atomic import atomic_save
+from quodlibet.util.picklehelper import pickle_dumps, pickle_loads, \
+    PickleError
 from quodlibet.util.config import ConfigProxy
 from quodlibet.qltk.ccb import ConfigCheckButton
 from quodlibet.compat import itervalues, iteritems, listkeys, string_types
 
 
-def init(folders=None, disable_plugins=False):
+def init(folders=None, disable_plugins=False, cache_filename=None):
     """folders: list of paths to look for plugins
     disable_plugins: disables all plugins, but does not forget which
     plugins are enabled.
+    cache_filename: file to remember which plugins modules contain, so
+    only modules with enabled plugins have to be imported on start.
     """
     if disable_plugins:
         folders = []
-    manager = PluginManager.instance = PluginManager(folders)
+        cache_filename = None
+    manager = PluginManager.instance = PluginManager(folders, cache_filename)
     return manager
 
 
@@ -209,6 +218,10 @@ class PluginManager(object):
     If plugin handlers want a plugin instance, they have to call
     Plugin.get_instance() to get a singleton.
 
+    If a cache file is given, the plugin IDs of each module get saved
+    there and modules which didn't change and don't contain enabled
+    plugins aren't imported by rescan(), until load_deferred() gets called.
+
     handlers need to implement the following methods:
 
         handler.plugin_handle(plugin)
@@ -228,7 +241,10 @@ class PluginManager(object):
 
     instance = None  # default instance
 
-    def __init__(self, folders=None):
+    CACHE_VERSION = 1
+    """Increase if the cache format changes"""
+
+    def __init__(self, folders=None, cache_filename=None):
         """folders is a list of paths that will be scanned for plugins.
         Plugins in later paths will be preferred if they share a name.
         """
@@ -242,15 +258,79 @@ class PluginManager(object):
         self.__modules = {}     # name: PluginModule
         self.__handlers = []    # handler list
         self.__enabled = set()  # (possibly) enabled plugin IDs
+        self.__cache_filename = cache_filename
+        self.__defer = cache_filename is not None
+        # name: ({path: mtime}, [plugin IDs])
+        self.__cache = self.__load_cache()
 
         self.__restore()
 
+    def __load_cache(self):
+        if self.__cache_filename is None:
+            return {}
+
+        try:
+            with open(self.__cache_filename, "rb") as h:
+                version, cache = pickle_loads(h.read())
+        except EnvironmentError:
+            return {}
+        except (PickleError, TypeError, ValueError):
+            util.print_exc()
+            return {}
+
+        if version != self.CACHE_VERSION or not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def __update_cache(self):
+        if self.__cache_filename is None:
+            return
+
+        cache = {}
+        for name in self.__scanner.deferred:
+            if name in self.__cache:
+                cache[name] = self.__cache[name]
+        for name, module in iteritems(self.__scanner.modules):
+            plugin_module = self.__modules.get(name)
+            if plugin_module is not None:
+                ids = [p.id for p in plugin_module.plugins]
+                cache[name] = (dict(module.deps), ids)
+
+        if cache == self.__cache:
+            return
+        self.__cache = cache
+
+        try:
+            mkdir(os.path.dirname(self.__cache_filename))
+            with atomic_save(self.__cache_filename, "wb") as h:
+                h.write(pickle_dumps((self.CACHE_VERSION, cache), 2))
+        except (EnvironmentError, PickleError):
+            print_w("Couldn't save plugin cache to %r" %
+                    self.__cache_filename)
+
+    def __can_defer(self, name, deps):
+        """If the module is known not to contain any enabled plugin"""
+
+        try:
+            old_deps, ids = self.__cache[name]
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        if set(old_deps) != set(deps):
+            return False
+        for path, old_mtime in iteritems(old_deps):
+            if mtime(path) != old_mtime:
+                return False
+
+        return not self.__enabled.intersection(ids)
+
     def rescan(self):
         """Scan for plugin changes or to initially load all plugins"""
 
         print_d("Rescanning..")
 
-        removed, added = self.__scanner.rescan()
+        defer = self.__can_defer if self.__defer else None
+        removed, added = self.__scanner.rescan(defer)
 
         # remember IDs of enabled plugin that get reloaded, so we can enable
         # them again
@@ -274,8 +354,22 @@ class PluginManager(object):
             new_module = self.__scanner.modules[name]
             self.__add_module(name, new_module.module)
 
+        self.__update_cache()
+
         print_d("Rescanning done.")
 
+    def load_deferred(self):
+        """Import the modules rescan() skipped because they don't contain
+        enabled plugins, so all plugins are available.
+        """
+
+        if not self.__defer:
+            return
+
+        self.__defer = False
+        if self.__scanner.deferred:
+            self.rescan()
+
     @property
     def _modules(self):
         return itervalues(self.__scanner.modules)
@@ -7,6 +7,8 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
+from bisect import bisect_left
+
 from gi.repository import Gtk, GObject
 
 from quodlibet.compat import integer_types, string_types, cmp
@@ -273,3 +275,358 @@ class ObjectStore(_ModelMixin, Gtk.ListStore):
 
     def prepend(self, row=None):
         return self.insert(0, row)
+
+
+class ObjectListModel(_ModelMixin, GObject.Object, Gtk.TreeModel):
+    """A single column object list model backed by Python lists.
+
+    Compared to ObjectStore no GObject allocations or GValue conversions
+    happen per row: values stay in a list, iters only get created for rows
+    which are accessed (usually the visible ones) and as long as nothing
+    listens to the model (e.g. it isn't attached to a view) no row signals
+    get emitted. This makes replacing all rows, see `replace()`, cheap
+    even for large lists.
+
+    Provides the ObjectStore API, excluding sorting.
+    """
+
+    def __init__(self, *args):
+        if len(args) > 1:
+            raise ValueError
+        if args and object not in args and GObject.TYPE_PYOBJECT not in args:
+            raise ValueError
+        super(ObjectListModel, self).__init__()
+        # row ids, parallel to the values. Iters reference rows by id,
+        # so they stay valid until their row gets removed.
+        self._ids = []
+        self._values = []
+        # row id -> last known position, checked on use and rebuilt
+        # completely if too far off
+        self._positions = {}
+        self._next_id = 1
+        self._stamp = id(self) & 0x7fffffff
+
+    def _get_index(self, row_id):
+        """The position of a row, raises ValueError if it isn't there"""
+
+        ids = self._ids
+        index = self._positions.get(row_id)
+        if index is not None and (index >= len(ids) or ids[index] != row_id):
+            # rows got inserted or removed before it, try close by first
+            try:
+                index = ids.index(row_id, max(index - 32, 0), index + 32)
+            except ValueError:
+                index = None
+        if index is None:
+            # many rows moved, so look them all up at once instead of
+            # searching for each
+            self._positions = dict(zip(ids, range(len(ids))))
+            index = self._positions.get(row_id)
+            if index is None:
+                raise ValueError("row not in model")
+        self._positions[row_id] = index
+        return index
+
+    def _make_iter(self, index):
+        row_id = self._ids[index]
+        self._positions[row_id] = index
+        iter_ = Gtk.TreeIter()
+        iter_.stamp = self._stamp
+        iter_.user_data = row_id
+        return iter_
+
+    def _iter_index(self, iter_):
+        if iter_ is None or iter_.stamp != self._stamp:
+            raise ValueError("invalid iter")
+        return self._get_index(iter_.user_data)
+
+    def _has_listeners(self, name):
+        signal_id = GObject.signal_lookup(name, self.__gtype__)
+        return GObject.signal_has_handler_pending(self, signal_id, 0, False)
+
+    def _new_ids(self, count):
+        start = self._next_id
+        self._next_id += count
+        return list(range(start, start + count))
+
+    # Gtk.TreeModel implementation
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY | Gtk.TreeModelFlags.ITERS_PERSIST
+
+    def do_get_n_columns(self):
+        return 1
+
+    def do_get_column_type(self, column):
+        return GObject.TYPE_PYOBJECT
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if len(indices) != 1 or not 0 <= indices[0] < len(self._ids):
+            return (False, None)
+        return (True, self._make_iter(indices[0]))
+
+    def do_get_path(self, iter_):
+        return Gtk.TreePath((self._iter_index(iter_),))
+
+    def do_get_value(self, iter_, column):
+        return self._values[self._iter_index(iter_)]
+
+    def do_iter_next(self, iter_):
+        index = self._iter_index(iter_) + 1
+        if index >= len(self._ids):
+            return False
+        iter_.user_data = self._ids[index]
+        self._positions[iter_.user_data] = index
+        return True
+
+    def do_iter_previous(self, iter_):
+        index = self._iter_index(iter_) - 1
+        if index < 0:
+            return False
+        iter_.user_data = self._ids[index]
+        self._positions[iter_.user_data] = index
+        return True
+
+    def do_iter_children(self, parent):
+        if parent is not None or not self._ids:
+            return (False, None)
+        return (True, self._make_iter(0))
+
+    def do_iter_has_child(self, iter_):
+        return False
+
+    def do_iter_n_children(self, iter_):
+        if iter_ is not None:
+            return 0
+        return len(self._ids)
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is not None or not 0 <= n < len(self._ids):
+            return (False, None)
+        return (True, self._make_iter(n))
+
+    def do_iter_parent(self, child):
+        return (False, None)
+
+    # Python fast paths, not going through the vfuncs
+
+    def get_value(self, iter_, column=0):
+        return self._values[self._iter_index(iter_)]
+
+    def get_path(self, iter_):
+        return Gtk.TreePath((self._iter_index(iter_),))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def is_empty(self):
+        return not self._ids
+
+    def itervalues(self, iter_=None):
+        if iter_ is not None:
+            return iter([])
+        return iter(list(self._values))
+
+    def values(self):
+        return list(self._values)
+
+    def iterrows(self, iter_=None):
+        if iter_ is not None:
+            return
+        for index, value in enumerate(list(self._values)):
+            yield self._make_iter(index), value
+
+    def iter_is_valid(self, iter_):
+        try:
+            self._iter_index(iter_)
+        except ValueError:
+            return False
+        return True
+
+    # ObjectStore API
+
+    def insert_many(self, position, objects):
+        """Insert python objects at position, -1 appends them"""
+
+        objects = list(objects)
+        if position < 0 or position > len(self._ids):
+            position = len(self._ids)
+        ids = self._new_ids(len(objects))
+        self._ids[position:position] = ids
+        self._values[position:position] = objects
+
+        if ids and self._has_listeners("row-inserted"):
+            for index in range(position, position + len(ids)):
+                iter_ = self._make_iter(index)
+                self.row_inserted(Gtk.TreePath((index,)), iter_)
+
+    def iter_append_many(self, objects):
+        """Append a list of python objects, yield iters"""
+
+        start = len(self._ids)
+        self.insert_many(-1, objects)
+        for index in range(start, len(self._ids)):
+            yield self._make_iter(index)
+
+    def append_many(self, objects):
+        """Append a list of python objects"""
+
+        self.insert_many(-1, objects)
+
+    def insert(self, position, row=None):
+        if row:
+            value = row[0]
+        else:
+            assert not self.ATOMIC
+            value = None
+
+        if position < 0 or position > len(self._ids):
+            position = len(self._ids)
+        self._ids.insert(position, self._new_ids(1)[0])
+        self._values.insert(position, value)
+        iter_ = self._make_iter(position)
+        self.row_inserted(Gtk.TreePath((position,)), iter_)
+        return iter_
+
+    def append(self, row=None):
+        return self.insert(-1, row)
+
+    def prepend(self, row=None):
+        return self.insert(0, row)
+
+    def insert_before(self, sibling, row=None):
+        if row is None:
+            assert not self.ATOMIC
+        if sibling is None:
+            position = -1
+        else:
+            position = self._iter_index(sibling)
+        return self.insert(position, row)
+
+    def insert_after(self, sibling, row=None):
+        if row is None:
+            assert not self.ATOMIC
+        if sibling is None:
+            position = 0
+        else:
+            position = self._iter_index(sibling) + 1
+        return self.insert(position, row)
+
+    def remove(self, iter_):
+        """Removes the row and makes the iter point to the next one.
+
+        Returns False if there is no next row.
+        """
+
+        index = self._iter_index(iter_)
+        row_id = self._ids.pop(index)
+        del self._values[index]
+        del self._positions[row_id]
+        self.row_deleted(Gtk.TreePath((index,)))
+
+        if index < len(self._ids):
+            iter_.user_data = self._ids[index]
+            self._positions[iter_.user_data] = index
+            return True
+        iter_.stamp = 0
+        return False
+
+    def remove_many(self, iters):
+        """Removes the rows of all iters, like calling `remove()` for each
+        of them, but the positions only get looked up once.
+        """
+
+        iters = list(iters)
+        old_indices = [self._iter_index(iter_) for iter_ in iters]
+        indices = sorted(set(old_indices))
+        if not indices:
+            return
+
+        ids = self._ids
+        values = self._values
+        positions = self._positions
+        for index in indices:
+            del positions[ids[index]]
+
+        if self._has_listeners("row-deleted"):
+            # from the back, so the paths of the others stay the same
+            for index in reversed(indices):
+                del ids[index]
+                del values[index]
+                self.row_deleted(Gtk.TreePath((index,)))
+        else:
+            removed = set(indices)
+            keep = [i for i in range(len(ids)) if i not in removed]
+            self._ids = [ids[i] for i in keep]
+            self._values = [values[i] for i in keep]
+
+        # make the iters point to the next row, like remove()
+        ids = self._ids
+        for iter_, index in zip(iters, old_indices):
+            index -= bisect_left(indices, index)
+            if index < len(ids):
+                iter_.user_data = ids[index]
+                self._positions[iter_.user_data] = index
+            else:
+                iter_.stamp = 0
+
+    def clear(self):
+        """Removes all rows"""
+
+        self.replace([])
+
+    def replace(self, objects):
+        """Replace all rows with the python objects"""
+
+        objects = list(objects)
+
+        if self._ids and self._has_listeners("row-deleted"):
+            while self._ids:
+                index = len(self._ids) - 1
+                del self._positions[self._ids.pop()]
+                del self._values[-1]
+                self.row_deleted(Gtk.TreePath((index,)))
+
+        self._ids = []
+        self._values = []
+        self._positions = {}
+        self.insert_many(0, objects)
+
+    def _move(self, index, new_index):
+        if index == new_index:
+            return
+        self._ids.insert(new_index, self._ids.pop(index))
+        self._values.insert(new_index, self._values.pop(index))
+
+        new_order = list(range(len(self._ids)))
+        new_order.insert(new_index, new_order.pop(index))
+        self.rows_reordered(Gtk.TreePath(), None, new_order)
+
+    def move_before(self, iter_, position):
+        """Moves the row before position, or to the end if position
+        is None
+        """
+
+        index = self._iter_index(iter_)
+        if position is None:
+            new_index = len(self._ids) - 1
+        else:
+            new_index = self._iter_index(position)
+            if new_index > index:
+                new_index -= 1
+        self._move(index, new_index)
+
+    def move_after(self, iter_, position):
+        """Moves the row after position, or to the start if position
+        is None
+        """
+
+        index = self._iter_index(iter_)
+        if position is None:
+            new_index = 0
+        else:
+            new_index = self._iter_index(position)
+            if new_index < index:
+                new_index += 1
+        self._move(index, new_index)
@@ -533,6 +533,8 @@ class PluginWindow(UniqueWindow, PersistentWindowMixin):
 
     def __refill(self, view, prefs, errors, state_combo):
         pm = PluginManager.instance
+        # list all plugins, not only the ones imported on start
+        pm.load_deferred()
 
         # refill plugin list
         view.refill(pm.plugins)
@@ -58,7 +58,8 @@ from quodlibet.qltk.about import AboutDialog
 from quodlibet.util import copool, connect_destroy, connect_after_destroy
 from quodlibet.util.library import get_scan_dirs
 from quodlibet.util import connect_obj, print_d
-from quodlibet.util.library import background_filter, scan_library
+from quodlibet.util.library import background_filter, scan_library, \
+    get_scan_workers
 from quodlibet.util.path import uri_is_valid
 from quodlibet.qltk.window import PersistentWindowMixin, Window, on_first_map
 from quodlibet.qltk.songlistcolumns import CurrentColumn
@@ -950,7 +951,7 @@ class QuodLibetWindow(Window, PersistentWindowMixin, AppWindow):
         else:
             if dirs:
                 copool.add(
-                    self.__library.scan, dirs,
+                    self.__library.scan, dirs, workers=get_scan_workers(),
                     cofuncid="library", funcid="library")
 
     def __songlist_key_press(self, songlist, event):
@@ -1205,6 +1206,7 @@ class QuodLibetWindow(Window, PersistentWindowMixin, AppWindow):
                 self.remove_accel_group(self.browser.accelerators)
             container.destroy()
             self.browser.destroy()
+        browsers.init_browser(Browser, library)
         self.browser = Browser(library)
         self.browser.connect('songs-selected',
             self.__browser_cb, library, player)
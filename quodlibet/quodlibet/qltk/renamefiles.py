@@ -453,7 +453,7 @@ class RenameFiles(Gtk.VBox):
 
         # native paths
         orignames = [song["~filename"] for song in songs]
-        newnames = [fsn2text(pattern.format(song)) for song in songs]
+        newnames = [fsn2text(n) for n in pattern.format_many(songs)]
         for f in self.filter_box.filters:
             if f.active:
                 newnames = f.filter_list(orignames, newnames)
@@ -257,6 +257,11 @@ class LimitSearchBarBox(SearchBarBox):
         else:
             return songs
 
+    def is_limited(self):
+        """If limit() can drop songs"""
+
+        return self.__limit.get_visible()
+
     def toggle_limit_widgets(self, button):
         """Toggles the visibility of the limit widget according to `button`"""
         if button.get_active():
@@ -20,7 +20,7 @@ from quodlibet import qltk
 from quodlibet import util
 from quodlibet import _
 
-from quodlibet.query import Query
+from quodlibet.query import Query, LiveQuery
 from quodlibet.pattern import Pattern
 from quodlibet.qltk.information import Information
 from quodlibet.qltk.properties import SongProperties
@@ -30,6 +30,7 @@ from quodlibet.qltk.songmodel import PlaylistModel
 from quodlibet.qltk import Icons
 from quodlibet.qltk.delete import trash_songs
 from quodlibet.formats._audio import TAG_TO_SORT, AudioFile
+from quodlibet.formats._sortkeys import get_sort_func
 from quodlibet.qltk.x import SeparatorMenuItem
 from quodlibet.qltk.songlistcolumns import create_songlist_column
 from quodlibet.util import connect_destroy
@@ -413,8 +414,14 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
         connect_destroy(librarian, 'changed', self.__song_updated)
         connect_destroy(librarian, 'removed', self.__song_removed, player)
 
+        # the songs of the browser filter, to update the list when songs
+        # start or stop matching
+        self.__live = None
         if update:
-            connect_destroy(librarian, 'added', self.__song_added)
+            self.__live = LiveQuery(librarian)
+            self.__live.connect('entered', self.__songs_entered, player)
+            self.__live.connect('left', self.__songs_left, librarian, player)
+            self.connect('destroy', lambda *x: self.__live.destroy())
 
         if player:
             connect_destroy(
@@ -746,19 +753,23 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             return []
         return model.get()
 
-    def _sort_songs(self, songs):
-        """Sort passed songs in place based on the column sort orders"""
+    def _get_sort_passes(self):
+        """Returns a list of (key function, reverse) tuples, in the order
+        songs have to be sorted by them.
+        """
+
+        def default_key(song):
+            return song.sort_key
 
+        passes = []
         last_tag = None
         last_order = None
-        first = True
-        for tag, reverse in self.get_sort_orders():
-            tag = get_sort_tag(tag)
+        for column_tag, reverse in self.get_sort_orders():
+            tag = get_sort_tag(column_tag)
 
             # always sort using the default sort key first
-            if first:
-                first = False
-                songs.sort(key=lambda s: s.sort_key, reverse=reverse)
+            if not passes:
+                passes.append((default_key, reverse))
                 last_order = reverse
                 last_tag = ""
 
@@ -769,10 +780,20 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             last_tag = tag
 
             if tag == "":
-                songs.sort(key=lambda s: s.sort_key, reverse=reverse)
+                passes.append((default_key, reverse))
             else:
-                sort_func = AudioFile.sort_by_func(tag)
-                songs.sort(key=sort_func, reverse=reverse)
+                # keys get cached per column in the songs
+                sort_func = get_sort_func(
+                    column_tag, AudioFile.sort_by_func(tag))
+                passes.append((sort_func, reverse))
+
+        return passes
+
+    def _sort_songs(self, songs):
+        """Sort passed songs in place based on the column sort orders"""
+
+        for key, reverse in self._get_sort_passes():
+            songs.sort(key=key, reverse=reverse)
 
     def add_songs(self, songs):
         """Add songs to the list in the right order and position"""
@@ -789,14 +810,39 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             model.append_many(songs)
             return
 
-        # FIXME: Replace with something fast
-        old_songs = self.get_songs()
-        old_songs.extend(songs)
-
-        self._sort_songs(old_songs)
+        passes = self._get_sort_passes()
+        songs = list(songs)
+        for key, reverse in passes:
+            songs.sort(key=key, reverse=reverse)
+
+        # the last sort pass decides first, ties fall through to the
+        # earlier ones
+        passes.reverse()
+
+        def is_after(song, other):
+            for key, reverse in passes:
+                a, b = key(song), key(other)
+                if a < b:
+                    return reverse
+                elif b < a:
+                    return not reverse
+            return True
 
-        for index, song in sorted(zip(map(old_songs.index, songs), songs)):
-            model.insert(index, row=[song])
+        # merge the sorted songs into the list, each one goes behind all
+        # rows it isn't sorted before
+        get_value = model.get_value
+        iter_nth_child = model.iter_nth_child
+        start = 0
+        for song in songs:
+            low, high = start, len(model)
+            while low < high:
+                mid = (low + high) // 2
+                if is_after(song, get_value(iter_nth_child(None, mid))):
+                    low = mid + 1
+                else:
+                    high = mid
+            model.insert(low, row=[song])
+            start = low + 1
 
     def set_songs(self, songs, sorted=False, scroll=True, scroll_select=False):
         """Fill the song list.
@@ -853,6 +899,16 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
         # pass the songs manually
         self.info._update_songs(songs)
 
+        if self.__live is not None:
+            browser = getattr(qltk.get_top_parent(self), "browser", None)
+            if browser is not None and callable(browser.active_filter):
+                self.__live.set_query(
+                    browser.active_filter, songs,
+                    limited=browser.limits_results(),
+                    match_many=browser.active_filter_songs)
+            else:
+                self.__live.set_query(None)
+
     def jump_to_song(self, song, select=False):
         """Scrolls to and selects the given song if in the list.
 
@@ -912,11 +968,20 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             if row[0] in songs:
                 model.row_changed(row.path, row.iter)
 
-    def __song_added(self, librarian, songs):
-        window = qltk.get_top_parent(self)
-        filter_ = window.browser.active_filter
-        if callable(filter_):
-            self.add_songs(listfilter(filter_, songs))
+    def __songs_entered(self, live, songs, player):
+        # the playing song stays in the list until it has ended
+        song = player and player.song
+        if song in songs and self.get_model().find(song) is not None:
+            songs = [s for s in songs if s is not song]
+        self.add_songs(songs)
+
+    def __songs_left(self, live, songs, librarian, player):
+        # removed songs are handled in __song_removed and the playing song
+        # gets removed by the main window once it has ended
+        song = player and player.song
+        songs = set(s for s in songs if s is not song and s in librarian)
+        if songs and len(self.get_model()):
+            self.remove_iters(self.get_model().find_all(songs))
 
     def __song_removed(self, librarian, songs, player):
         # The player needs to be called first so it can ge the next song
@@ -349,7 +349,7 @@ class PatternColumn(WideTextColumn):
     def _fetch_value(self, model, iter_):
         song = model.get_value(iter_)
         if self._pattern is not None:
-            return self._pattern % song
+            return self._pattern.format(song, memo=True)
         return u""
 
     def _apply_value(self, model, iter_, cell, value):
@@ -10,9 +10,8 @@
 from gi.repository import Gtk
 
 from quodlibet.qltk.playorder import OrderInOrder
-from quodlibet.qltk.models import ObjectStore
+from quodlibet.qltk.models import ObjectListModel
 from quodlibet.util import print_d
-from quodlibet.compat import izip
 from quodlibet import config
 
 
@@ -131,11 +130,10 @@ class PlaylistMux(object):
         """Remove all occurrences of all passed songs in the queue"""
 
         q = self.q
-        for iter_ in q.find_all(songs):
-            q.remove(iter_)
+        q.remove_many(q.find_all(songs))
 
 
-class TrackCurrentModel(ObjectStore):
+class TrackCurrentModel(ObjectListModel):
 
     def __init__(self, *args, **kwargs):
         super(TrackCurrentModel, self).__init__(*args, **kwargs)
@@ -148,13 +146,16 @@ class TrackCurrentModel(ObjectStore):
         """Clear the model and add the passed songs"""
 
         print_d("Filling view model with %d songs." % len(songs))
-        self.clear()
         self.__iter = None
+        self.replace(songs)
 
         oldsong = self.last_current
-        for iter_, song in izip(self.iter_append_many(songs), songs):
+        current = None
+        for index, song in enumerate(songs):
             if song is oldsong:
-                self.__iter = iter_
+                current = index
+        if current is not None:
+            self.__iter = self.iter_nth_child(None, current)
 
     def get(self):
         """A list of all contained songs"""
@@ -199,10 +200,10 @@ class TrackCurrentModel(ObjectStore):
         if self.current == song:
             return self.current_iter
 
-        # search the rest
-        for iter_, value in self.iterrows():
+        # search the rest, only creating an iter for the match
+        for index, value in enumerate(self.values()):
             if value == song:
-                return iter_
+                return self.iter_nth_child(None, index)
         return
 
     def find_all(self, songs):
@@ -211,17 +212,23 @@ class TrackCurrentModel(ObjectStore):
         """
 
         songs = set(songs)
-        found = []
-        append = found.append
-        for iter_, value in self.iterrows():
-            if value in songs:
-                append(iter_)
-        return found
+        nth_child = self.iter_nth_child
+        return [nth_child(None, index)
+                for index, value in enumerate(self.values())
+                if value in songs]
 
     def remove(self, iter_):
         if self.__iter and self[iter_].path == self[self.__iter].path:
             self.__iter = None
-        super(TrackCurrentModel, self).remove(iter_)
+        return super(TrackCurrentModel, self).remove(iter_)
+
+    def remove_many(self, iters):
+        iters = list(iters)
+        if self.__iter:
+            current = self._iter_index(self.__iter)
+            if current in {self._iter_index(iter_) for iter_ in iters}:
+                self.__iter = None
+        super(TrackCurrentModel, self).remove_many(iters)
 
     def clear(self):
         self.__iter = None
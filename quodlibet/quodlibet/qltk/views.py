@@ -834,13 +834,20 @@ class BaseView(Gtk.TreeView):
         selection = self.get_selection()
         model = self.get_model()
 
+        def remove(iters):
+            # some models can remove many rows more efficiently
+            remove_many = getattr(model, "remove_many", None)
+            if remove_many is not None:
+                remove_many(iters)
+            else:
+                for iter_ in iters:
+                    model.remove(iter_)
+
         if force_restore:
-            for iter_ in iters:
-                model.remove(iter_)
+            remove(iters)
         else:
             old_count = selection.count_selected_rows()
-            for iter_ in iters:
-                model.remove(iter_)
+            remove(iters)
             # only restore a selection if all selected rows are gone afterwards
             if not old_count or selection.count_selected_rows():
                 return
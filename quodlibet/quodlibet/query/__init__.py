@@ -5,6 +5,7 @@
 # (at your option) any later version.
 
 from ._query import Query, QueryType
+from ._live import LiveQuery
 
 
-Query, QueryType
+Query, QueryType, LiveQuery
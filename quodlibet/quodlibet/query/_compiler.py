@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from quodlibet.compat import exec_
+
+
+class QueryCompiler(object):
+    """Turns a tree of query nodes into Python functions which evaluate the
+    whole tree as one expression, instead of calling `search()` of every
+    node for every song.
+
+    Nodes provide a `_compile(compiler, var)` method which returns an
+    expression matching the value in the variable named `var`.
+    """
+
+    def __init__(self, node):
+        self.__node = node
+        self.__scope = {}
+
+    def bind(self, obj):
+        """Makes `obj` available to the generated code.
+
+        Returns:
+            str: the name it is available under
+        """
+
+        name = "_b%d" % len(self.__scope)
+        self.__scope[name] = obj
+        return name
+
+    def compile(self):
+        """Returns a (search, filter) tuple, matching the interface of
+        `Node.search` and `Node.filter`.
+        """
+
+        expr = self.__node._compile(self, "s")
+        # bind everything as default arguments so lookups are local
+        args = "".join(", %s=%s" % (n, n) for n in sorted(self.__scope))
+        code = "\n".join([
+            "def search(s%s):" % args,
+            "    return bool(%s)" % expr,
+            "def filter(songs%s):" % args,
+            "    result = []",
+            "    append = result.append",
+            "    for s in songs:",
+            "        if %s:" % expr,
+            "            append(s)",
+            "    return result",
+        ])
+
+        scope = dict(self.__scope)
+        exec_(compile(code, "<query>", "exec"), scope)
+        return scope["search"], scope["filter"]
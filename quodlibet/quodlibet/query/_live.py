@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from gi.repository import GObject
+
+from quodlibet.compat import string_types, listfilter
+
+from ._query import Query
+
+
+class LiveQuery(GObject.Object):
+    """Keeps track of the songs of a library (or librarian) matching a
+    query and, when the library changes, only tests the changed songs and
+    emits the songs entering and leaving the result.
+
+    The query can be a `Query`, query text or any callable taking a song
+    and returning if it matches. Without a query nothing is tracked.
+    """
+
+    __gsignals__ = {
+        # songs which match now, but didn't before
+        'entered': (GObject.SignalFlags.RUN_LAST, None, (object,)),
+        # songs which matched, but don't anymore or got removed
+        'left': (GObject.SignalFlags.RUN_LAST, None, (object,)),
+    }
+
+    def __init__(self, library, query=None, songs=None):
+        super(LiveQuery, self).__init__()
+        self._library = library
+        self._match = None
+        self._match_many = None
+        self._limited = False
+        self._songs = set()
+        self._sig_ids = [
+            library.connect('added', self.__added),
+            library.connect('changed', self.__changed),
+            library.connect('removed', self.__removed),
+        ]
+        self.set_query(query, songs)
+
+    def destroy(self):
+        for sig_id in self._sig_ids:
+            self._library.disconnect(sig_id)
+        self._sig_ids = []
+        self.set_query(None)
+
+    def set_query(self, query, songs=None, limited=False, match_many=None):
+        """Replace the query.
+
+        If the current result is known it can be passed as `songs`,
+        otherwise all songs of the library get tested.
+
+        If `limited` is True `songs` is only a part of the result, so
+        changed songs can leave it but only added songs can enter.
+
+        `match_many` can be passed to test many songs at once, it takes a
+        list of songs and returns the matching ones.
+        """
+
+        if isinstance(query, string_types):
+            query = Query(query)
+        if isinstance(query, Query):
+            query = query.search
+
+        if query is not None and match_many is None:
+            def match_many(songs, match=query):
+                return listfilter(match, songs)
+
+        self._match = query
+        self._match_many = match_many
+        self._limited = limited
+        if query is None:
+            self._songs = set()
+        elif songs is None:
+            self._songs = set(match_many(self._library))
+        else:
+            self._songs = set(songs)
+
+    @property
+    def active(self):
+        """If there is a query to track"""
+
+        return self._match is not None
+
+    @property
+    def songs(self):
+        """A set of the matching songs"""
+
+        return set(self._songs)
+
+    def __contains__(self, song):
+        return song in self._songs
+
+    def __len__(self):
+        return len(self._songs)
+
+    def __added(self, library, songs):
+        if self._match is None:
+            return
+        entered = list(self._match_many(
+            [s for s in songs if s not in self._songs]))
+        if entered:
+            self._songs.update(entered)
+            self.emit('entered', entered)
+
+    def __changed(self, library, songs):
+        if self._match is None:
+            return
+
+        current = self._songs
+        if self._limited:
+            # only songs in the result can change
+            songs = [s for s in songs if s in current]
+        matching = set(self._match_many(songs))
+        entered = []
+        left = []
+        for song in songs:
+            if song in matching:
+                if song not in current:
+                    entered.append(song)
+            elif song in current:
+                left.append(song)
+
+        if left:
+            current.difference_update(left)
+            self.emit('left', left)
+        if entered:
+            current.update(entered)
+            self.emit('entered', entered)
+
+    def __removed(self, library, songs):
+        left = [s for s in songs if s in self._songs]
+        if left:
+            self._songs.difference_update(left)
+            self.emit('left', left)
@@ -11,12 +11,15 @@
 
 import time
 import operator
+import sre_parse
+import unicodedata
 
 from senf import fsn2text, fsnative
 
 from quodlibet.unisearch import compile
-from quodlibet.compat import floordiv, text_type
-from quodlibet.util import parse_date
+from quodlibet.compat import floordiv, text_type, unichr
+from quodlibet import util
+from quodlibet.util import parse_date, cached_property
 from quodlibet.formats import FILESYSTEM_TAGS, TIME_TAGS
 
 
@@ -36,6 +39,29 @@ class Node(object):
     def filter(self, sequence):
         return [s for s in sequence if self.search(s)]
 
+    def candidates(self, index, tags=None):
+        """Returns a set including all songs which could match, using a
+        `TagIndex`, or None if that can't be narrowed down.
+
+        `tags` are the tags a value is matched against.
+        """
+
+        return None
+
+    def cacheable(self):
+        """Whether the result only depends on the song, and not on the
+        time, configuration or other state.
+        """
+
+        return True
+
+    def _compile(self, compiler, var):
+        """Returns a Python expression which is true if the value in the
+        variable `var` matches, see `QueryCompiler`.
+        """
+
+        return "%s(%s)" % (compiler.bind(self.search), var)
+
     def _unpack(self):
         return self
 
@@ -64,10 +90,60 @@ class Regex(Node):
             raise ParseError(
                 "The regular expression /%s/ is invalid." % self.pattern)
 
+    @cached_property
+    def _words(self):
+        return literal_words(self.pattern)
+
+    def candidates(self, index, tags=None):
+        if tags is None:
+            return None
+
+        result = None
+        for word in self._words:
+            songs = index.search(tags, word)
+            if songs is None:
+                continue
+            if result is None:
+                result = songs
+            else:
+                result &= songs
+        return result
+
     def __repr__(self):
         return "<Regex pattern=%s mod=%s>" % (self.pattern, self.mod_string)
 
 
+def literal_words(pattern):
+    """Returns the lower case ASCII words (letters and digits) which are
+    part of every text a regex pattern can match.
+    """
+
+    try:
+        parsed = sre_parse.parse(unicodedata.normalize("NFC", pattern))
+    except sre_parse.error:
+        return []
+
+    words = []
+
+    def collect(items):
+        word = []
+        for op, av in items:
+            op = str(op).lower()
+            if op == "literal" and av < 128 and unichr(av).isalnum():
+                word.append(unichr(av).lower())
+                continue
+            if word:
+                words.append(u"".join(word))
+                word = []
+            if op == "subpattern":
+                collect(av[-1])
+        if word:
+            words.append(u"".join(word))
+
+    collect(parsed)
+    return words
+
+
 class True_(Node):
     """Always True"""
 
@@ -77,6 +153,9 @@ class True_(Node):
     def filter(self, list_):
         return list(list_)
 
+    def _compile(self, compiler, var):
+        return "True"
+
     def __repr__(self):
         return "<True>"
 
@@ -97,6 +176,12 @@ class False_(Node):
     def filter(self, list_):
         return []
 
+    def candidates(self, index, tags=None):
+        return set()
+
+    def _compile(self, compiler, var):
+        return "False"
+
     def __repr__(self):
         return "<False>"
 
@@ -120,6 +205,24 @@ class Union(Node):
                 return True
         return False
 
+    def candidates(self, index, tags=None):
+        result = set()
+        for re in self.res:
+            songs = re.candidates(index, tags)
+            if songs is None:
+                return None
+            result |= songs
+        return result
+
+    def _compile(self, compiler, var):
+        if not self.res:
+            return "False"
+        return "(%s)" % " or ".join(
+            re._compile(compiler, var) for re in self.res)
+
+    def cacheable(self):
+        return all(re.cacheable() for re in self.res)
+
     def __repr__(self):
         return "<Union %r>" % self.res
 
@@ -162,6 +265,27 @@ class Inter(Node):
             current = list(current)
         return current
 
+    def candidates(self, index, tags=None):
+        result = None
+        for re in self.res:
+            songs = re.candidates(index, tags)
+            if songs is None:
+                continue
+            if result is None:
+                result = songs
+            else:
+                result &= songs
+        return result
+
+    def _compile(self, compiler, var):
+        if not self.res:
+            return "True"
+        return "(%s)" % " and ".join(
+            re._compile(compiler, var) for re in self.res)
+
+    def cacheable(self):
+        return all(re.cacheable() for re in self.res)
+
     def __repr__(self):
         return "<Inter %r>" % self.res
 
@@ -192,6 +316,12 @@ class Neg(Node):
     def search(self, data):
         return not self.res.search(data)
 
+    def _compile(self, compiler, var):
+        return "(not %s)" % self.res._compile(compiler, var)
+
+    def cacheable(self):
+        return self.res.cacheable()
+
     def __repr__(self):
         return "<Neg %r>" % self.res
 
@@ -224,6 +354,15 @@ class Numcmp(Node):
         "!=": operator.ne,
     }
 
+    swapped = {
+        operator.lt: operator.gt,
+        operator.le: operator.ge,
+        operator.gt: operator.lt,
+        operator.ge: operator.le,
+        operator.eq: operator.eq,
+        operator.ne: operator.ne,
+    }
+
     def __init__(self, expr, op, expr2):
         self._expr = expr
         self._op = self.operators[op]
@@ -238,6 +377,21 @@ class Numcmp(Node):
             return self._op(val, val2)
         return False
 
+    def cacheable(self):
+        # relative times, default ratings..
+        return False
+
+    def candidates(self, index, tags=None):
+        # only a tag compared to a number can be looked up
+        expr, op, expr2 = self._expr, self._op, self._expr2
+        if isinstance(expr2, NumexprTag):
+            expr, op, expr2 = expr2, self.swapped[op], expr
+        if not isinstance(expr, NumexprTag) or \
+                not isinstance(expr2, (NumexprNumber, NumexprNumberOrDate)):
+            return None
+        value = expr2.evaluate(None, time.time(), expr.use_date())
+        return expr.candidates(index, op, value)
+
     def __repr__(self):
         return "<Numcmp expr=%r, op=%r, expr2=%r>" % (
             self._expr, self._op.__name__, self._expr2)
@@ -298,6 +452,39 @@ class NumexprTag(Numexpr):
             return round(num, 2)
         return None
 
+    # evaluate() rounds to two decimals
+    ROUND_MARGIN = 0.01
+
+    # the current time can move on while the matching songs get filtered
+    TIME_MARGIN = 60 * 60
+
+    def candidates(self, index, op, value):
+        """Returns a set including all songs for which `op(tag, value)`
+        could be true, or None.
+        """
+
+        if self._tag == "date" or ":" in self._tag:
+            return None
+
+        margin = self.ROUND_MARGIN
+        if op in (operator.lt, operator.le):
+            low, high = None, value + margin
+        elif op in (operator.gt, operator.ge):
+            low, high = value - margin, None
+        elif op is operator.eq:
+            low, high = value - margin, value + margin
+        else:
+            return None
+
+        if self._ftag in TIME_TAGS:
+            # the tag gets evaluated as `now - value`
+            now = time.time()
+            low, high = (
+                None if high is None else now - high,
+                None if low is None else now + self.TIME_MARGIN - low)
+
+        return index.search_range(self._ftag, low, high)
+
     def __repr__(self):
         return "<NumexprTag tag=%r>" % self._tag
 
@@ -545,6 +732,46 @@ class Tag(Node):
 
         return False
 
+    def candidates(self, index, tags=None):
+        return self.res.candidates(
+            index, self._names + self.__intern + self.__fs)
+
+    # internal tags which don't only depend on the song
+    UNCACHEABLE = {"~playlists", "~rating", "~#rating", "~lyrics"}
+
+    def cacheable(self):
+        for name in self.__intern:
+            if self.UNCACHEABLE.intersection(
+                    ["~" + t.lstrip("~") for t in util.tagsplit(name)]):
+                return False
+        return self.res.cacheable()
+
+    def _compile(self, compiler, var):
+        # the same lookups as in search(), inlined
+        values = []
+        for name in self._names:
+            get = "%s.get(%r)" % (var, name)
+            if name in ("filename", "mountpoint"):
+                fallback = "%s(%s.get(%r, %s))" % (
+                    compiler.bind(fsn2text), var, "~" + name,
+                    compiler.bind(fsnative()))
+            else:
+                fallback = "%s.get(%r, u'')" % (var, "~" + name)
+            values.append(
+                "(%s if %s is not None else %s)" % (get, get, fallback))
+        for name in self.__intern:
+            values.append("%s(%r)" % (var, name))
+        for name in self.__fs:
+            values.append("%s(%s(%r, %s))" % (
+                compiler.bind(fsn2text), var, name,
+                compiler.bind(fsnative())))
+
+        if not values:
+            return "False"
+        search = compiler.bind(self.res.search)
+        return "(%s)" % " or ".join(
+            "%s(%s)" % (search, value) for value in values)
+
     def __repr__(self):
         names = self._names + self.__intern
         return ("<Tag names=%r, res=%r>" % (names, self.res))
@@ -593,6 +820,9 @@ class Extension(Node):
     def search(self, data):
         return self.__valid and self.__plugin.search(data, self.__body)
 
+    def cacheable(self):
+        return False
+
     def __repr__(self):
         return ('<Extension name=%r valid=%r body=%r>'
                 % (self.__name, self.__valid, self.__body))
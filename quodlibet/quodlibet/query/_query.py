@@ -13,6 +13,7 @@ from quodlibet.util.dprint import frame_info
 from . import _match as match
 from ._match import error, Node, False_
 from ._parser import QueryParser
+from ._compiler import QueryCompiler
 from quodlibet.util import re_escape, enum, cached_property
 from quodlibet.compat import PY2, text_type
 
@@ -104,13 +105,26 @@ class Query(Node):
         return "<Query string=%r type=%r star=%r>" % (
             self.string, self.type, self.star)
 
+    @cached_property
+    def _compiled(self):
+        return QueryCompiler(self._match).compile()
+
     @cached_property
     def search(self):
-        return self._match.search
+        return self._compiled[0]
 
     @cached_property
     def filter(self):
-        return self._match.filter
+        return self._compiled[1]
+
+    def _compile(self, compiler, var):
+        return self._match._compile(compiler, var)
+
+    def cacheable(self):
+        return self._match.cacheable()
+
+    def candidates(self, index, tags=None):
+        return self._match.candidates(index, tags)
 
     @property
     def valid(self):
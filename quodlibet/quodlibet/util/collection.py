@@ -10,9 +10,13 @@
 
 from __future__ import absolute_import
 
+import itertools
+import math
 import os
 import random
+import threading
 
+from gi.repository import GLib
 from senf import fsnative, fsn2bytes, bytes2fsn
 
 from quodlibet import ngettext, _
@@ -21,10 +25,11 @@ from quodlibet import config
 from quodlibet.formats._audio import TAG_TO_SORT, NUMERIC_ZERO_DEFAULT
 from quodlibet.formats._audio import PEOPLE as _PEOPLE
 from quodlibet.compat import xrange, text_type, number_types, string_types, \
-    swap_to_string, listmap
-from collections import Iterable
+    swap_to_string, listmap, integer_types, iteritems
+from collections import Iterable, OrderedDict
 from quodlibet.util.path import escape_filename, unescape_filename
-from quodlibet.util.dprint import print_d
+from quodlibet.util.dprint import print_d, print_w
+from quodlibet.util.atomic import atomic_save
 from quodlibet.util.misc import total_ordering, hashable
 from .collections import HashedList
 
@@ -74,6 +79,227 @@ NUM_FUNCS = {
 }
 
 
+class _NumericAggregate(object):
+    """Value frequencies and count of a numeric tag"""
+
+    def __init__(self):
+        self.values = {}  # value -> number of songs
+        self.count = 0
+        self.unset = 0  # songs using the default (rating only)
+        self._total = 0
+
+    def add(self, value):
+        if value is None:
+            self.unset += 1
+        elif value != "":
+            self.values[value] = self.values.get(value, 0) + 1
+            self.count += 1
+            self._total = None
+
+    def remove(self, value):
+        if value is None:
+            self.unset -= 1
+        elif value != "":
+            count = self.values[value] - 1
+            if count:
+                self.values[value] = count
+            else:
+                del self.values[value]
+            self.count -= 1
+            self._total = None
+
+    def __sum(self, default=None):
+        # summed up again after changes instead of keeping a running
+        # total, which would accumulate floating point errors
+        values = self.values
+        if default is None and \
+                all(isinstance(v, integer_types) for v in values):
+            return sum(v * c for v, c in iteritems(values))
+        numbers = itertools.chain.from_iterable(
+            itertools.repeat(v, c) for v, c in iteritems(values))
+        if default is not None:
+            numbers = itertools.chain(
+                numbers, itertools.repeat(default, self.unset))
+        return math.fsum(numbers)
+
+    @property
+    def total(self):
+        """The sum of all set values"""
+
+        if self._total is None:
+            self._total = self.__sum()
+        return self._total
+
+    def get(self, func, default=None):
+        """Returns the value of the songs combined by `func` (see
+        NUM_FUNCS) or None if no song has a value.
+
+        `default` is used for songs with an unset value.
+        """
+
+        count = self.count
+        values = list(self.values)
+        if self.unset:
+            count += self.unset
+            total = self.__sum(default)
+            values.append(default)
+        else:
+            total = self.total
+        if not count:
+            return None
+
+        if func == "sum":
+            return total
+        elif func == "avg":
+            return float(total) / count
+        elif func == "bav":
+            m = config.RATINGS.default
+            c = config.getfloat("settings", "bayesian_rating_factor", 0.0)
+            return float(m * c + total) / (c + count)
+        elif func == "max":
+            return max(values)
+        elif func == "min":
+            return min(values)
+        raise KeyError(func)
+
+
+def _people_scores(song):
+    """Returns the (people, peoplesort) relevance scores of the song as
+    lists of (person, score) pairs, lower means more relevant.
+    """
+
+    people = {}
+    peoplesort = {}
+    # Rank people by "relevance" -- artists before composers
+    # before performers, then by number of appearances.
+    for w, k in enumerate(ELPOEP):
+        persons = song.list(k)
+        for person in persons:
+            people[person] = people.get(person, 0) - PEOPLE_SCORE[w]
+        if k in TAG_TO_SORT:
+            persons = song.list(TAG_TO_SORT[k]) or persons
+        for person in persons:
+            peoplesort[person] = peoplesort.get(person, 0) - PEOPLE_SCORE[w]
+    return list(people.items()), list(peoplesort.items())
+
+
+class _Aggregates(object):
+    """Values of a song collection which are kept up to date while songs
+    get added, removed or changed, without looking at all songs.
+
+    For each song the values it contributes are kept, so they can be
+    taken out again once it changes.
+    """
+
+    NUMERIC = ["~#rating", "~#length", "~#playcount", "~#skipcount",
+               "~#added", "~#lastplayed", "~#laststarted", "~#mtime",
+               "~#year", "~#originalyear", "~#filesize", "~#bitrate"]
+    """Numeric tags for which all functions in NUM_FUNCS are available"""
+
+    TEXT = ["album", "albumartist", "artist", "date", "genre"]
+    """Tags for which the values sorted by appearance are available"""
+
+    def __init__(self, songs):
+        self.source = songs
+        self._numeric = [_NumericAggregate() for k in self.NUMERIC]
+        self._numeric_keys = dict(zip(self.NUMERIC, self._numeric))
+        self._text = [{} for k in self.TEXT]
+        self._text_keys = dict(zip(self.TEXT, self._text))
+        self._discs = {}
+        self._weighted_bitrate = _NumericAggregate()
+        self._people = {}
+        self._peoplesort = {}
+        self._songs = {}  # song -> contributed values
+        for song in songs:
+            self.add(song)
+
+    def __len__(self):
+        return len(self._songs)
+
+    def __contribution(self, song):
+        numeric = [song.get("~#rating")]
+        numeric.extend(song(key) for key in self.NUMERIC[1:])
+        text = [song.list(key) for key in self.TEXT]
+        people, peoplesort = _people_scores(song)
+        weighted = song("~#bitrate", 0) * song("~#length", 0)
+        return numeric, text, song("~#disc", 1), weighted, people, peoplesort
+
+    @staticmethod
+    def __count(counts, value, diff):
+        count = counts.get(value, 0) + diff
+        if count:
+            counts[value] = count
+        else:
+            del counts[value]
+
+    def add(self, song):
+        """Add a new song or update the values of a changed one"""
+
+        self.remove(song)
+        values = self.__contribution(song)
+        numeric, text, disc, weighted, people, peoplesort = values
+        for aggregate, value in zip(self._numeric, numeric):
+            aggregate.add(value)
+        for counts, tag_values in zip(self._text, text):
+            for value in tag_values:
+                counts[value] = counts.get(value, 0) + 1
+        self._discs[disc] = self._discs.get(disc, 0) + 1
+        self._weighted_bitrate.add(weighted)
+        for person, score in people:
+            self.__count(self._people, person, score)
+        for person, score in peoplesort:
+            self.__count(self._peoplesort, person, score)
+        self._songs[song] = values
+
+    def remove(self, song):
+        values = self._songs.pop(song, None)
+        if values is None:
+            return
+        numeric, text, disc, weighted, people, peoplesort = values
+        for aggregate, value in zip(self._numeric, numeric):
+            aggregate.remove(value)
+        for counts, tag_values in zip(self._text, text):
+            for value in tag_values:
+                self.__count(counts, value, -1)
+        self.__count(self._discs, disc, -1)
+        self._weighted_bitrate.remove(weighted)
+        for person, score in people:
+            self.__count(self._people, person, -score)
+        for person, score in peoplesort:
+            self.__count(self._peoplesort, person, -score)
+
+    def get(self, key):
+        """Returns the value for `key` like Collection.get() or None.
+
+        Raises KeyError if the value isn't aggregated.
+        """
+
+        if key.startswith("~#"):
+            key = key[2:]
+            if key[-4:-3] == ":":
+                func = key[-3:]
+                key = key[:-4]
+            elif key == "discs":
+                return len(self._discs)
+            elif key == "bitrate":
+                length = self._numeric_keys["~#length"].get("sum")
+                if not length:
+                    return 0
+                return self._weighted_bitrate.total / length
+            else:
+                func = NUM_DEFAULT_FUNCS.get(key, "avg")
+            return self._numeric_keys["~#" + key].get(
+                func, config.RATINGS.default)
+        elif key == "~people" or key == "~peoplesort":
+            scores = self._people if key == "~people" else self._peoplesort
+            people = sorted(scores.keys(), key=scores.__getitem__)[:100]
+            return "\n".join(people) or None
+
+        counts = self._text_keys[key]
+        values = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+        return "\n".join(v[0] for v in values) or None
+
+
 class Collection(object):
     """A collection of songs which implements some methods similar to the
     AudioFile class.
@@ -86,18 +312,21 @@ class Collection(object):
     songs = ()
 
     def __init__(self):
-        """Cache in _cache, LRU key order in _used, keys that return default
-        are in _default"""
-        self.__cache = {}
+        """Cache in _cache with the least recently used key first, keys
+        that return default are in _default"""
+        self.__cache = OrderedDict()
         self.__default = set()
-        self.__used = []
 
     def finalize(self):
         """Finalize the collection.
         Call this after songs get added or removed"""
         self.__cache.clear()
         self.__default.clear()
-        self.__used = []
+
+    def _get_aggregates(self):
+        """Returns an _Aggregates for the songs or None"""
+
+        return None
 
     def get(self, key, default=u"", connector=u" - "):
         if not self.songs:
@@ -135,22 +364,20 @@ class Collection(object):
         return [] if v == "" else v.split("\n")
 
     def __get_cached_value(self, key):
-        if key in self.__cache:
-            self.__used.remove(key)
-            self.__used.insert(0, key)
-            return self.__cache[key]
-        elif key in self.__default:
-            return None
-        else:
+        cache = self.__cache
+        try:
+            val = cache.pop(key)
+        except KeyError:
+            if key in self.__default:
+                return None
             val = self.__get_value(key)
             if val is None:
                 self.__default.add(key)
-            else:
-                self.__used.insert(0, key)
-                self.__cache[key] = val
-            # Remove the oldest if the cache is full
-            if len(self.__used) > self._cache_size:
-                self.__cache.pop(self.__used.pop(-1))
+                return None
+        cache[key] = val
+        # Remove the oldest if the cache is full
+        while len(cache) > self._cache_size:
+            cache.popitem(last=False)
         return val
 
     def __get_value(self, key):
@@ -158,6 +385,13 @@ class Collection(object):
         All internal tags are changed to represent a collection of songs.
         """
 
+        aggregates = self._get_aggregates()
+        if aggregates is not None:
+            try:
+                return aggregates.get(key)
+            except KeyError:
+                pass
+
         # Using key:<func> runs the resulting list of values
         # through the function before returning it.
         # Numeric keys without a func will default to a reasonable function
@@ -228,9 +462,7 @@ class Collection(object):
                 if not values:
                     self.__default.add(other)
                 else:
-                    if other in self.__used:
-                        self.__used.remove(other)
-                    self.__used.append(other)
+                    self.__cache.pop(other, None)
                     self.__cache[other] = "\n".join(values)
                 return ret
             elif numkey == "length":
@@ -299,21 +531,150 @@ class Album(Collection):
         # albumsort is part of the album_key, so every song has the same
         self.sort = util.human_sort_key(song("albumsort"))
         self.key = song.album_key
+        self.__aggregates = None
 
     @property
     def str_key(self):
         return str(self.key)
 
-    def finalize(self):
-        """Finalize this album. Call after songs get added or removed"""
+    def _get_aggregates(self):
+        aggregates = self.__aggregates
+        # in case songs got changed without telling us
+        if aggregates is None or aggregates.source is not self.songs or \
+                len(aggregates) != len(self.songs):
+            aggregates = self.__aggregates = _Aggregates(self.songs)
+        return aggregates
+
+    def __changed(self):
         super(Album, self).finalize()
         self.__dict__.pop("peoplesort", None)
         self.__dict__.pop("genre", None)
 
+    def add_song(self, song):
+        """Add a song, updating the album values"""
+
+        self.songs.add(song)
+        if self.__aggregates is not None:
+            self.__aggregates.add(song)
+        self.__changed()
+
+    def remove_song(self, song):
+        """Remove a song, updating the album values"""
+
+        self.songs.remove(song)
+        if self.__aggregates is not None:
+            self.__aggregates.remove(song)
+        self.__changed()
+
+    def update_song(self, song):
+        """Update the album values after the song has changed"""
+
+        if self.__aggregates is not None:
+            self.__aggregates.add(song)
+        self.__changed()
+
+    def finalize(self):
+        """Finalize this album. Call after songs get added or removed
+        without using add_song() or remove_song()"""
+        self.__aggregates = None
+        self.__changed()
+
     def __repr__(self):
         return "Album(%s)" % repr(self.key)
 
 
+class PlaylistIndex(object):
+    """Maps the entries of all playlists (songs or the filenames of masked
+    songs) to the playlists containing them and how often they do.
+    """
+
+    def __init__(self):
+        self._map = {}
+
+    def __contains__(self, item):
+        return item in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def add(self, item, playlist):
+        playlists = self._map.setdefault(item, {})
+        playlists[playlist] = playlists.get(playlist, 0) + 1
+
+    def remove(self, item, playlist):
+        playlists = self._map[item]
+        count = playlists[playlist] - 1
+        if count:
+            playlists[playlist] = count
+        else:
+            del playlists[playlist]
+            if not playlists:
+                del self._map[item]
+
+    def get_playlists(self, item):
+        """Returns a list of playlists containing `item`"""
+
+        return list(self._map.get(item, ()))
+
+    def get_count(self, item, playlist):
+        """Returns how often `item` is contained in `playlist`"""
+
+        return self._map.get(item, {}).get(playlist, 0)
+
+    def count_songs(self, songs):
+        """Returns a dict mapping each playlist containing any of `songs`
+        to the number of entries in `songs` it contains.
+        """
+
+        counts = {}
+        for song in songs:
+            for playlist in self._map.get(song, ()):
+                counts[playlist] = counts.get(playlist, 0) + 1
+        return counts
+
+
+PLAYLIST_INDEX = PlaylistIndex()
+"""The index of all playlist entries"""
+
+
+class _IndexedList(HashedList):
+    """A HashedList keeping `PLAYLIST_INDEX` up to date for `playlist`"""
+
+    def __init__(self, playlist):
+        super(_IndexedList, self).__init__()
+        self._playlist = playlist
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            item = list(item)
+            old_items = self._data[index]
+            new_items = item
+        else:
+            old_items = [self._data[index]]
+            new_items = [item]
+        super(_IndexedList, self).__setitem__(index, item)
+
+        playlist = self._playlist
+        for old in old_items:
+            PLAYLIST_INDEX.remove(old, playlist)
+        for new in new_items:
+            PLAYLIST_INDEX.add(new, playlist)
+
+    def __delitem__(self, index):
+        items = self._data[index]
+        if not isinstance(index, slice):
+            items = [items]
+        super(_IndexedList, self).__delitem__(index)
+
+        playlist = self._playlist
+        for item in items:
+            PLAYLIST_INDEX.remove(item, playlist)
+
+    def insert(self, index, item):
+        super(_IndexedList, self).insert(index, item)
+        PLAYLIST_INDEX.add(item, self._playlist)
+
+
 @hashable
 @swap_to_string
 @total_ordering
@@ -323,17 +684,24 @@ class Playlist(Collection, Iterable):
     """
 
     __instances = []
+    __counter = itertools.count()
 
     @classmethod
     def playlists_featuring(cls, song):
         """Returns the list of playlists in which this song appears"""
 
-        playlists = []
-        for instance in cls.__instances:
-            if song in instance._list:
-                playlists.append(instance)
+        playlists = PLAYLIST_INDEX.get_playlists(song)
+        playlists.sort(key=lambda p: p.__order)
         return playlists
 
+    @classmethod
+    def playlists_featuring_songs(cls, songs):
+        """Returns a dict mapping each playlist in which any of `songs`
+        appears to the number of entries in `songs` it contains
+        """
+
+        return PLAYLIST_INDEX.count_songs(songs)
+
     def get(self, key, default=u"", connector=u" - "):
         if key == "~name":
             return self.name
@@ -361,6 +729,9 @@ class Playlist(Collection, Iterable):
     def __iter__(self):
         return iter(self._list)
 
+    def __contains__(self, item):
+        return item in self._list
+
     def __len__(self):
         return len(self._list)
 
@@ -382,6 +753,7 @@ class Playlist(Collection, Iterable):
         super(Playlist, self).__init__()
         self.__inhibit_library_signals = False
         self.__instances.append(self)
+        self.__order = next(self.__counter)
 
         name = text_type(name)
         if not name:
@@ -392,7 +764,7 @@ class Playlist(Collection, Iterable):
 
         self.name = name
         self.library = library
-        self._list = HashedList()
+        self._list = _IndexedList(self)
 
     @classmethod
     def suggested_name_for(cls, songs):
@@ -503,6 +875,13 @@ class Playlist(Collection, Iterable):
     def write(self):
         pass
 
+    def write_later(self):
+        """Like write(), but may defer writing to coalesce multiple
+        changes into one write.
+        """
+
+        self.write()
+
     @property
     def has_duplicates(self):
         """Returns True if there are any duplicated files in this playlist"""
@@ -511,7 +890,7 @@ class Playlist(Collection, Iterable):
     def shuffle(self):
         """Randomly shuffles this playlist, without weighting"""
         random.shuffle(self._list)
-        self.write()
+        self.write_later()
 
     def __eq__(self, other):
         try:
@@ -534,12 +913,99 @@ class Playlist(Collection, Iterable):
         return u"\"%s\" (%s)" % (self.name, songs_text)
 
 
+class _PlaylistWriter(object):
+    """Collects playlists which need to be written and writes them in one
+    batch from a background thread once no further changes came in for
+    `DELAY` ms.
+    """
+
+    DELAY = 1000
+
+    def __init__(self):
+        self._dirty = OrderedDict()
+        self._source_id = None
+        self._write_thread = None
+
+    def mark_dirty(self, playlist):
+        self._dirty[playlist] = None
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+        self._source_id = GLib.timeout_add(self.DELAY, self.__timeout)
+
+    def discard(self, playlist):
+        """Forget about pending changes of `playlist` and wait for
+        writes in progress.
+        """
+
+        self.wait_for_write()
+        self._dirty.pop(playlist, None)
+
+    def is_writing(self):
+        """If a write is running in the background"""
+
+        return self._write_thread is not None and \
+            self._write_thread.is_alive()
+
+    def wait_for_write(self):
+        """Block until a write running in the background is done"""
+
+        if self._write_thread is not None:
+            self._write_thread.join()
+            self._write_thread = None
+
+    def flush(self):
+        """Write all dirty playlists, blocks until everything is written"""
+
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self.wait_for_write()
+        self.__write_snapshots(self.__take_snapshots())
+
+    def __take_snapshots(self):
+        # serialize here, so the playlists can change while writing
+        snapshots = [p._snapshot() for p in self._dirty]
+        self._dirty.clear()
+        return snapshots
+
+    def __timeout(self):
+        self._source_id = None
+        if self.is_writing():
+            # don't let two batches race for the same files
+            self._source_id = GLib.timeout_add(self.DELAY, self.__timeout)
+            return False
+
+        snapshots = self.__take_snapshots()
+        print_d("Writing %d playlist(s) in the background." % len(snapshots))
+        self._write_thread = threading.Thread(
+            target=self.__write_snapshots, args=(snapshots,))
+        self._write_thread.start()
+        return False
+
+    @staticmethod
+    def __write_snapshots(snapshots):
+        for filename, data in snapshots:
+            try:
+                with atomic_save(filename, "wb") as fileobj:
+                    fileobj.write(data)
+            except EnvironmentError:
+                print_w("Couldn't write playlist to path: %r" % filename)
+
+
 class FileBackedPlaylist(Playlist):
     """A `Playlist` that is stored as a file on disk"""
 
     quote = staticmethod(escape_filename)
     unquote = staticmethod(unescape_filename)
 
+    __writer = _PlaylistWriter()
+
+    @classmethod
+    def flush_writes(cls):
+        """Write all playlists with deferred changes, see write_later()"""
+
+        cls.__writer.flush()
+
     def __init__(self, dir, name, library=None, validate=False):
         assert isinstance(dir, fsnative)
         super(FileBackedPlaylist, self).__init__(name, library)
@@ -610,6 +1076,7 @@ class FileBackedPlaylist(Playlist):
 
     def delete(self):
         super(FileBackedPlaylist, self).delete()
+        self.__writer.discard(self)
         self.__delete_file(self.filename)
 
     @classmethod
@@ -619,14 +1086,26 @@ class FileBackedPlaylist(Playlist):
         except EnvironmentError:
             pass
 
+    def _snapshot(self):
+        """Returns (filename, content) for writing the current state"""
+
+        lines = []
+        for song in self._list:
+            if isinstance(song, string_types):
+                lines.append(fsn2bytes(song, "utf-8") + b"\n")
+            else:
+                lines.append(fsn2bytes(song("~filename"), "utf-8") + b"\n")
+        return self.filename, b"".join(lines)
+
     def write(self):
-        fn = self.filename
-        with open(fn, "wb") as f:
-            for song in self._list:
-                if isinstance(song, string_types):
-                    f.write(fsn2bytes(song, "utf-8") + b"\n")
-                else:
-                    f.write(fsn2bytes(song("~filename"), "utf-8") + b"\n")
+        # don't let an older background write overwrite this one
+        self.__writer.discard(self)
+        fn, data = self._snapshot()
+        with atomic_save(fn, "wb") as f:
+            f.write(data)
         if self._last_fn != fn:
             self.__delete_file(self._last_fn)
             self._last_fn = fn
+
+    def write_later(self):
+        self.__writer.mark_dirty(self)
@@ -5,5 +5,7 @@
 # (at your option) any later version.
 
 from .manager import CoverManager
+from .loader import CoverLoader
 
 CoverManager
+CoverLoader
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""Loading of covers for many albums in a pool of worker threads"""
+
+import heapq
+import itertools
+import threading
+from multiprocessing import cpu_count
+
+from gi.repository import GLib
+
+from quodlibet import util
+from quodlibet.util.thumbnails import get_thumbnail_from_file
+
+
+def _default_workers():
+    try:
+        cpus = cpu_count()
+    except NotImplementedError:
+        cpus = 2
+    return max(2, min(cpus, 4))
+
+
+class CoverLoader(object):
+    """Finds, loads and scales covers in worker threads.
+
+    Requests get processed in the order of their priority and the
+    results get passed to `callback` in the main loop, in batches of
+    (key, pixbuf) pairs. The pixbuf is None if there is no cover.
+
+    Only the file based built-in cover sources get used in the worker
+    threads, the sources of plugins get asked in the main loop if they
+    didn't find anything.
+    """
+
+    BATCH_DELAY = 30
+    """Time in ms the results get collected before passing them on"""
+
+    def __init__(self, manager, callback, workers=None):
+        self._manager = manager
+        self._callback = callback
+        self._workers = workers or _default_workers()
+        self._threads = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._seq = itertools.count()
+        # heap of (priority, seq, key), entries not in _pending are stale
+        self._queue = []
+        # key -> (seq, songs, width, height, sources)
+        self._pending = {}
+        # key -> seq of the request being loaded or waiting for delivery,
+        # results of other requests for the key are stale
+        self._loading = {}
+        self._results = []
+        self._source_id = None
+
+    def load(self, requests):
+        """Replace all pending requests with `requests`, a list of
+        (key, songs, width, height), the most important first.
+
+        Requests with a key which is currently loading get ignored.
+        """
+
+        sources = self._manager.split_sources()
+        with self._cond:
+            del self._queue[:]
+            self._pending.clear()
+            for priority, (key, songs, width, height) in enumerate(requests):
+                if key in self._loading or key in self._pending:
+                    continue
+                seq = next(self._seq)
+                self._pending[key] = (seq, songs, width, height, sources)
+                self._queue.append((priority, seq, key))
+            heapq.heapify(self._queue)
+            if self._queue:
+                self._start_workers()
+                self._cond.notify_all()
+
+    def request(self, key, songs, width, height, priority=0):
+        """Add a request or change the priority of a pending one.
+        Lower values get loaded first.
+        """
+
+        sources = self._manager.split_sources()
+        with self._cond:
+            if key in self._loading:
+                return
+            seq = next(self._seq)
+            self._pending[key] = (seq, songs, width, height, sources)
+            heapq.heappush(self._queue, (priority, seq, key))
+            self._start_workers()
+            self._cond.notify()
+
+    def is_loading(self, key):
+        """If the request for `key` is pending or loading"""
+
+        with self._cond:
+            return key in self._pending or key in self._loading
+
+    def invalidate(self, keys):
+        """Drop the results of the requests for `keys` currently loading,
+        e.g. because the cover changed. They can be requested again.
+        """
+
+        with self._cond:
+            for key in keys:
+                self._loading.pop(key, None)
+
+    def cancel(self):
+        """Drop all pending requests and all results not passed on yet"""
+
+        with self._cond:
+            del self._queue[:]
+            self._pending.clear()
+            self._loading.clear()
+            del self._results[:]
+            if self._source_id is not None:
+                GLib.source_remove(self._source_id)
+                self._source_id = None
+
+    def destroy(self):
+        """Cancel everything and stop the worker threads"""
+
+        self.cancel()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._threads = []
+
+    def _start_workers(self):
+        if self._stopped or len(self._threads) >= self._workers:
+            return
+        thread = threading.Thread(target=self._run, name="CoverLoader")
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _load(self, songs, width, height, sources):
+        if not sources:
+            return None
+        fileobj = self._manager.acquire_cover_sync_many(
+            songs, sources=sources)
+        if fileobj is None:
+            return None
+        return get_thumbnail_from_file(fileobj, (width, height))
+
+    def _load_logged(self, *args):
+        try:
+            return self._load(*args)
+        except Exception:
+            util.print_exc()
+
+    def _next(self):
+        """Returns the next request or None if stopped, must be called
+        with the lock held.
+        """
+
+        while not self._stopped:
+            while self._queue:
+                priority, seq, key = heapq.heappop(self._queue)
+                request = self._pending.get(key)
+                if request is None or request[0] != seq:
+                    continue
+                del self._pending[key]
+                self._loading[key] = seq
+                return (key,) + request
+            self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                request = self._next()
+            if request is None:
+                return
+            key, seq, songs, width, height, sources = request
+            thread_sources, main_sources = sources
+
+            pixbuf = self._load_logged(songs, width, height, thread_sources)
+            # the other sources have to be used in the main loop
+            retry = None
+            if pixbuf is None and main_sources:
+                retry = (songs, width, height, main_sources)
+
+            with self._cond:
+                if self._loading.get(key) != seq:
+                    continue
+                self._results.append((key, seq, pixbuf, retry))
+                if self._source_id is None:
+                    self._source_id = GLib.timeout_add(
+                        self.BATCH_DELAY, self._deliver)
+
+    def _deliver(self):
+        with self._cond:
+            results = []
+            for key, seq, pixbuf, retry in self._results:
+                if self._loading.get(key) == seq:
+                    del self._loading[key]
+                    results.append((key, pixbuf, retry))
+            self._results = []
+            self._source_id = None
+
+        results = [(key, self._load_logged(*retry) if retry else pixbuf)
+                   for key, pixbuf, retry in results]
+        if results:
+            self._callback(results)
+        return False
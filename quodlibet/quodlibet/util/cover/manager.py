@@ -82,6 +82,19 @@ class CoverManager(GObject.Object):
     def sources(self):
         return self.plugin_handler.sources
 
+    def split_sources(self):
+        """Returns a list of the cover sources which can be used from other
+        threads, the file based built-in ones as long as no other source
+        comes first, and a list of the remaining ones.
+        """
+
+        sources = list(self.sources)
+        built_in = self.plugin_handler.built_in
+        for i, source in enumerate(sources):
+            if source not in built_in:
+                return sources[:i], sources[i:]
+        return sources, []
+
     def cover_changed(self, songs):
         """Notify the world that the artwork for some songs or collections
         containing that songs might have changed (For example a new image was
@@ -147,11 +160,15 @@ class CoverManager(GObject.Object):
 
         return self.acquire_cover_sync_many([song], embedded, external)
 
-    def acquire_cover_sync_many(self, songs, embedded=True, external=True):
+    def acquire_cover_sync_many(self, songs, embedded=True, external=True,
+                                sources=None):
         """Same as acquire_cover_sync but returns a cover for multiple
-        images"""
+        images. Only `sources` get used if passed."""
+
+        if sources is None:
+            sources = self.sources
 
-        for plugin in self.sources:
+        for plugin in sources:
             if not embedded and plugin.embedded:
                 continue
             if not external and not plugin.embedded:
@@ -88,6 +88,17 @@ def set_scan_dirs(dirs):
     config.setbytes("settings", "scan", fsn2bytes(joined, "utf-8"))
 
 
+def get_scan_workers():
+    """Returns the number of threads which should read new files during a
+    scan, 0 for none
+
+    Returns:
+        int
+    """
+
+    return max(config.getint("library", "scan_workers", 0), 0)
+
+
 def get_exclude_dirs():
     """Returns a list of paths which should be ignored during scanning
 
@@ -110,7 +121,9 @@ def scan_library(library, force):
 
     paths = get_scan_dirs()
     exclude = get_exclude_dirs()
+    skip_unchanged = config.getboolean("library", "skip_unchanged_dirs")
     copool.add(library.rebuild, paths, force, exclude,
+               workers=get_scan_workers(), skip_unchanged=skip_unchanged,
                cofuncid="library", funcid="library")
 
 
@@ -14,7 +14,7 @@ from traceback import format_exception
 
 from quodlibet.util.path import mtime
 from quodlibet.util.importhelper import get_importables, load_module
-from quodlibet.util import print_d
+from quodlibet.util import print_d, startuptrace
 from quodlibet.compat import iteritems, listitems
 
 
@@ -62,12 +62,14 @@ class ModuleScanner(object):
     rescan() - Update the module list. Returns added/removed module names
     failures - A dict of Name: (Exception, Text) for all modules that failed
     modules - A dict of Name: Module for all successfully loaded modules
+    deferred - A set of names of modules the last rescan didn't import
 
     """
     def __init__(self, folders):
         self.__folders = folders
         self.__modules = {}  # name: module
         self.__failures = {}  # name: exception
+        self.__deferred = set()
 
     @property
     def failures(self):
@@ -81,11 +83,21 @@ class ModuleScanner(object):
 
         return self.__modules
 
-    def rescan(self):
+    @property
+    def deferred(self):
+        """A set of names of modules which weren't imported, see rescan()"""
+
+        return self.__deferred
+
+    def rescan(self, defer=None):
         """Rescan all folders for changed/new/removed modules.
 
         The caller should release all references to removed modules.
 
+        `defer` can be a function taking a module name and the paths of
+        its files, returning True if the module shouldn't get imported.
+        Such modules get imported by the next rescan not deferring them.
+
         Returns a tuple: (removed, added)
         """
 
@@ -121,12 +133,17 @@ class ModuleScanner(object):
                 removed.append(name)
 
         self.__failures.clear()
+        self.__deferred.clear()
 
         # add new ones
         for (name, (path, deps)) in iteritems(info):
             if name in self.__modules:
                 continue
 
+            if defer is not None and defer(name, deps):
+                self.__deferred.add(name)
+                continue
+
             try:
                 # add a real module, so that pickle works
                 # https://github.com/quodlibet/quodlibet/issues/1093
@@ -135,8 +152,9 @@ class ModuleScanner(object):
                     sys.modules[parent] = imp.new_module(parent)
                 vars(sys.modules["quodlibet"])["fake"] = sys.modules[parent]
 
-                mod = load_module(name, parent + ".plugins",
-                                  dirname(path), reload=True)
+                with startuptrace.phase(name, "plugin import"):
+                    mod = load_module(name, parent + ".plugins",
+                                      dirname(path), reload=True)
                 if mod is None:
                     continue
 
@@ -147,7 +165,8 @@ class ModuleScanner(object):
                 added.append(name)
                 self.__modules[name] = Module(name, mod, deps, path)
 
-        print_d("Rescanning done: %d added, %d removed, %d error(s)" %
-                (len(added), len(removed), len(self.__failures)))
+        print_d("Rescanning done: %d added, %d removed, %d error(s), "
+                "%d deferred" % (len(added), len(removed),
+                                 len(self.__failures), len(self.__deferred)))
 
         return removed, added
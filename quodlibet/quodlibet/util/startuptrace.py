@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+"""Records the wall and CPU time of the startup phases.
+
+Recording is started at the beginning of the startup and stopped once the
+main loop is idle. If an output file was given, by `--startup-trace` or
+the QUODLIBET_STARTUP_TRACE environment variable, the phases get written
+there in the Chrome trace format (open with chrome://tracing), with the
+CPU time of each phase in its args.
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+
+from quodlibet.util.dprint import print_d, print_w
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:
+    # Python 2, CPU time on Unix, wall time on Windows
+    _cpu_time = time.clock
+
+
+_recording = False
+_start = None
+_events = []
+_output = os.environ.get("QUODLIBET_STARTUP_TRACE") or None
+
+
+def set_output(filename):
+    """Set the file the trace gets written to, None disables writing"""
+
+    global _output
+
+    _output = filename
+
+
+def get_output():
+    return _output
+
+
+def start():
+    """Start recording, dropping everything recorded so far"""
+
+    global _recording, _start
+
+    del _events[:]
+    _start = time.time()
+    _recording = True
+
+
+def is_recording():
+    return _recording
+
+
+@contextlib.contextmanager
+def phase(name, category="startup"):
+    """Context manager recording the time spent in the block as one phase.
+
+    Does nothing if not recording.
+    """
+
+    if not _recording:
+        yield
+        return
+
+    wall = time.time()
+    cpu = _cpu_time()
+    try:
+        yield
+    finally:
+        if _recording:
+            _events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": int((wall - _start) * 1e6),
+                "dur": int((time.time() - wall) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.current_thread().ident,
+                "args": {"cpu_ms": round((_cpu_time() - cpu) * 1e3, 3)},
+            })
+
+
+def get_events():
+    """A list of the recorded phases as Chrome trace events, in the order
+    they finished.
+    """
+
+    return list(_events)
+
+
+def dump(filename):
+    """Write the recorded phases to filename.
+
+    Raises:
+        EnvironmentError
+    """
+
+    data = json.dumps({
+        "traceEvents": get_events(),
+        "displayTimeUnit": "ms",
+    }, indent=1, sort_keys=True)
+
+    with open(filename, "w") as h:
+        h.write(data)
+
+
+def finish():
+    """Stop recording and write the trace if an output file is set.
+
+    Returns False, so it can be used as an idle callback.
+    """
+
+    global _recording
+
+    if not _recording:
+        return False
+
+    _recording = False
+
+    total = (time.time() - _start) * 1e3
+    print_d("Startup took %.0f ms" % total)
+    if _output is not None:
+        try:
+            dump(_output)
+        except EnvironmentError:
+            print_w("Couldn't write startup trace to %r" % _output)
+        else:
+            print_d("Wrote startup trace to %r" % _output)
+    del _events[:]
+    return False
@@ -232,6 +232,23 @@ class TDisplayPatternMixin(TestCase):
                              "Name: Artist <b>2:34</b>")
 
 
+class Tinit_browser(TestCase):
+
+    def test_init_once(self):
+        calls = []
+
+        class LazyBrowser(Browser):
+            lazy_init = True
+
+            @classmethod
+            def init(klass, library):
+                calls.append(library)
+
+        browsers.init_browser(LazyBrowser, 1)
+        browsers.init_browser(LazyBrowser, 2)
+        self.assertEqual(calls, [1])
+
+
 browsers.init()
 # create a new test class for each browser
 for browser in browsers.browsers:
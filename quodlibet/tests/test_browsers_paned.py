@@ -16,7 +16,7 @@ from quodlibet.browsers.paned import PanedBrowser
 from quodlibet.browsers.paned.util import PaneConfig
 from quodlibet.browsers.paned.util import get_headers
 from quodlibet.browsers.paned.models import AllEntry, UnknownEntry, SongsEntry
-from quodlibet.browsers.paned.models import PaneModel
+from quodlibet.browsers.paned.models import PaneModel, PaneIndex
 from quodlibet.browsers.paned.prefs import PatternEditor, Preferences
 from quodlibet.browsers.paned.prefs import PreferencesButton
 from quodlibet.browsers.paned.pane import Pane
@@ -537,6 +537,73 @@ class TPaneModel(TestCase):
         self.assertTrue(m.matches([len(m) - 1], UNKNOWN_ARTIST))
 
 
+class TPaneIndex(TestCase):
+
+    def setUp(self):
+        self.library = SongLibrary()
+        self.library.add(SONGS)
+        self.index = PaneIndex(PaneConfig("artist"), self.library)
+
+    def tearDown(self):
+        self.library.destroy()
+
+    def _keys(self, songs):
+        entries, unknown = self.index.get_entries(songs)
+        return [e.key for e in entries], unknown
+
+    def test_all(self):
+        keys, unknown = self._keys(SONGS)
+        self.assertEqual(keys, ["boris", "mu", "piman"])
+        self.assertEqual(unknown, {SONGS[4]})
+
+    def test_subset(self):
+        self.assertEqual(self._keys(SONGS[2:4]), (["piman"], set()))
+        self.assertEqual(
+            self._keys(SONGS[:4]), (["boris", "mu", "piman"], set()))
+
+    def test_not_indexed(self):
+        keys, unknown = self._keys(SONGS[:2] + [UNKNOWN_ARTIST])
+        self.assertEqual(keys, ["boris", "mu"])
+        self.assertEqual(unknown, {UNKNOWN_ARTIST})
+
+    def test_add_remove(self):
+        self.index.get_entries([])
+        self.index.remove(SONGS[:1])
+        self.assertEqual(self._keys(SONGS)[0], ["boris", "mu", "piman"])
+        self.assertEqual(self.index.get_keys(SONGS[1]), [("mu", "mu")])
+        self.index.remove(SONGS[1:2])
+        self.index.add([UNKNOWN_ARTIST])
+        keys, unknown = self._keys(SONGS[2:] + [UNKNOWN_ARTIST])
+        self.assertEqual(keys, ["piman"])
+        self.assertEqual(unknown, {SONGS[4], UNKNOWN_ARTIST})
+
+    def test_remove_sort_text(self):
+        index = PaneIndex(PaneConfig("artist"))
+        sorted_song = AudioFile({
+            "artist": "a", "artistsort": "z", "~filename": fsnative(u"/a")})
+        songs = [
+            sorted_song,
+            AudioFile({"artist": "a", "~filename": fsnative(u"/b")}),
+            AudioFile({"artist": "b", "~filename": fsnative(u"/c")}),
+        ]
+        index.add(songs)
+        keys = [e.key for e in index.get_entries(songs)[0]]
+        self.assertEqual(keys, ["b", "a"])
+        # the sort text of the remaining songs gets used
+        index.remove([sorted_song])
+        keys = [e.key for e in index.get_entries(songs[1:])[0]]
+        self.assertEqual(keys, ["a", "b"])
+
+    def test_model_fill(self):
+        m = PaneModel(self.index.config, self.index)
+        m.fill(SONGS)
+        self.assertTrue(isinstance(m[0][0], AllEntry))
+        self.assertTrue(isinstance(m[-1][0], UnknownEntry))
+        self.assertEqual(len(m), 5)
+        m.fill(SONGS[:1])
+        self.assertEqual([e.key for e in m.itervalues()], ["boris"])
+
+
 class TPanedPreferences(TestCase):
 
     def setUp(self):
@@ -10,7 +10,7 @@ import sys
 
 from senf import fsnative
 
-from tests import TestCase, get_data_path
+from tests import TestCase, get_data_path, skip
 from .helper import capture_output
 
 from quodlibet import formats
@@ -225,3 +225,74 @@ class TPickle(TestCase):
             data = pickle_dumps([42], protocol)
             with self.assertRaises(SerializationError):
                 load_audio_files(data)
+
+
+class TInterning(TestCase):
+
+    def setUp(self):
+        formats.set_interning(True)
+
+    def tearDown(self):
+        formats.set_interning(False)
+
+    def _make_songs(self, count):
+        songs = []
+        for i in range(count):
+            song = AudioFile({
+                "~filename": fsnative(u"/music/%d.ogg" % i),
+                "~mountpoint": fsnative(u"/music"),
+                "artist": u"Artist %d" % (i % 50),
+                "album": u"Album %d" % (i % 500),
+                "genre": u"Genre %d" % (i % 10),
+                "title": u"Title %d" % i,
+                "~#bitrate": 192000 + (i % 3) * 64000,
+                "~#samplerate": 44100,
+                "~#added": 1500000000 + i,
+            })
+            songs.append(song)
+        return songs
+
+    def test_setitem(self):
+        a = AudioFile({"artist": u"".join([u"foo", u"bar"]),
+                       "title": u"".join([u"foo", u"bar"])})
+        b = AudioFile({"artist": u"".join([u"foo", u"bar"]),
+                       "title": u"".join([u"foo", u"bar"])})
+        assert a["artist"] is b["artist"]
+        assert a["title"] is not b["title"]
+        a["~#samplerate"] = 44100
+        b["~#samplerate"] = 44100.0
+        assert type(b["~#samplerate"]) is float
+
+    def test_load(self):
+        formats.set_interning(False)
+        data = dump_audio_files(self._make_songs(10))
+        formats.set_interning(True)
+        items = load_audio_files(data)
+        assert items[0]["~mountpoint"] is items[1]["~mountpoint"]
+        assert items[0]["~#samplerate"] is items[1]["~#samplerate"]
+        keys = [[k for k in i.keys() if k == "artist"][0] for i in items]
+        assert all(k is keys[0] for k in keys)
+        assert dict(items[0]) == dict(self._make_songs(1)[0])
+
+    def test_clear_shared_values(self):
+        a = AudioFile({"artist": u"".join([u"foo", u"bar"])})
+        formats.clear_shared_values()
+        b = AudioFile({"artist": u"".join([u"foo", u"bar"])})
+        c = AudioFile({"artist": u"".join([u"foo", u"bar"])})
+        assert a["artist"] is not b["artist"]
+        assert b["artist"] is c["artist"]
+
+    @skip("Enable for basic benchmarking of tag interning")
+    def test_memory(self):
+        import tracemalloc
+
+        data = dump_audio_files(self._make_songs(20000))
+        for enabled in [False, True]:
+            formats.set_interning(enabled)
+            tracemalloc.start()
+            items = load_audio_files(data)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print("interning=%s: %d bytes per song" % (
+                enabled, size // len(items)))
+            del items
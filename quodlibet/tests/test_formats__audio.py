@@ -15,6 +15,7 @@ from quodlibet import config
 from quodlibet.compat import PY2, text_type, long, listkeys, PY3
 from quodlibet.formats import AudioFile, types as format_types, AudioFileError
 from quodlibet.formats._audio import NUMERIC_ZERO_DEFAULT
+from quodlibet.formats._sortkeys import get_sort_func
 from quodlibet.formats import decode_value, MusicFile, FILESYSTEM_TAGS
 from quodlibet.util.tags import _TAGS as TAGS
 from quodlibet.util.path import normalize_path, mkdir, get_home_dir, unquote, \
@@ -913,6 +914,31 @@ class TAudioFile(TestCase):
         album_sort_2 = tuple(copy.album_key)
         self.failIfEqual(album_sort_1, album_sort_2)
 
+    def test_sort_cache_internal(self):
+        song = AudioFile(bar_1_1)
+        sort_key = song.sort_key
+        song["~#playcount"] = 42
+        self.assertTrue(song.sort_key is sort_key)
+        song["~filename"] = fsnative(u"/dir/other")
+        self.assertFalse(song.sort_key is sort_key)
+
+    def test_cached_sort_func(self):
+        song = AudioFile(bar_1_1)
+        func = get_sort_func("~artist~title", AudioFile.sort_by_func("title"))
+        key = func(song)
+        self.assertTrue(func(song) is key)
+        song["~#playcount"] = 42
+        self.assertTrue(func(song) is key)
+        song["title"] = u"other"
+        self.assertNotEqual(func(song), key)
+        playcount = get_sort_func(
+            "~#playcount", AudioFile.sort_by_func("~#playcount"))
+        self.assertEqual(playcount(song), 42)
+        song["~#playcount"] = 43
+        self.assertEqual(playcount(song), 43)
+        rating = AudioFile.sort_by_func("~#rating")
+        self.assertTrue(get_sort_func("~#rating", rating) is rating)
+
     def test_cache_attributes(self):
         x = AudioFile()
         x.multisong = not x.multisong
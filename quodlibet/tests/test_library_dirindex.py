@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import os
+import shutil
+
+from senf import fsnative
+
+from tests import TestCase, mkdtemp
+
+from quodlibet.library.dirindex import DirectoryIndex, dir_mtime, walk, \
+    stat_files
+from quodlibet.util.path import normalize_path
+
+
+class TDirectoryIndex(TestCase):
+
+    def setUp(self):
+        self.temp = mkdtemp()
+        self.filename = os.path.join(self.temp, "index")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_save_load(self):
+        index = DirectoryIndex(self.filename)
+        assert not index.dirty
+        index[fsnative(u"/foo")] = 42
+        assert index.dirty
+        index.save()
+        assert not index.dirty
+
+        index = DirectoryIndex(self.filename)
+        assert len(index) == 1
+        assert index[fsnative(u"/foo")] == 42
+        assert index.get(fsnative(u"/bar")) is None
+
+    def test_no_change(self):
+        index = DirectoryIndex()
+        index[fsnative(u"/foo")] = 42
+        index.dirty = False
+        index[fsnative(u"/foo")] = 42
+        assert not index.dirty
+        index.save()
+
+    def test_retain(self):
+        index = DirectoryIndex()
+        index[fsnative(u"/foo")] = 1
+        index[fsnative(u"/bar")] = 2
+        index.retain({fsnative(u"/bar")})
+        assert index.keys() == [fsnative(u"/bar")]
+
+    def test_broken(self):
+        with open(self.filename, "wb") as h:
+            h.write(b"nope")
+        assert not len(DirectoryIndex(self.filename))
+
+    def test_stat_files(self):
+        path = os.path.join(self.temp, "file")
+        with open(path, "wb") as h:
+            h.write(b"abc")
+        stats = stat_files(self.temp)
+        assert stats[normalize_path(path)] == \
+            (os.path.getmtime(path), 3)
+        self.assertRaises(OSError, stat_files, path)
+
+    def test_dir_mtime(self):
+        assert dir_mtime(self.temp) == os.path.getmtime(self.temp)
+        assert dir_mtime(os.path.join(self.temp, "nope")) is None
+
+    def test_walk(self):
+        child = os.path.join(self.temp, "child")
+        os.mkdir(child)
+        with open(os.path.join(child, "file"), "wb"):
+            pass
+        os.utime(child, (1000, 1000))
+        os.utime(self.temp, (1000, 1000))
+
+        index = DirectoryIndex()
+        assert list(walk(self.temp, index)) == \
+            list(os.walk(self.temp))
+        assert list(walk(self.temp, index)) == \
+            [(self.temp, ["child"], []), (child, [], [])]
+
+        # pruning works like with os.walk()
+        index = DirectoryIndex()
+        for path, dnames, fnames in walk(self.temp, index):
+            assert path == self.temp
+            del dnames[:]
+
+    def test_walk_recent(self):
+        index = DirectoryIndex()
+        assert list(walk(self.temp, index)) == [(self.temp, [], [])]
+        assert not len(index)
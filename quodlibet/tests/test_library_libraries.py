@@ -8,19 +8,24 @@ from gi.repository import Gtk
 
 import os
 import shutil
+import time
 from senf import fsnative
 
 from quodlibet.formats import AudioFileError
 from quodlibet import config
 from quodlibet.util import connect_obj, is_windows
-from quodlibet.formats import AudioFile
+from quodlibet.formats import AudioFile, set_interning
 from quodlibet.compat import text_type, iteritems, iterkeys, itervalues
 
-from tests import TestCase, get_data_path, mkstemp, mkdtemp, skipIf
+from tests import TestCase, get_data_path, mkstemp, mkdtemp, skipIf, skip
 from .helper import capture_output, get_temp_copy
 
 from quodlibet.library.libraries import Library, PicklingMixin, SongLibrary, \
-    FileLibrary, AlbumLibrary, SongFileLibrary, iter_paths
+    FileLibrary, AlbumLibrary, SongFileLibrary, iter_paths, \
+    JournalingSongFileLibrary, MappedSongFileLibrary
+from quodlibet.library.dirindex import DirectoryIndex
+from quodlibet.formats import _sortkeys
+from quodlibet.formats._sortkeys import get_sort_func
 
 
 class Fake(int):
@@ -313,6 +318,29 @@ class TPicklingMixin(TestCase):
         finally:
             os.unlink(filename)
 
+    def test_save_background(self):
+        fd, filename = mkstemp()
+        os.close(fd)
+        try:
+            self.library.filename = filename
+            self.library.dirty = True
+            songs = self.Frange(30)
+            self.library.add(songs)
+            self.library.save(background=True)
+            self.assertFalse(self.library.dirty)
+            # changes after the snapshot don't end up in the file
+            songs[0]["title"] = u"changed"
+            self.library.wait_for_save()
+            self.assertFalse(self.library.is_saving())
+
+            library = self.Library()
+            library.load(filename)
+            self.assertEqual(
+                sorted(library.keys()), sorted(self.library.keys()))
+            self.assertFalse("title" in library[songs[0].key])
+        finally:
+            os.unlink(filename)
+
 
 class TSongLibrary(TLibrary):
     Fake = FakeSong
@@ -356,6 +384,79 @@ class TSongLibrary(TLibrary):
         self.failIf(self.changed or self.added or self.removed)
 
 
+class TSongLibraryQuery(TestCase):
+
+    def setUp(self):
+        self.library = SongLibrary()
+        self.songs = [
+            AudioFile({"~filename": fsnative(u"/dir/%d" % i),
+                       "artist": u"foo" if i % 2 else u"bar",
+                       "title": text_type(i)})
+            for i in range(10)]
+        self.library.add(self.songs)
+
+    def tearDown(self):
+        self.library.destroy()
+
+    def query(self, text):
+        return sorted(self.library.query(text), key=lambda s: s.key)
+
+    def test_generation(self):
+        generation = self.library.generation
+        self.library.changed(self.songs[:1])
+        self.assertEqual(self.library.generation, generation + 1)
+        self.library.remove(self.songs[:1])
+        self.assertEqual(self.library.generation, generation + 2)
+
+    def test_cached(self):
+        result = self.library.query(u"artist=foo")
+        self.assertEqual(len(result), 5)
+        result.pop()
+        self.assertTrue(
+            self.library.query(u"artist=foo") is not result)
+        self.assertEqual(len(self.library.query(u"artist=foo")), 5)
+        self.assertEqual(len(self.library._query_cache), 1)
+
+    def test_update_changed(self):
+        self.library.query(u"artist=foo")
+        self.songs[0]["artist"] = u"foo"
+        self.songs[1]["artist"] = u"bar"
+        self.library.changed(self.songs[:2])
+        self.assertEqual(
+            self.query(u"artist=foo"),
+            sorted([s for s in self.songs if s("artist") == u"foo"],
+                   key=lambda s: s.key))
+
+    def test_update_added_removed(self):
+        self.library.query(u"artist=foo")
+        self.library.remove(self.songs[1:2])
+        new = AudioFile(
+            {"~filename": fsnative(u"/dir/new"), "artist": u"foo"})
+        self.library.add([new])
+        result = self.query(u"artist=foo")
+        self.assertTrue(new in result)
+        self.assertFalse(self.songs[1] in result)
+        self.assertEqual(len(result), 5)
+
+    def test_not_cacheable(self):
+        self.library.query(u"#(playcount < 1)")
+        self.library.query(u"~rating=foo")
+        self.assertFalse(self.library._query_cache)
+
+    def test_cache_size(self):
+        for i in range(self.library.QUERY_CACHE_SIZE + 5):
+            self.library.query(text_type(i))
+        self.assertEqual(
+            len(self.library._query_cache), self.library.QUERY_CACHE_SIZE)
+
+    def test_log_overflow(self):
+        self.library.query(u"artist=foo")
+        self.library._QUERY_LOG_SIZE = 3
+        self.library.changed(self.songs[:4])
+        self.assertFalse(self.library._query_cache)
+        self.assertEqual(len(self.library.query(u"artist=foo")), 5)
+
+
 class TFileLibrary(TLibrary):
     Fake = FakeSongFile
     Library = FileLibrary
@@ -515,6 +616,195 @@ class TSongFileLibrary(TSongLibrary):
         finally:
             config.quit()
 
+    def _scan(self, workers):
+        config.init()
+        temp = mkdtemp()
+        try:
+            for i in range(5):
+                shutil.copy(get_data_path('empty.flac'),
+                            os.path.join(temp, "%d.flac" % i))
+            with open(os.path.join(temp, "broken.flac"), "wb") as h:
+                h.write(b"nope")
+
+            with capture_output():
+                for x in self.library.scan([temp], workers=workers):
+                    pass
+            self.assertEqual(len(self.library), 5)
+            self.assertEqual(len(self.added), 5)
+            for song in self.library.values():
+                assert isinstance(song, AudioFile)
+                assert song("~#length") > 3
+
+            with capture_output():
+                for x in self.library.scan([temp], workers=workers):
+                    pass
+            self.assertEqual(len(self.added), 5)
+        finally:
+            shutil.rmtree(temp)
+            config.quit()
+
+    def test_scan(self):
+        self._scan(0)
+
+    def test_scan_workers(self):
+        self._scan(3)
+
+    def test_scan_workers_interning(self):
+        set_interning(True)
+        try:
+            self._scan(3)
+        finally:
+            set_interning(False)
+        songs = list(self.library.values())
+        assert all(s["~mountpoint"] is songs[0]["~mountpoint"]
+                   for s in songs)
+
+    def _rebuild(self, skip_unchanged, force=False):
+        with capture_output():
+            for x in self.library.rebuild(
+                    [], force=force, skip_unchanged=skip_unchanged):
+                pass
+
+    def test_rebuild(self):
+        config.init()
+        temp = mkdtemp()
+        try:
+            for i in range(3):
+                shutil.copy(get_data_path('empty.flac'),
+                            os.path.join(temp, "%d.flac" % i))
+            with capture_output():
+                for x in self.library.scan([temp]):
+                    pass
+            songs = sorted(self.library.values(), key=lambda s: s.key)
+            self.assertEqual(len(songs), 3)
+
+            self._rebuild(False)
+            self.assertFalse(self.changed)
+            self.assertFalse(self.removed)
+
+            os.utime(songs[0]["~filename"], (1, 1))
+            os.unlink(songs[1]["~filename"])
+            self._rebuild(False)
+            self.assertEqual(self.changed, [songs[0]])
+            self.assertEqual(self.removed, [songs[1]])
+            self.assertEqual(songs[0]("~#mtime"), 1)
+
+            self._rebuild(False, force=True)
+            self.assertEqual(len(self.changed), 3)
+        finally:
+            shutil.rmtree(temp)
+            config.quit()
+
+    def test_scan_skip_unchanged(self):
+        config.init()
+        temp = mkdtemp()
+        try:
+            shutil.copy(get_data_path('empty.flac'),
+                        os.path.join(temp, "0.flac"))
+            os.utime(temp, (1000, 1000))
+
+            def scan():
+                with capture_output():
+                    for x in self.library.scan(
+                            [temp], skip_unchanged=True):
+                        pass
+
+            scan()
+            self.assertEqual(len(self.added), 1)
+            # unchanged directory, removed songs don't come back
+            self.library.remove(self.library.values())
+            scan()
+            self.assertEqual(len(self.added), 1)
+
+            shutil.copy(get_data_path('empty.flac'),
+                        os.path.join(temp, "1.flac"))
+            scan()
+            self.assertEqual(len(self.added), 3)
+        finally:
+            shutil.rmtree(temp)
+            config.quit()
+
+    def test_rebuild_skip_unchanged(self):
+        config.init()
+        temp = mkdtemp()
+        try:
+            filename = os.path.join(temp, "0.flac")
+            shutil.copy(get_data_path('empty.flac'), filename)
+            with capture_output():
+                for x in self.library.scan([temp]):
+                    pass
+            os.utime(temp, (1000, 1000))
+            self._rebuild(True)
+
+            # changing a file doesn't change the directory mtime
+            os.utime(filename, (1, 1))
+            os.utime(temp, (1000, 1000))
+            self._rebuild(True)
+            self.assertFalse(self.changed)
+            self._rebuild(False)
+            self.assertEqual(len(self.changed), 1)
+        finally:
+            shutil.rmtree(temp)
+            config.quit()
+
+    def test_rebuild_skip_unchanged_recent(self):
+        config.init()
+        temp = mkdtemp()
+        try:
+            filename = os.path.join(temp, "0.flac")
+            shutil.copy(get_data_path('empty.flac'), filename)
+            with capture_output():
+                for x in self.library.scan([temp]):
+                    pass
+            self._rebuild(True)
+
+            # recently changed directories always get checked
+            dir_stat = os.stat(temp)
+            os.utime(filename, (1, 1))
+            os.utime(temp, (dir_stat.st_atime, dir_stat.st_mtime))
+            self._rebuild(True)
+            self.assertEqual(len(self.changed), 1)
+        finally:
+            shutil.rmtree(temp)
+            config.quit()
+
+    def _sort_keys(self, background):
+        fd, filename = mkstemp()
+        os.close(fd)
+        song = AudioFile(
+            {"~filename": fsnative(u"/dir/song"), "title": u"Foo"})
+        func = get_sort_func("title", AudioFile.sort_by_func("title"))
+        try:
+            self.library.filename = filename
+            self.library.add([song])
+            key = func(song)
+            self.library.save_sort_keys(background=background)
+            # changes after saving don't end up in the file
+            song.__dict__["_sort_keys"]["title"] = None
+            self.library.wait_for_save()
+
+            other = self.Library()
+            other.filename = filename
+            other.load_sort_keys()
+            # like loaded from the library file
+            copy = dict.__new__(AudioFile)
+            dict.update(copy, song)
+            dict.__setitem__(copy, "title", u"Not used")
+            self.assertEqual(func(copy), key)
+            copy["title"] = u"Bar"
+            self.assertNotEqual(func(copy), key)
+            other.destroy()
+        finally:
+            _sortkeys._stored.clear()
+            os.unlink(filename)
+            os.unlink(filename + ".sortkeys")
+
+    def test_sort_keys(self):
+        self._sort_keys(False)
+
+    def test_sort_keys_background(self):
+        self._sort_keys(True)
+
     def test_contains_filename(self):
         filename = self.__get_file()
         try:
@@ -546,6 +836,236 @@ class TSongFileLibrary(TSongLibrary):
         config.quit()
 
 
+class TJournalingSongFileLibrary(TSongFileLibrary):
+    Library = JournalingSongFileLibrary
+
+
+class TJournalingMixin(TestCase):
+
+    def setUp(self):
+        self.temp = mkdtemp()
+        self.filename = os.path.join(self.temp, "songs")
+        self.library = self._load()
+
+    def tearDown(self):
+        self.library.wait_for_save()
+        self.library.destroy()
+        shutil.rmtree(self.temp)
+
+    def _load(self, Kind=JournalingSongFileLibrary):
+        library = Kind()
+        library.load(self.filename)
+        return library
+
+    def _reload(self):
+        self.library.wait_for_save()
+        return sorted(self._load().keys())
+
+    def _songs(self, *args):
+        songs = []
+        for i in range(*args):
+            song = AudioFile()
+            song["~filename"] = os.path.join(self.temp, "%d.mp3" % i)
+            song["~mountpoint"] = fsnative(u"/")
+            songs.append(song)
+        return songs
+
+    def test_save_load(self):
+        songs = self._songs(10)
+        self.library.add(songs)
+        self.library.save()
+        assert os.path.exists(self.filename + ".journal")
+        assert not os.path.exists(self.filename)
+        assert self._reload() == sorted(s.key for s in songs)
+
+    def test_change(self):
+        songs = self._songs(10)
+        self.library.add(songs)
+        self.library.save()
+        size = os.path.getsize(self.filename + ".journal")
+
+        songs[0]["title"] = u"foo"
+        self.library.changed([songs[0]])
+        self.library.save()
+        assert os.path.getsize(self.filename + ".journal") < size * 2
+
+        library = self._load()
+        assert library[songs[0].key]("title") == u"foo"
+        assert len(library) == 10
+
+    def test_remove(self):
+        songs = self._songs(10)
+        self.library.add(songs)
+        self.library.save()
+        self.library.remove(songs[:3])
+        self.library.save()
+        assert self._reload() == sorted(s.key for s in songs[3:])
+
+    def test_rename(self):
+        song = self._songs(1)[0]
+        self.library.add([song])
+        self.library.save()
+        old_key = song.key
+        del self.library._contents[old_key]
+        song["~filename"] = os.path.join(self.temp, "new.mp3")
+        self.library._contents[song.key] = song
+        self.library.changed([song])
+        self.library.save()
+        assert self._reload() == [song.key]
+
+    def test_masked(self):
+        songs = self._songs(2)
+        self.library.add(songs)
+        self.library.save()
+        self.library.mask(fsnative(u"/"))
+        self.library.save()
+        library = self._load(SongFileLibrary)
+        assert len(library) == 2
+        self.library.remove_masked(fsnative(u"/"))
+        self.library.save()
+        library = self._load(SongFileLibrary)
+        assert len(library) == 0
+
+    def test_compact(self):
+        self.library.COMPACT_MIN_SIZE = 0
+        songs = self._songs(10)
+        self.library.add(songs)
+        self.library.save()
+        self.library.wait_for_save()
+        assert os.path.exists(self.filename)
+        assert not os.path.exists(self.filename + ".journal")
+        assert not os.path.exists(self.filename + ".journal.old")
+        self.library.remove(songs[:5])
+        self.library.save()
+        assert self._reload() == sorted(s.key for s in songs[5:])
+
+    def test_broken_journal(self):
+        songs = self._songs(10)
+        self.library.add(songs)
+        self.library.save()
+        with open(self.filename + ".journal", "ab") as h:
+            h.write(b"garbage")
+        with capture_output():
+            library = self._load()
+        assert len(library) == 10
+        library.save()
+        library.wait_for_save()
+        assert os.path.exists(self.filename)
+        assert not os.path.exists(self.filename + ".journal")
+
+    def test_pickling_library_reads_journal(self):
+        songs = self._songs(10)
+        self.library.add(songs)
+        self.library.save()
+        library = self._load(SongFileLibrary)
+        assert len(library) == 10
+        library.dirty = True
+        library.save()
+        assert not os.path.exists(self.filename + ".journal")
+        assert self._reload() == sorted(s.key for s in songs)
+
+
+class TMappedSongFileLibrary(TSongFileLibrary):
+    Library = MappedSongFileLibrary
+
+
+class TMappingMixin(TestCase):
+
+    def setUp(self):
+        self.temp = mkdtemp()
+        self.filename = os.path.join(self.temp, "songs")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def _load(self, Kind=MappedSongFileLibrary):
+        library = Kind()
+        library.load(self.filename)
+        return library
+
+    def _songs(self, *args):
+        songs = []
+        for i in range(*args):
+            song = AudioFile()
+            song["~filename"] = os.path.join(self.temp, "%d.mp3" % i)
+            song["~mountpoint"] = fsnative(u"/")
+            song["title"] = u"Title %d" % i
+            song["~#playcount"] = i
+            songs.append(song)
+        return songs
+
+    def _save(self, songs):
+        library = MappedSongFileLibrary()
+        library.add(songs)
+        library.save(self.filename)
+
+    def test_save_load(self):
+        songs = self._songs(10)
+        self._save(songs)
+        library = self._load()
+        assert len(library) == 10
+        assert sorted(library.keys()) == sorted(s.key for s in songs)
+        assert not list(library._contents.iter_loaded())
+        for song in songs:
+            assert dict(library[song.key]) == dict(song)
+
+    def test_contains_filename(self):
+        songs = self._songs(3)
+        self._save(songs)
+        library = self._load()
+        assert library.contains_filename(songs[0].key)
+        assert songs[0].key in library
+        assert not library.contains_filename(
+            os.path.join(self.temp, "nope.mp3"))
+        assert not list(library._contents.iter_loaded())
+
+    def test_save_lazy(self):
+        songs = self._songs(10)
+        self._save(songs)
+        library = self._load()
+        song = library[songs[0].key]
+        song["title"] = u"foo"
+        library.remove([library[songs[1].key]])
+        library.add(self._songs(10, 11))
+        library.save()
+        assert len(list(library._contents.iter_mapped())) == 8
+        assert library[songs[2].key]["title"] == u"Title 2"
+
+        library = self._load()
+        assert len(library) == 10
+        assert library[songs[0].key]["title"] == u"foo"
+        assert songs[1].key not in library
+
+    def test_convert_pickle(self):
+        songs = self._songs(5)
+        library = SongFileLibrary()
+        library.add(songs)
+        library.save(self.filename)
+        library = self._load()
+        assert len(library) == 5
+        assert library.dirty
+        library.save()
+        library = self._load()
+        assert len(library) == 5
+        assert not list(library._contents.iter_loaded())
+
+        # and back
+        library = self._load(SongFileLibrary)
+        assert sorted(library.keys()) == sorted(s.key for s in songs)
+
+    def test_masked(self):
+        songs = self._songs(2)
+        songs[1]["~mountpoint"] = fsnative(u"/nope_not_mounted")
+        self._save(songs)
+        library = self._load()
+        assert len(library) == 1
+        assert library.masked(library.get_masked(fsnative(
+            u"/nope_not_mounted"))[0])
+        library.save()
+        library = self._load()
+        assert len(library.get_content()) == 2
+
+
 class TAlbumLibrary(TestCase):
     Fake = FakeSong
     Frange = staticmethod(ASrange)
@@ -684,6 +1204,45 @@ class TAlbumLibrarySignals(TestCase):
         self.failUnlessEqual(self.received,
             ["added", "a_added", "changed", "a_changed"])
 
+    def test_change_album_key(self):
+        songs = [AlbumSong(1, "a1"), AlbumSong(2, "a1"), AlbumSong(4, "a2")]
+        self.lib.add(songs)
+        old_keys = [s.album_key for s in songs]
+        for song in songs[1:]:
+            song["album"] = song["labelid"] = "a3"
+        self.lib.changed(songs)
+        self.failUnlessEqual(self.received,
+            ["added", "a_added", "changed", "a_removed", "a_changed",
+             "a_added"])
+        self.failIf(old_keys[2] in self.albums)
+        self.failUnlessEqual(self.albums[old_keys[0]].songs, {songs[0]})
+        self.failUnlessEqual(
+            self.albums[songs[1].album_key].songs, set(songs[1:]))
+
+    def test_change_updates_values(self):
+        songs = [AlbumSong(1, "a1"), AlbumSong(2, "a1")]
+        songs[0]["~#playcount"] = 2
+        self.lib.add(songs)
+        album = self.albums[songs[0].album_key]
+        self.failUnlessEqual(album("~#playcount"), 2)
+        songs[1]["~#playcount"] = 3
+        self.lib.changed(songs[1:])
+        self.failUnlessEqual(album("~#playcount"), 5)
+        self.lib.remove(songs[:1])
+        self.failUnlessEqual(album("~#playcount"), 3)
+
+    @skip("Enable for basic benchmarking of AlbumLibrary")
+    def test_change_album_key_performance(self):
+        songs = [AlbumSong(i, "a%d" % (i // 2)) for i in range(40000)]
+        self.lib.add(songs)
+        changed = songs[::4]
+        for song in changed:
+            song["album"] = song["labelid"] = song["album"] + "x"
+        t = time.time()
+        self.lib.changed(changed)
+        print("Moving %d songs between %d albums took %.3f s" % (
+            len(changed), len(self.albums), time.time() - t))
+
     def tearDown(self):
         for s in self._asigs:
             self.albums.disconnect(s)
@@ -758,3 +1317,34 @@ class Titer_paths(TestCase):
         os.close(fd)
 
         assert list(iter_paths(self.root)) == []
+
+    def _age(self, path):
+        # make directory changes older than the mtime grace period
+        os.utime(path, (1000, 1000))
+
+    def test_dir_index(self):
+        child = mkdtemp(dir=self.root)
+        fd, name = mkstemp(dir=child)
+        os.close(fd)
+        self._age(child)
+        self._age(self.root)
+
+        index = DirectoryIndex()
+        assert list(iter_paths(self.root, dir_index=index)) == [name]
+        assert len(index) == 2
+        assert list(iter_paths(self.root, dir_index=index)) == []
+
+        fd, other = mkstemp(dir=child)
+        os.close(fd)
+        assert sorted(iter_paths(self.root, dir_index=index)) == \
+            sorted([name, other])
+
+    def test_dir_index_exclude(self):
+        fd, name = mkstemp(dir=self.root)
+        os.close(fd)
+        self._age(self.root)
+
+        index = DirectoryIndex()
+        assert list(iter_paths(
+            self.root, exclude=[name], dir_index=index)) == []
+        assert list(iter_paths(self.root, dir_index=index)) == [name]
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import os
+
+from senf import fsnative
+
+from tests import TestCase, mkstemp
+
+from quodlibet.formats import AudioFile
+from quodlibet.compat import PY3
+from quodlibet.library.mapped import MappedSongs, MappedWriter, \
+    MappedFormatError, LazyContents, load_mapped_audio_files
+from quodlibet.compat import cBytesIO
+
+
+class OtherFile(AudioFile):
+    pass
+
+
+def dump(songs):
+    writer = MappedWriter()
+    for song in songs:
+        writer.add(song)
+    fileobj = cBytesIO()
+    writer.write(fileobj)
+    return fileobj.getvalue()
+
+
+def make_song(i):
+    song = AudioFile()
+    song["~filename"] = fsnative(u"/dir/%d.mp3" % i)
+    song["~mountpoint"] = fsnative(u"/")
+    song["title"] = u"Title %d" % i
+    song["artist"] = u"Artist"
+    song["~#track"] = i
+    song["~#rating"] = 0.25
+    return song
+
+
+class TMappedSongs(TestCase):
+
+    def test_roundtrip(self):
+        songs = [make_song(i) for i in range(10)]
+        loaded = load_mapped_audio_files(dump(songs))
+        assert len(loaded) == 10
+        for a, b in zip(songs, loaded):
+            assert type(a) is type(b)
+            assert dict(a) == dict(b)
+            for key in a:
+                assert type(a[key]) is type(b[key])
+
+    def test_values(self):
+        song = make_song(0)
+        song["~#big"] = 2 ** 70
+        song["~#neg"] = -3
+        song["~#float"] = 1e100
+        song[u"öäü"] = u"☃\n☄"
+        song["empty"] = u""
+        if os.name != "nt" and PY3:
+            song["~filename"] = fsnative(u"/dir/\udcff.mp3")
+        new = load_mapped_audio_files(dump([song]))[0]
+        assert dict(new) == dict(song)
+
+    def test_empty(self):
+        assert load_mapped_audio_files(dump([])) == []
+
+    def test_invalid(self):
+        self.assertRaises(MappedFormatError, MappedSongs, b"")
+        self.assertRaises(MappedFormatError, MappedSongs, b"nope")
+        data = dump([make_song(0)])
+        self.assertRaises(MappedFormatError, MappedSongs, data[:-1])
+        self.assertRaises(MappedFormatError, MappedSongs, data[:10])
+
+    def test_keys(self):
+        songs = [make_song(i) for i in range(3)]
+        mapped = MappedSongs(dump(songs))
+        assert len(mapped) == 3
+        assert mapped.keys() == [
+            (i, s.key, s("~mountpoint")) for i, s in enumerate(songs)]
+
+    def test_unknown_class(self):
+        songs = [make_song(0), OtherFile(make_song(1))]
+        data = dump(songs).replace(b"OtherFile", b"OtherFoo_")
+        mapped = MappedSongs(data)
+        assert [e[0] for e in mapped.keys()] == [0]
+
+    def test_shared_strings(self):
+        mapped = MappedSongs(dump([make_song(0), make_song(1)]))
+        a, b = mapped.load(0), mapped.load(1)
+        assert a["artist"] is b["artist"]
+
+    def test_add_mapped(self):
+        songs = [make_song(i) for i in range(3)] + [OtherFile(make_song(3))]
+        mapped = MappedSongs(dump(songs))
+        writer = MappedWriter()
+        writer.add(make_song(4))
+        for i in range(len(mapped)):
+            writer.add_mapped(mapped, i)
+        fileobj = cBytesIO()
+        writer.write(fileobj)
+        loaded = load_mapped_audio_files(fileobj.getvalue())
+        assert [s.key for s in loaded] == \
+            [make_song(4).key] + [s.key for s in songs]
+        assert type(loaded[-1]) is OtherFile
+        for a, b in zip(songs, loaded[1:]):
+            assert dict(a) == dict(b)
+
+    def test_open(self):
+        fd, filename = mkstemp()
+        try:
+            os.write(fd, dump([make_song(0)]))
+            os.close(fd)
+            mapped = MappedSongs.open(filename)
+            assert dict(mapped.load(0)) == dict(make_song(0))
+            mapped.close()
+        finally:
+            os.unlink(filename)
+
+
+class TLazyContents(TestCase):
+
+    def setUp(self):
+        self.songs = [make_song(i) for i in range(5)]
+        mapped = MappedSongs(dump(self.songs))
+        self.contents = LazyContents(
+            mapped, {key: index for index, key, mount in mapped.keys()})
+
+    def test_no_decode(self):
+        contents = self.contents
+        assert len(contents) == 5
+        assert self.songs[0].key in contents
+        assert sorted(contents.keys()) == sorted(s.key for s in self.songs)
+        assert not list(contents.iter_loaded())
+
+    def test_getitem(self):
+        key = self.songs[0].key
+        song = self.contents[key]
+        assert dict(song) == dict(self.songs[0])
+        assert self.contents[key] is song
+        assert self.contents.get(key) is song
+        assert list(self.contents.iter_loaded()) == [song]
+        assert len(list(self.contents.iter_mapped())) == 4
+        self.assertRaises(KeyError, self.contents.__getitem__, "nope")
+        assert self.contents.get("nope") is None
+
+    def test_set_del(self):
+        key = self.songs[0].key
+        other = make_song(0)
+        self.contents[key] = other
+        assert self.contents[key] is other
+        assert len(self.contents) == 5
+        del self.contents[key]
+        del self.contents[self.songs[1].key]
+        assert len(self.contents) == 3
+        assert self.contents.pop(self.songs[2].key).key == self.songs[2].key
+        assert self.contents.pop("nope", None) is None
+        self.assertRaises(KeyError, self.contents.__delitem__, "nope")
+
+    def test_values(self):
+        values = list(self.contents.values())
+        assert sorted(s.key for s in values) == \
+            sorted(s.key for s in self.songs)
+        assert not list(self.contents.iter_mapped())
+        assert sorted(k for k, v in self.contents.items()) == \
+            sorted(self.contents.keys())
+
+    def test_update_clear(self):
+        song = make_song(10)
+        self.contents.update({song.key: song})
+        assert len(self.contents) == 6
+        self.contents.clear()
+        assert len(self.contents) == 0
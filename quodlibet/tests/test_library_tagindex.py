@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import time
+
+from senf import fsnative
+
+from tests import TestCase
+
+from quodlibet import config
+from quodlibet.formats import AudioFile
+from quodlibet.library import SongLibrary
+from quodlibet.library.tagindex import TagIndex, fold_text
+from quodlibet.query import Query
+
+
+def make_songs():
+    values = [
+        (u"The Beatles", u"Abbey Road", u"Come Together"),
+        (u"Beatallica", u"Sgt. Hetfield's", u"Blackened"),
+        (u"Björk", u"Homogenic", u"Jóga"),
+        (u"Sigur Rós", u"Ágætis byrjun", u"Starálfur"),
+        (u"ＡＢＢＡ", u"Arrival", u"Dancing Queen"),
+        (u"Mötley Crüe", u"Dr. Feelgood", u"Kickstart My Heart"),
+        (u"Die Ärzte", u"Straße", u"Schrei nach Liebe"),
+        (u"坂本龍一", u"async", u"andata"),
+        (u"The ﬁnal Cut", u"", u"Ǆemal"),
+        (u"Kelvin K", u"İstanbul", u"ſong"),
+    ]
+    now = time.time()
+    songs = []
+    for i, (artist, album, title) in enumerate(values):
+        song = AudioFile({
+            "artist": artist, "album": album, "title": title,
+            "~filename": fsnative(u"/dir/%d.ogg" % i),
+            "~#playcount": i % 4, "~#length": i * 33.3,
+            "~#added": now - i * 24 * 60 * 60})
+        if i % 3:
+            song["~#rating"] = i / 10.0
+        if i % 2:
+            song["~#lastplayed"] = now - i * 60 * 60
+        songs.append(song)
+    return songs
+
+
+QUERIES = [
+    u"beat", u"beatles", u"the", u"bjork", u"Björk", u"joga", u"ros",
+    u"agaetis", u"abba", u"motley crue", u"arzte", u"strasse", u"strase",
+    u"async", u"final", u"fin", u"dzemal", u"kelvin k", u"istanbul",
+    u"song", u"artist=beat", u"title=/^Come/", u"album=/road$/",
+    u"&(artist=the, title=cut)", u"|(artist=abba, title=andata)",
+    u"!beat", u"artist=!beat", u"album='Abbey Road'", u"title=/(?i)queen/",
+    u"|(artist=/beat(les|allica)/, album=homo)", u"~filename=dir",
+    u"title=/blac?kened/", u"#(length > 3)", u"artist=/x|abba/",
+    u"&(beat, /abbey/c)", u"&(beat, /Abbey/c)",
+    u"#(playcount > 1)", u"#(playcount = 2)", u"#(playcount != 2)",
+    u"#(2 <= playcount)", u"#(0 < playcount < 3)", u"#(rating >= 0.5)",
+    u"#(rating < 0.5)", u"#(length > 1:40)", u"#(length <= 99.9)",
+    u"#(added < 3 days)", u"#(added > 1 week)", u"#(lastplayed < 4 hours)",
+    u"#(lastplayed > 2 hours)", u"#(playcount > skipcount)",
+    u"#(playcount * 2 > 3)", u"#(track > 1)", u"#(date > 2000)",
+    u"&(beat, #(playcount < 2))", u"|(beat, #(playcount = 3))",
+]
+
+
+class TTagIndex(TestCase):
+
+    def setUp(self):
+        config.init()
+        self.library = SongLibrary()
+        self.library.add(make_songs())
+        self.index = TagIndex(self.library)
+
+    def tearDown(self):
+        self.index.destroy()
+        self.library.destroy()
+        config.quit()
+
+    def test_fold_text(self):
+        assert fold_text(u"Björk") == u"bjork"
+        assert fold_text(u"ﬁne") == u"fine"
+        assert fold_text(u"ＡＢＢＡ") == u"abba"
+        assert fold_text(u"Straße") is None
+        assert fold_text(u"坂本") is None
+
+    def test_candidates_include_matches(self):
+        songs = list(self.library.values())
+        for text in QUERIES:
+            query = Query(text)
+            candidates = query.candidates(self.index)
+            matches = query.filter(songs)
+            if candidates is not None:
+                assert set(matches) <= candidates, text
+
+    def test_narrows(self):
+        candidates = Query(u"beatles").candidates(self.index)
+        assert len(candidates) < len(self.library)
+        assert Query(u"!beatles").candidates(self.index) is None
+        assert Query(u"be").candidates(self.index) is None
+        assert Query(u"artist=/^/").candidates(self.index) is None
+
+    def test_lazy_tags(self):
+        assert not self.index.tags
+        Query(u"beatles").candidates(self.index)
+        assert sorted(self.index.tags) == sorted(Query.STAR)
+
+    def test_signals(self):
+        Query(u"beatles").candidates(self.index)
+
+        song = AudioFile({"artist": u"Nirvana",
+                          "~filename": fsnative(u"/dir/new.ogg")})
+        self.library.add([song])
+        assert song in Query(u"nirvana").candidates(self.index)
+
+        song["artist"] = u"Foo Fighters"
+        self.library.changed([song])
+        assert song not in Query(u"nirvana").candidates(self.index)
+        assert song in Query(u"fighters").candidates(self.index)
+
+        self.library.remove([song])
+        assert song not in Query(u"fighters").candidates(self.index)
+
+    def test_numeric_narrows(self):
+        assert len(Query(u"#(playcount = 2)").candidates(self.index)) == 2
+        assert len(Query(u"#(4 < playcount)").candidates(self.index)) == 0
+        assert Query(u"#(playcount != 2)").candidates(self.index) is None
+        assert len(Query(u"#(added < 2.5 days)").candidates(self.index)) == 3
+
+    def test_numeric_signals(self):
+        Query(u"#(playcount = 2)").candidates(self.index)
+        song = list(self.library.values())[0]
+        song["~#playcount"] = 100
+        self.library.changed([song])
+        assert Query(u"#(playcount > 99)").candidates(self.index) == {song}
+        self.library.remove([song])
+        assert not Query(u"#(playcount > 99)").candidates(self.index)
+
+    def test_search_range(self):
+        found = self.index.search_range("~#playcount", 1, 2)
+        assert {s("~#playcount") for s in found} == {1, 2}
+        assert len(self.index.search_range("~#playcount")) == 10
+        # default ratings are always included
+        assert len(self.index.search_range("~#rating", 5, None)) == 4
+
+    def test_library_query(self):
+        self.library.enable_tag_index()
+        for text in QUERIES:
+            self.assertEqual(
+                self.library.query(text),
+                Query(text).filter(self.library.values()), msg=text)
+        self.assertEqual(
+            self.library.query(Query(u"beatles")),
+            self.library.query(u"beatles"))
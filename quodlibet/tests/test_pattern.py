@@ -233,6 +233,39 @@ class TPattern(_TPattern):
         s.assertEquals(pat.format(song),
             b"5. \xe3\x81\x99\xe3\x81\xbf\xe3\x82\x8c".decode('utf-8'))
 
+    def test_format_many(s):
+        pat = Pattern('<tracknumber>. <title>')
+        songs = [s.a, s.b, s.c]
+        s.assertEqual(
+            pat.format_many(songs), [pat.format(song) for song in songs])
+        s.assertEqual(pat.format_many(songs, memo=True),
+                      pat.format_many(songs))
+        s.assertEqual(pat.format_many([]), [])
+
+    def test_memo(s):
+        pat = Pattern('<artist> - <title>')
+        s.assertEqual(pat.format(s.a, memo=True), "Artist - Title5")
+        s.assertEqual(pat.format(s.a, memo=True), "Artist - Title5")
+        s.a["title"] = u"Other"
+        s.assertEqual(pat.format(s.a, memo=True), "Artist - Other")
+        s.assertEqual(pat.format_many([s.a], memo=True), ["Artist - Other"])
+        del s.a["artist"]
+        s.assertEqual(pat.format_many([s.a], memo=True), [" - Other"])
+
+    def test_memo_not_song_only(s):
+        pat = Pattern('<~#rating>')
+        s.assertEqual(pat.format(s.a, memo=True), "0.50")
+        s.a["~#rating"] = 1.0
+        s.assertEqual(pat.format(s.a, memo=True), "1.00")
+        s.assertFalse(s.a.__dict__.get("_pattern_memo"))
+
+    def test_memo_time_condition(s):
+        pat = Pattern(r'<#(lastplayed \> today)|recent|old>')
+        s.assertFalse(pat._memo_key)
+        pat = Pattern(r'<#(lastplayed \> 2)|recent|old>')
+        s.assertFalse(pat._memo_key)
+        s.assertTrue(Pattern('<genre=Rock|rock|other>')._memo_key)
+
 
 class _TFileFromPattern(_TPattern):
     def _create(self, string):
@@ -4,14 +4,15 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
-from tests import TestCase, mkstemp
+from tests import TestCase, mkstemp, mkdtemp
 
 import os
+import shutil
 
 from quodlibet import config
 from quodlibet.formats import AudioFile
 from quodlibet.util.songwrapper import SongWrapper, ListWrapper
-from quodlibet.plugins import PluginConfig
+from quodlibet.plugins import PluginConfig, PluginManager, PluginHandler
 
 
 class TSongWrapper(TestCase):
@@ -163,3 +164,81 @@ class TPluginConfig(TestCase):
         c = PluginConfig("some")
         c.defaults.set("hm", "mh")
         self.assertEqual(c.get("hm"), "mh")
+
+
+class AnyPluginHandler(PluginHandler):
+
+    def plugin_handle(self, plugin):
+        return True
+
+    def plugin_enable(self, plugin):
+        pass
+
+    def plugin_disable(self, plugin):
+        pass
+
+
+class TPluginManagerCache(TestCase):
+
+    def setUp(self):
+        config.init()
+        self.tempdir = mkdtemp()
+        self.folder = os.path.join(self.tempdir, "plugins")
+        os.mkdir(self.folder)
+        self.cache = os.path.join(self.tempdir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        config.quit()
+
+    def create_plugin(self, name):
+        with open(os.path.join(self.folder, name + ".py"), "w") as h:
+            h.write("class %s(object):\n" % name)
+            h.write("    PLUGIN_ID = %r\n" % name)
+
+    def get_manager(self):
+        pm = PluginManager([self.folder], self.cache)
+        pm.register_handler(AnyPluginHandler())
+        pm.rescan()
+        return pm
+
+    def get_ids(self, pm):
+        return sorted(p.id for p in pm.plugins)
+
+    def test_defer_disabled(self):
+        self.create_plugin("Foo")
+        self.create_plugin("Bar")
+        pm = self.get_manager()
+        self.assertEqual(self.get_ids(pm), ["Bar", "Foo"])
+        bar = [p for p in pm.plugins if p.id == "Bar"][0]
+        pm.enable(bar, True)
+        pm.save()
+        pm.quit()
+
+        pm = self.get_manager()
+        self.assertEqual(self.get_ids(pm), ["Bar"])
+        self.assertTrue(pm.enabled(pm.plugins[0]))
+        pm.load_deferred()
+        self.assertEqual(self.get_ids(pm), ["Bar", "Foo"])
+        pm.quit()
+
+    def test_changed_module(self):
+        self.create_plugin("Foo")
+        self.get_manager().quit()
+        # different deps, so it has to be imported again
+        os.unlink(os.path.join(self.folder, "Foo.py"))
+        os.mkdir(os.path.join(self.folder, "Foo"))
+        with open(os.path.join(self.folder, "Foo", "__init__.py"), "w") as h:
+            h.write("class Foo(object):\n    PLUGIN_ID = 'Foo'\n")
+        pm = self.get_manager()
+        self.assertEqual(self.get_ids(pm), ["Foo"])
+        pm.quit()
+
+    def test_no_cache(self):
+        self.create_plugin("Foo")
+        pm = PluginManager([self.folder])
+        pm.register_handler(AnyPluginHandler())
+        pm.rescan()
+        self.assertEqual(self.get_ids(pm), ["Foo"])
+        self.assertFalse(os.path.exists(self.cache))
+        pm.quit()
@@ -12,6 +12,7 @@ from gi.repository import Gtk
 
 from quodlibet.qltk.models import ObjectStore, ObjectModelFilter
 from quodlibet.qltk.models import ObjectModelSort, ObjectTreeStore
+from quodlibet.qltk.models import ObjectListModel
 from quodlibet.compat import cmp, xrange
 
 
@@ -231,6 +232,136 @@ class TObjectStore(TestCase, _TObjectStoreMixin):
         self.assertEqual(result, cmp("alice", "bob"))
 
 
+class TObjectListModel(TestCase, _TObjectStoreMixin):
+
+    Store = ObjectListModel
+
+    def test_validate(self):
+        self.failUnlessRaises(ValueError, ObjectListModel, int)
+        ObjectListModel()
+        ObjectListModel(object)
+        self.failUnlessRaises(ValueError, ObjectListModel, object, object)
+
+    def test_get_iter(self):
+        m = ObjectListModel()
+        m.append_many(range(10))
+        self.assertEqual(len(m), 10)
+        self.assertEqual(m[3][0], 3)
+        self.assertEqual(m[-1][0], 9)
+        self.assertEqual(m.get_path(m.get_iter((4,))).get_indices(), [4])
+        self.assertEqual(m.get_value(m.iter_nth_child(None, 5)), 5)
+        self.assertFalse(m.iter_nth_child(None, 10))
+        self.assertEqual([r[0] for r in m], list(range(10)))
+
+    def test_iters_persist(self):
+        m = ObjectListModel()
+        m.append_many(range(10))
+        iter_ = m.iter_nth_child(None, 5)
+        m.insert_many(0, [42, 43])
+        m.remove(m.get_iter_first())
+        self.assertEqual(m.get_value(iter_), 5)
+        self.assertEqual(m.get_path(iter_).get_indices(), [6])
+
+    def test_remove(self):
+        m = ObjectListModel()
+        m.append_many(range(3))
+        iter_ = m.get_iter_first()
+        self.assertTrue(m.remove(iter_))
+        self.assertEqual(m.get_value(iter_), 1)
+        last = m.iter_nth_child(None, 1)
+        self.assertFalse(m.remove(last))
+        self.assertFalse(m.iter_is_valid(last))
+        self.assertTrue(m.iter_is_valid(iter_))
+        self.assertEqual(m.values(), [1])
+
+    def test_remove_many(self):
+        m = ObjectListModel()
+        m.append_many(range(6))
+        iters = [m.iter_nth_child(None, i) for i in [4, 1, 2, 5]]
+        m.remove_many(iters)
+        self.assertEqual(m.values(), [0, 3])
+        self.assertEqual(m.get_value(iters[1]), 3)
+        self.assertEqual(m.get_value(iters[2]), 3)
+        self.assertFalse(m.iter_is_valid(iters[0]))
+        self.assertFalse(m.iter_is_valid(iters[3]))
+        m.remove_many([])
+        self.assertEqual(m.values(), [0, 3])
+
+    def test_remove_many_signals(self):
+        m = ObjectListModel()
+        m.append_many(range(5))
+        deleted = []
+        m.connect("row-deleted",
+                  lambda m, path: deleted.append(path.get_indices()[0]))
+        last = m.iter_nth_child(None, 4)
+        m.remove_many([m.iter_nth_child(None, i) for i in [0, 2, 3]])
+        self.assertEqual(deleted, [3, 2, 0])
+        self.assertEqual(m.values(), [1, 4])
+        self.assertEqual(m.get_path(last).get_indices(), [1])
+
+    def test_positions_after_insert(self):
+        m = ObjectListModel()
+        m.append_many(range(100))
+        iters = [m.iter_nth_child(None, i) for i in range(100)]
+        m.insert_many(0, range(50))
+        self.assertEqual(
+            [m.get_path(i).get_indices()[0] for i in iters],
+            list(range(50, 150)))
+
+    def test_move(self):
+        m = ObjectListModel()
+        m.append_many(range(5))
+        reordered = []
+        m.connect("rows-reordered", lambda *x: reordered.append(x))
+        m.move_before(m.iter_nth_child(None, 3), m.get_iter_first())
+        self.assertEqual(m.values(), [3, 0, 1, 2, 4])
+        m.move_after(m.get_iter_first(), m.iter_nth_child(None, 4))
+        self.assertEqual(m.values(), [0, 1, 2, 4, 3])
+        m.move_before(m.get_iter_first(), None)
+        self.assertEqual(m.values(), [1, 2, 4, 3, 0])
+        m.move_after(m.iter_nth_child(None, 4), None)
+        self.assertEqual(m.values(), [0, 1, 2, 4, 3])
+        self.assertEqual(len(reordered), 4)
+
+    def test_replace(self):
+        m = ObjectListModel()
+        m.append_many(range(10))
+        m.replace(range(3))
+        self.assertEqual(list(m.itervalues()), [0, 1, 2])
+        m.clear()
+        self.assertTrue(m.is_empty())
+
+    def test_signal_count(self):
+        m = ObjectListModel()
+
+        def handler(model, path, *args):
+            args[-1][0] += 1
+
+        inserted = [0]
+        m.connect("row-inserted", handler, inserted)
+        deleted = [0]
+        m.connect("row-deleted", handler, deleted)
+
+        m.append([1])
+        m.insert_many(0, [1, 2, 3])
+        list(m.iter_append_many(xrange(3)))
+        self.assertEqual(inserted[0], len(m))
+
+        m.remove(m.get_iter_first())
+        m.replace([1, 2])
+        self.assertEqual(deleted[0], 7)
+        self.assertEqual(inserted[0], 9)
+
+    def test_tree_view(self):
+        m = ObjectListModel()
+        m.append_many(range(100))
+        view = Gtk.TreeView(model=m)
+        view.get_selection().select_path((50,))
+        m.replace(range(10))
+        self.assertEqual(view.get_selection().count_selected_rows(), 0)
+        view.destroy()
+
+
 class _TObjectTreeStoreMixin(object):
 
     Store = None
@@ -170,6 +170,27 @@ class TSongList(TestCase):
 
         self.assertEqual(self.songlist.get_songs(), [song] * 4)
 
+    def test_add_songs_merge(self):
+        def song(foo, title):
+            return AudioFile({"~filename": fsnative(u"/dev/null"),
+                              "foo": foo, "title": title})
+
+        self.songlist.set_column_headers(["foo", "title"])
+        self.songlist.set_sort_orders([("title", False), ("foo", True)])
+        old = [song(u"b", u"1"), song(u"b", u"3"), song(u"a", u"2")]
+        self.songlist.set_songs(list(old))
+        new = [song(u"c", u"9"), song(u"a", u"1"), song(u"b", u"2"),
+               song(u"a", u"9")]
+        self.songlist.add_songs(new)
+
+        expected = old + new
+        self.songlist._sort_songs(expected)
+        self.assertEqual(self.songlist.get_songs(), expected)
+        self.assertEqual(
+            [(s("foo"), s("title")) for s in expected],
+            [(u"c", u"9"), (u"b", u"1"), (u"b", u"2"), (u"b", u"3"),
+             (u"a", u"1"), (u"a", u"2"), (u"a", u"9")])
+
     def test_header_menu(self):
         from quodlibet import browsers
         from quodlibet.library import SongLibrary, SongLibrarian
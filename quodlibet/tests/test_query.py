@@ -216,6 +216,42 @@ class TQuery(TestCase):
         not_val_time = (time.time() - t1)
         self.assertAlmostEqual(ineq_time, not_val_time, places=1)
 
+    @skip("Enable for basic benchmarking of Query")
+    def test_compiled_performance(self):
+        songs = []
+        for i in xrange(20000):
+            song = AudioFile(self.s1 if i % 2 else self.s2)
+            song["title"] = u"Title %d" % i
+            songs.append(song)
+        for text in [u"foo the bar", u"&(artist=piman, title=/1$/)",
+                     u"|(album=foo, !version=cake)", u"#(length > 3:00)"]:
+            query = Query(text)
+            t = time.time()
+            tree = query._match.filter(songs)
+            tree_time = time.time() - t
+            t = time.time()
+            compiled = query.filter(songs)
+            compiled_time = time.time() - t
+            assert tree == compiled
+            print("%r: tree %.1f ms, compiled %.1f ms" % (
+                text, tree_time * 1000, compiled_time * 1000))
+
+    def test_compiled(self):
+        songs = [self.s1, self.s2, self.s3, self.s4, self.s5]
+        for text in [u"foo", u"album=foo", u"album!=foo", u"!foo",
+                     u"&(piman, quux)", u"|(piman, mu)", u"filename=dir1",
+                     u"~filename=/\\.ogg$/", u"mountpoint=bla",
+                     u"~people=mu", u"artist=&(piman, mu)",
+                     u"#(length > 3:00)", u"", u"|()", u"&()",
+                     u"title,album=/^i/", u"utf8=angstrom"]:
+            query = Query(text)
+            for song in songs:
+                self.assertEqual(
+                    query.search(song), bool(query._match.search(song)),
+                    msg=text)
+            self.assertEqual(
+                query.filter(songs), query._match.filter(songs), msg=text)
+
     def test_repr(self):
         query = Query("foo = bar", [])
         self.assertEqual(
@@ -227,6 +263,26 @@ class TQuery(TestCase):
             repr(query).replace("u'", "'"),
             "<Query string='&(/bar/d)' type=QueryType.TEXT star=['foo']>")
 
+    def test_cacheable(self):
+        for text in [u"foo", u"artist=foo", u"&(a, !b)", u"~people=x",
+                     u"|(a, ~#playcount=1)", u"/foo/"]:
+            self.assertTrue(Query(text).cacheable(), msg=text)
+        for text in [u"#(playcount > 1)", u"~rating=1", u"~playlists=x",
+                     u"&(a, #(added < 1 day))", u"!~lyrics=foo",
+                     u"~artist~rating=foo"]:
+            self.assertFalse(Query(text).cacheable(), msg=text)
+
+    def test_literal_words(self):
+        words = match.literal_words
+        assert words(u"foo") == [u"foo"]
+        assert words(u"Foo bar") == [u"foo", u"bar"]
+        assert words(u"^foo$") == [u"foo"]
+        assert words(u"fo+bar") == [u"f", u"bar"]
+        assert words(u"foo|bar") == []
+        assert words(u"(foo)bar") == [u"foo", u"bar"]
+        assert words(u"f\xf6o") == [u"f", u"o"]
+        assert words(u"[") == []
+
     def test_2007_07_27_synth_search(self):
         song = AudioFile({"~filename": fsnative(u"foo/64K/bar.ogg")})
         query = Query("~dirname = !64K")
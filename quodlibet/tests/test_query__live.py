@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from senf import fsnative
+
+from tests import TestCase
+
+from quodlibet.formats import AudioFile
+from quodlibet.library import SongLibrary, SongLibrarian
+from quodlibet.query import LiveQuery, Query
+
+
+class TLiveQuery(TestCase):
+
+    def setUp(self):
+        self.librarian = SongLibrarian()
+        self.library = SongLibrary()
+        self.librarian.register(self.library, "main")
+        self.songs = [
+            AudioFile({"~filename": fsnative(u"/dir/%d" % i),
+                       "artist": u"foo" if i % 2 else u"bar"})
+            for i in range(6)]
+        self.library.add(self.songs)
+        self.live = LiveQuery(self.librarian, u"artist=foo")
+        self.entered = []
+        self.left = []
+        self.live.connect(
+            "entered", lambda live, songs: self.entered.extend(songs))
+        self.live.connect(
+            "left", lambda live, songs: self.left.extend(songs))
+
+    def tearDown(self):
+        self.live.destroy()
+        self.library.destroy()
+        self.librarian.destroy()
+
+    def test_initial(self):
+        self.assertTrue(self.live.active)
+        self.assertEqual(self.live.songs, set(self.songs[1::2]))
+        self.assertTrue(self.songs[1] in self.live)
+        self.assertEqual(len(self.live), 3)
+
+    def test_changed(self):
+        self.songs[0]["artist"] = u"foo"
+        self.songs[1]["artist"] = u"bar"
+        self.songs[3]["title"] = u"still foo"
+        self.library.changed(self.songs[:4])
+        self.assertEqual(self.entered, [self.songs[0]])
+        self.assertEqual(self.left, [self.songs[1]])
+        self.assertEqual(
+            self.live.songs, set([self.songs[0]] + self.songs[3::2]))
+
+    def test_added_removed(self):
+        new = [AudioFile({"~filename": fsnative(u"/dir/%s" % a), "artist": a})
+               for a in [u"foo", u"bar"]]
+        self.library.add(new)
+        self.assertEqual(self.entered, new[:1])
+        self.library.remove([self.songs[0], self.songs[1]])
+        self.assertEqual(self.left, [self.songs[1]])
+        self.assertFalse(self.songs[1] in self.live)
+
+    def test_set_query(self):
+        self.live.set_query(Query(u"artist=bar"))
+        self.assertEqual(self.live.songs, set(self.songs[::2]))
+        self.live.set_query(lambda song: True, self.songs[:1])
+        self.assertEqual(self.live.songs, set(self.songs[:1]))
+        self.library.changed(self.songs[:2])
+        self.assertEqual(self.entered, self.songs[1:2])
+
+    def test_limited(self):
+        self.live.set_query(u"artist=foo", self.songs[1:2], limited=True)
+        self.songs[3]["title"] = u"changed"
+        self.songs[1]["artist"] = u"bar"
+        self.library.changed(self.songs[:4])
+        self.assertFalse(self.entered)
+        self.assertEqual(self.left, self.songs[1:2])
+        new = AudioFile({"~filename": fsnative(u"/dir/new"), "artist": u"foo"})
+        self.library.add([new])
+        self.assertEqual(self.entered, [new])
+
+    def test_match_many(self):
+        tested = []
+
+        def match_many(songs):
+            tested.append(list(songs))
+            return [s for s in songs if s("artist") == u"foo"]
+
+        self.live.set_query(lambda song: False, self.songs[1::2],
+                            match_many=match_many)
+        self.songs[0]["artist"] = u"foo"
+        self.library.changed(self.songs[:2])
+        self.assertEqual(tested, [self.songs[:2]])
+        self.assertEqual(self.entered, self.songs[:1])
+        self.assertFalse(self.left)
+
+    def test_inactive(self):
+        self.live.set_query(None)
+        self.assertFalse(self.live.active)
+        self.library.changed(self.songs)
+        self.library.remove(self.songs)
+        self.assertFalse(self.entered or self.left)
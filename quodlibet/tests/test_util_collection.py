@@ -16,7 +16,7 @@ from tests import TestCase, mkdtemp
 from quodlibet.formats import AudioFile as Fakesong
 from quodlibet.formats._audio import NUMERIC_ZERO_DEFAULT, PEOPLE
 from quodlibet.util.collection import Album, Playlist, avg, bayesian_average, \
-    FileBackedPlaylist
+    FileBackedPlaylist, PLAYLIST_INDEX
 from quodlibet.library.libraries import FileLibrary
 from quodlibet.util import format_rating
 from quodlibet.compat import long
@@ -258,6 +258,61 @@ class TAlbum(TestCase):
         s.failUnlessEqual(album.comma("c"), "cc3, cc1")
         s.failUnlessEqual(album.comma("~c~b"), "cc3, cc1 - bb1, bb4")
 
+    def test_aggregates_incremental(s):
+        keys = ["~#length", "~#rating", "~#rating:max", "~#added:min",
+                "~#bitrate", "~#discs", "~#year", "~#playcount:avg",
+                "~people", "~peoplesort", "date", "artist", "~#filesize"]
+
+        def check(album):
+            values = [album(k) for k in keys]
+            album.finalize()
+            for key, value in zip(keys, values):
+                s.assertEqual(value, album(key))
+
+        songs = [Fakesong(dict(song, artist=u"a")) for song in NUMERIC_SONGS]
+        album = Album(songs[0])
+        for song in songs[:2]:
+            album.add_song(song)
+        check(album)
+        album.add_song(songs[2])
+        check(album)
+
+        songs[0]["~#rating"] = 0.9
+        songs[0]["artist"] = u"b"
+        songs[1]["discnumber"] = u"2"
+        del songs[2]["date"]
+        for song in songs:
+            album.update_song(song)
+        check(album)
+
+        album.remove_song(songs[1])
+        check(album)
+        s.assertEqual(album("~#length"), 5)
+
+    def test_aggregates_no_drift(s):
+        songs = [Fakesong({"~#length": l, "~#rating": r})
+                 for l, r in [(0.1, 0.1), (0.2, 0.2), (0.3, 0.7)]]
+        album = Album(songs[0])
+        for song in songs:
+            album.add_song(song)
+        s.assertEqual(album("~#length"), 0.6)
+        album.remove_song(songs[0])
+        album.remove_song(songs[1])
+        s.assertEqual(album("~#length"), 0.3)
+        s.assertEqual(album("~#rating"), 0.7)
+        album.remove_song(songs[2])
+        album.add_song(songs[1])
+        s.assertEqual(album("~#length"), 0.2)
+        s.assertEqual(album("~#rating:avg"), 0.2)
+
+    def test_aggregates_songs_replaced(s):
+        album = Album(NUMERIC_SONGS[0])
+        album.songs = set(NUMERIC_SONGS[:1])
+        s.assertEqual(album("~#length"), 4)
+        album.songs = set(NUMERIC_SONGS)
+        album.finalize()
+        s.assertEqual(album("~#length"), 12)
+
     def tearDown(self):
         config.quit()
 
@@ -479,6 +534,29 @@ class TPlaylist(TestCase):
                 playlists = Playlist.playlists_featuring(NUMERIC_SONGS[0])
                 s.failUnlessEqual(set(playlists), {pl, pl2})
 
+    def test_playlists_featuring_counts(s):
+        song, other = s.TWO_SONGS
+        with s.wrap("playlist") as pl:
+            pl.extend([song, song, other])
+            s.failUnlessEqual(PLAYLIST_INDEX.get_count(song, pl), 2)
+            with s.wrap("playlist2") as pl2:
+                pl2.append(song)
+                s.failUnlessEqual(
+                    Playlist.playlists_featuring_songs(s.TWO_SONGS),
+                    {pl: 2, pl2: 1})
+                s.failUnlessEqual(
+                    Playlist.playlists_featuring(song), [pl, pl2])
+            pl.remove_songs([song], leave_dupes=True)
+            s.failUnlessEqual(PLAYLIST_INDEX.get_count(song, pl), 1)
+            pl[0] = other
+            s.failUnlessEqual(Playlist.playlists_featuring(song), [])
+            s.failUnlessEqual(PLAYLIST_INDEX.get_count(other, pl), 2)
+            pl[:] = [song]
+            s.failIf(Playlist.playlists_featuring(other))
+            s.failUnlessEqual(Playlist.playlists_featuring(song), [pl])
+            pl.clear()
+            s.failIf(Playlist.playlists_featuring_songs(s.TWO_SONGS))
+
     def test_playlists_tag(self):
         # Arguably belongs in _audio
         songs = NUMERIC_SONGS
@@ -564,6 +642,26 @@ class TFileBackedPlaylist(TPlaylist):
                 self.assertEqual(len(h.read().splitlines()),
                                  len(NUMERIC_SONGS) + 1)
 
+    def test_write_later(self):
+        with self.wrap("playlist") as pl:
+            pl.extend(NUMERIC_SONGS)
+            pl.write_later()
+            pl.append(fsnative(u"xf0xf0"))
+            pl.write_later()
+            FileBackedPlaylist.flush_writes()
+
+            with open(pl.filename, "rb") as h:
+                self.assertEqual(len(h.read().splitlines()),
+                                 len(NUMERIC_SONGS) + 1)
+
+    def test_write_later_delete(self):
+        pl = self.pl("playlist")
+        pl.extend(NUMERIC_SONGS)
+        pl.write_later()
+        pl.delete()
+        FileBackedPlaylist.flush_writes()
+        self.assertFalse(os.path.exists(pl.filename))
+
     def test_make_dup(self):
         p1 = FileBackedPlaylist.new(self.temp, "Does not exist")
         p2 = FileBackedPlaylist.new(self.temp, "Does not exist")
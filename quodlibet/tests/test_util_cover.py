@@ -8,7 +8,10 @@
 import glob
 import os
 import shutil
+import threading
+import time
 
+from gi.repository import GLib
 from senf import fsnative
 
 from quodlibet import config
@@ -17,6 +20,7 @@ from quodlibet.formats import AudioFile
 from quodlibet.plugins import Plugin
 from quodlibet.util.cover.http import escape_query_value
 from quodlibet.util.cover.manager import CoverManager
+from quodlibet.util.cover.loader import CoverLoader
 from quodlibet.util.path import normalize_path, path_equal, mkdir
 from quodlibet.compat import text_type
 
@@ -227,3 +231,106 @@ class THttp(TestCase):
         assert escape_query_value("foo bar") == "foo%20bar"
         assert escape_query_value("foo?") == "foo%3F"
         assert escape_query_value("foo&bar") == "foo%26bar"
+
+
+class BlockingManager(object):
+
+    def __init__(self):
+        self.loaded = []
+        self.release = threading.Event()
+        self.main_sources = []
+        self.main_loaded = []
+
+    def split_sources(self):
+        return ["thread"], list(self.main_sources)
+
+    def acquire_cover_sync_many(self, songs, sources=None):
+        if sources == ["thread"]:
+            self.release.wait(5)
+            self.loaded.append(songs)
+        else:
+            self.main_loaded.append(
+                (songs, threading.current_thread().name))
+        return None
+
+
+class TCoverLoader(TestCase):
+
+    def setUp(self):
+        self.manager = BlockingManager()
+        self.results = []
+        self.loader = CoverLoader(
+            self.manager, self.results.extend, workers=1)
+
+    def tearDown(self):
+        self.loader.destroy()
+
+    def _wait(self, count):
+        context = GLib.MainContext.default()
+        end = time.time() + 5
+        while len(self.results) < count and time.time() < end:
+            context.iteration(False)
+            time.sleep(0.001)
+
+    def _wait_loading(self, key):
+        end = time.time() + 5
+        while self.manager.loaded == [] and time.time() < end:
+            with self.loader._cond:
+                if key in self.loader._loading:
+                    return
+            time.sleep(0.001)
+
+    def test_priority(self):
+        self.loader.load([("a", "a", 10, 10)])
+        self._wait_loading("a")
+        self.loader.load([("b", "b", 10, 10), ("c", "c", 10, 10)])
+        self.loader.request("d", "d", 10, 10, priority=-1)
+        self.assertTrue(self.loader.is_loading("b"))
+        self.manager.release.set()
+        self._wait(4)
+        self.assertEqual(self.manager.loaded, ["a", "d", "b", "c"])
+        self.assertEqual(
+            sorted(self.results), [(k, None) for k in "abcd"])
+        self.assertFalse(self.loader.is_loading("a"))
+
+    def test_load_replaces(self):
+        self.loader.load([("a", "a", 10, 10)])
+        self._wait_loading("a")
+        self.loader.load([("b", "b", 10, 10)])
+        self.loader.load([("a", "a", 10, 10), ("c", "c", 10, 10)])
+        self.manager.release.set()
+        self._wait(2)
+        self.assertEqual(self.manager.loaded, ["a", "c"])
+        self.assertEqual(self.results, [("a", None), ("c", None)])
+
+    def test_invalidate(self):
+        self.loader.load([("a", "a", 10, 10)])
+        self._wait_loading("a")
+        self.loader.invalidate(["a"])
+        self.loader.load([("a", "a", 10, 10)])
+        self.manager.release.set()
+        self._wait(1)
+        # only the result of the second load gets passed on
+        self.assertEqual(self.manager.loaded, ["a", "a"])
+        self.assertEqual(self.results, [("a", None)])
+
+    def test_cancel(self):
+        self.loader.load([("a", "a", 10, 10), ("b", "b", 10, 10)])
+        self._wait_loading("a")
+        self.loader.cancel()
+        self.manager.release.set()
+        self.loader.request("c", "c", 10, 10)
+        self._wait(1)
+        self.assertEqual(self.results, [("c", None)])
+        self.assertFalse("b" in self.manager.loaded)
+
+    def test_main_sources(self):
+        self.manager.main_sources = ["plugin"]
+        self.manager.release.set()
+        self.loader.request("a", "a", 10, 10)
+        self._wait(1)
+        self.assertEqual(self.manager.loaded, ["a"])
+        self.assertEqual(
+            self.manager.main_loaded,
+            [("a", threading.current_thread().name)])
+        self.assertEqual(self.results, [("a", None)])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import os
+import json
+
+from tests import TestCase, mkstemp
+
+from quodlibet.util import startuptrace
+from quodlibet.util.startuptrace import phase
+
+
+class Tstartuptrace(TestCase):
+
+    def setUp(self):
+        self.output = startuptrace.get_output()
+
+    def tearDown(self):
+        startuptrace.finish()
+        startuptrace.set_output(self.output)
+
+    def test_not_recording(self):
+        self.assertFalse(startuptrace.is_recording())
+        with phase("foo"):
+            pass
+        self.assertEqual(startuptrace.get_events(), [])
+
+    def test_phases(self):
+        startuptrace.start()
+        self.assertTrue(startuptrace.is_recording())
+        with phase("outer"):
+            with phase("inner", "plugin import"):
+                pass
+        events = startuptrace.get_events()
+        self.assertEqual([e["name"] for e in events], ["inner", "outer"])
+        self.assertEqual(events[0]["cat"], "plugin import")
+        inner, outer = events
+        self.assertTrue(outer["ts"] <= inner["ts"])
+        self.assertTrue(outer["dur"] >= inner["dur"])
+        self.assertTrue("cpu_ms" in outer["args"])
+
+    def test_phase_error(self):
+        startuptrace.start()
+        with self.assertRaises(ValueError):
+            with phase("broken"):
+                raise ValueError
+        self.assertEqual(len(startuptrace.get_events()), 1)
+
+    def test_finish(self):
+        fd, filename = mkstemp(".json")
+        os.close(fd)
+        try:
+            startuptrace.set_output(filename)
+            startuptrace.start()
+            with phase("foo"):
+                pass
+            self.assertFalse(startuptrace.finish())
+            self.assertFalse(startuptrace.is_recording())
+            with open(filename) as h:
+                data = json.load(h)
+            self.assertEqual(
+                [e["name"] for e in data["traceEvents"]], ["foo"])
+        finally:
+            os.unlink(filename)